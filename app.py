@@ -6,18 +6,23 @@ iPhoneの共有ボタンから受け取ったSNS URLを処理し、
 対応プラットフォーム:
 - Instagram
 - TikTok
+- YouTube
 """
 
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, request, jsonify, abort, redirect, send_file
+import hmac
 import os
+import time
 from datetime import datetime
 
 # サービスとテンプレートをインポート
-from services.common import detect_platform, create_twitter_intent_url
-from services.instagram_service import extract_instagram_info
-from services.tiktok_service import extract_tiktok_info
-from templates import create_tweet_text, create_pushover_message, create_pushover_title
+from services import admission, digest, http_client, idempotency, memory, metrics, payload, profiling, progressive, scheduler, tenants, thumbnails, tracing, upstreams
+from services.common import detect_platform, create_twitter_intent_url, platform_name
+from services.history import record_share, search_history, search_shares, share_stats
+from services.notifiers import Notification, configured_notifiers, delivery_status, dispatch
+from services.providers import extract as extract_social_media_info, supported_platforms
+from templates import create_tweet_text, create_pushover_message, create_pushover_title, create_pushover_digest, render_custom
+from templates.engine import TemplateSet
 
 app = Flask(__name__)
 
@@ -25,61 +30,77 @@ app = Flask(__name__)
 PUSHOVER_TOKEN = os.environ.get('PUSHOVER_TOKEN', '')
 PUSHOVER_USER = os.environ.get('PUSHOVER_USER', '')
 
+# 1リクエストあたりの上流呼び出しに使える時間（gunicornのタイムアウトより短くする）
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', '25'))
 
-def extract_social_media_info(url, data):
-    """URLからプラットフォームを検出し、適切な情報抽出サービスを呼び出す"""
-    
-    platform = detect_platform(url)
-    
-    if not platform:
-        raise ValueError(f"Unsupported platform: {url}")
-    
-    print(f"✓ Detected platform: {platform}")
-    
-    # 共通パラメータを取得
-    provided_username = data.get('username', '').strip()
-    provided_caption = data.get('caption', '').strip()
-    
-    # プラットフォーム別に情報抽出
-    if platform == 'instagram':
-        return extract_instagram_info(url, provided_username, provided_caption)
-    elif platform == 'tiktok':
-        return extract_tiktok_info(url, provided_username, provided_caption)
-    else:
-        raise ValueError(f"Platform not implemented: {platform}")
+# /debug/* エンドポイント用のトークン（未設定ならエンドポイント自体を無効化）
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
+
+# MEMORY_TRACING=1 なら tracemalloc を開始
+memory.start()
+
+# 上流（Instagram、TikTok、YouTube、Pushover など）の定期ヘルスチェック
+upstreams.start()
+
+# 通知先（Pushover、Webhook、ntfy、JSONLファイル）
+# DIGEST_MODE=1 ならPushoverは連続した共有をまとめて送る
+NOTIFIERS = digest.wrap(configured_notifiers(PUSHOVER_TOKEN, PUSHOVER_USER), create_pushover_digest)
+
+
+def _build_tenant_notifiers(config):
+    """テナント設定から通知先を作る（グローバルの通知先は引き継がない）"""
+    notifiers = configured_notifiers(
+        config.get('pushover_token', ''),
+        config.get('pushover_user', ''),
+        webhook_url=config.get('notify_webhook_url', ''),
+        ntfy_url=config.get('ntfy_url', ''),
+        ntfy_token=config.get('ntfy_token', ''),
+        jsonl_path=config.get('notify_jsonl_path', '')
+    )
+    return digest.wrap(notifiers, create_pushover_digest)
 
 
-def send_pushover_notification(info, twitter_url):
-    """Pushoverに通知を送信"""
+# 設定ファイルのテンプレート（TEMPLATES_PATH、更新されたら自動で読み直す）
+TEMPLATES = TemplateSet()
+
+# テナント（TENANTS_PATH 未設定なら環境変数の設定を使う default テナントのみ）
+TENANTS = tenants.load_registry(
+    tenants.Tenant(tenants.DEFAULT_TENANT_ID, NOTIFIERS, admission.limiter),
+    _build_tenant_notifiers
+)
+
+
+def send_notifications(info, twitter_url, tenant):
+    """テナントの設定済みのすべての通知先に並行して通知を送信"""
     
-    if not PUSHOVER_TOKEN or not PUSHOVER_USER:
-        print("Pushover credentials not configured")
-        return False
+    if not tenant.notifiers:
+        print("No notification sinks configured")
+        return {}
+    
+    # Pushoverに送る場合だけサムネイルを用意（ディスクキャッシュ済みなら再取得しない）
+    attachment = None
+    if info.image_url and any(n.name == 'pushover' for n in tenant.notifiers):
+        attachment = thumbnails.get_thumbnail(info.url, info.image_url)
     
     # メッセージとタイトルを生成
-    message = create_pushover_message(info)
-    title = create_pushover_title(info)
+    notification = Notification(
+        info,
+        twitter_url,
+        title=_render(tenant, 'pushover_title', info, create_pushover_title),
+        message=_render(tenant, 'pushover_message', info, create_pushover_message),
+        attachment=attachment
+    )
     
-    try:
-        response = requests.post(
-            'https://api.pushover.net/1/messages.json',
-            data={
-                'token': PUSHOVER_TOKEN,
-                'user': PUSHOVER_USER,
-                'message': message,
-                'title': title,
-                'url': twitter_url,
-                'url_title': 'Xに投稿する',
-                'priority': 0
-            },
-            timeout=10
-        )
-        
-        return response.status_code == 200
-        
-    except Exception as e:
-        print(f"Error sending Pushover notification: {e}")
-        return False
+    return dispatch(tenant.notifiers, notification)
+
+
+def _render(tenant, name, info, default):
+    """テナント設定のテンプレート > テンプレート設定ファイル > 標準のテンプレートの順で使う"""
+    template = tenant.templates.get(name)
+    if template:
+        return render_custom(template, info)
+    rendered = TEMPLATES.render(name, info, tenant.id)
+    return rendered if rendered is not None else default(info)
 
 
 @app.route('/')
@@ -89,10 +110,15 @@ def index():
         'status': 'ok',
         'service': 'Social Media Share Webhook',
         'version': '2.0.0',
-        'supported_platforms': ['instagram', 'tiktok'],
+        'supported_platforms': supported_platforms(),
         'endpoints': {
             'webhook': '/webhook (POST)',
-            'health': '/ (GET)'
+            'webhook_stream': '/webhook/stream?id=<job_id> (GET, SSE)',
+            'health': '/ (GET)',
+            'metrics': '/metrics (GET)',
+            'history': '/history (GET)',
+            'search': '/search?q=<語> (GET)',
+            'stats': '/stats (GET)'
         }
     })
 
@@ -100,91 +126,193 @@ def index():
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """SNS URLを受け取って処理"""
+    return _webhook()
+
+
+@app.route('/t/<tenant_path>/webhook', methods=['POST'])
+def tenant_webhook(tenant_path):
+    """パスでテナントを指定する webhook"""
+    return _webhook(tenant_path)
+
+
+def _resolve_tenant(tenant_path=None):
+    """X-API-Key / Authorization: Bearer ヘッダー、またはパスからテナントを特定"""
+    return TENANTS.resolve(_request_api_key(), tenant_path)
+
+
+def _request_api_key():
+    """X-API-Key ヘッダー、なければ Authorization: Bearer のAPIキー"""
+    api_key = request.headers.get('X-API-Key', '').strip()
+    authorization = request.headers.get('Authorization', '')
+    if not api_key and authorization.startswith('Bearer '):
+        api_key = authorization[len('Bearer '):].strip()
+    return api_key
+
+
+def _has_credential(tenant, tenant_path=None):
+    """リクエストが資格情報を送ったか（テナントのAPIキー、APIキーのないテナントのパス、DEBUG_TOKEN）"""
+    if _debug_token_valid():
+        return True
+    if tenant.api_key:
+        return hmac.compare_digest(_request_api_key().encode('utf-8'), tenant.api_key.encode('utf-8'))
+    return bool(tenant.path) and tenant_path == tenant.path
+
+
+def _resolve_reader(tenant_path=None):
+    """履歴・検索・統計を読むテナント（資格情報のない default テナントへの読み取りは拒否）"""
+    tenant = _resolve_tenant(tenant_path)
+    if not _has_credential(tenant, tenant_path):
+        raise tenants.TenantError(401, 'API key or debug token required')
+    return tenant
+
+
+def _webhook(tenant_path=None):
+    """webhook 全体をスパンで囲む（traceparent ヘッダーがあればそのトレースの子にする）"""
+    parent = tracing.parse_traceparent(request.headers.get('traceparent', ''))
+    with tracing.span('webhook', parent=parent, kind='server', path=request.path) as span:
+        response = app.make_response(_admit_webhook(tenant_path))
+        span.set('http.status_code', response.status_code)
+        if span.context is not None:
+            response.headers['traceparent'] = span.context.traceparent()
+        return response
+
+
+def _admit_webhook(tenant_path=None):
+    try:
+        tenant = _resolve_tenant(tenant_path)
+    except tenants.TenantError as e:
+        return jsonify({'error': e.reason, 'status': 'error'}), e.status
     
+    # Content-Length で分かる上限超過は、枠を確保したりボディを読んだりする前に拒否
     try:
-        # リクエストデータ取得
-        data = request.get_json()
-        
-        # デバッグ用ログ
-        print(f"Received data type: {type(data)}")
-        print(f"Received data: {data}")
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        # URLを取得（複数のパターンに対応）
-        social_url = data.get('url', '')
-        
-        # パターン1: 二重ネストの辞書
-        if isinstance(social_url, dict):
-            social_url = social_url.get('url', '')
+        payload.check_length(request.content_length)
+    except payload.PayloadError as e:
+        return jsonify({'error': e.reason, 'status': 'error'}), e.status
+    
+    # 優先度（X-Priority ヘッダーまたは priority クエリ: interactive / retry / bulk）
+    lane = (request.headers.get('X-Priority') or request.args.get('priority') or scheduler.DEFAULT_LANE).lower()
+    if lane not in scheduler.LANES:
+        return jsonify({'error': f'Unknown priority: {lane}', 'status': 'error'}), 400
+    # retry / bulk はテナントの同時処理枠を通らないため、認証済みのテナントか内部の呼び出し元に限る
+    if lane != scheduler.DEFAULT_LANE and not _has_credential(tenant, tenant_path):
+        return jsonify({'error': 'Priority lane requires an API key', 'status': 'error'}), 403
+    lane_token = scheduler.set_lane(lane)
+    
+    tracing.annotate(tenant=tenant.id, lane=lane)
+    
+    # 上流呼び出し（リトライ含む）と待ち行列での待ち時間はこのデッドライン内に収める
+    deadline_token = http_client.set_deadline(REQUEST_DEADLINE_SECONDS)
+    tenant_tokens = tenants.activate(tenant)
+    try:
+        # 混雑時は待たせ続けず、429 / 503 と Retry-After を返す
+        # 同時処理枠はテナントごとのレーンなので、他のテナントの一括共有に押し出されない
+        # retry / bulk はテナントの枠を使わず、スケジューラのレーン（上限・待ち行列付き）で待つ
+        limiter = tenant.limiter if lane == scheduler.DEFAULT_LANE else None
+        try:
+            admission.rate_limiter.check(f'{tenant.id}:{_client_id()}')
+            admitted_at = limiter.acquire() if limiter else None
+        except admission.AdmissionRejected as e:
+            print(f"Rejected webhook ({e.status}): {e.reason}")
+            return jsonify({
+                'error': e.reason,
+                'status': 'error'
+            }), e.status, {'Retry-After': str(e.retry_after)}
         
-        # パターン2: 文字列化された辞書
-        if isinstance(social_url, str) and social_url.startswith('{'):
+        memory_token = memory.begin_request()
+        try:
+            # X-Profile ヘッダー / profile クエリ（要デバッグトークン）またはサンプリングでプロファイル
+            profile_requested = _flag(request.headers.get('X-Profile') or request.args.get('profile'))
+            if (profile_requested and _debug_token_valid()) or profiling.should_sample():
+                with profiling.profile_request(request.path):
+                    return _handle_webhook(tenant)
+            return _handle_webhook(tenant)
+        finally:
+            peaks = memory.end_request(memory_token)
+            if peaks:
+                print(f"Memory peaks: {peaks}")
+            if limiter:
+                limiter.release(admitted_at)
+    finally:
+        tenants.deactivate(tenant_tokens)
+        http_client.reset_deadline(deadline_token)
+        scheduler.reset_lane(lane_token)
+
+
+def _client_id():
+    """レート制限用のクライアント識別子（Render等のプロキシが付けた X-Forwarded-For の値）"""
+    return admission.client_id(request.headers.get('X-Forwarded-For', ''), request.remote_addr)
+
+
+def _handle_webhook(tenant):
+    """webhook の本体処理"""
+    
+    try:
+        # ペイロードからURLを取り出す（JSON / フォーム / テキスト、上限付きで1回だけ読む）
+        with tracing.span('unwrap_payload', bytes=request.content_length or 0) as span:
             try:
-                import json
-                parsed = json.loads(social_url)
-                if isinstance(parsed, dict):
-                    social_url = parsed.get('url', '')
-            except:
-                pass
-        
-        # パターン3: エスケープされたJSON文字列
-        if isinstance(social_url, str) and '\\/' in social_url:
-            social_url = social_url.replace('\\/', '/')
-            if social_url.startswith('{'):
-                try:
-                    import json
-                    parsed = json.loads(social_url)
-                    if isinstance(parsed, dict):
-                        social_url = parsed.get('url', '')
-                except:
-                    pass
-        
-        # デバッグ用ログ
-        print(f"Extracted URL type: {type(social_url)}")
-        print(f"Extracted URL: {social_url}")
-        
-        if not social_url:
-            return jsonify({'error': 'No URL provided'}), 400
-        
-        # 最終的にまだ辞書形式の文字列が残っている場合
-        if isinstance(social_url, str) and social_url.startswith('{'):
-            return jsonify({'error': f'Invalid URL format: {social_url}'}), 400
+                body = payload.read_body(request.stream, request.content_length)
+                data = payload.normalize(body, request.content_type)
+            except payload.PayloadError as e:
+                print(f"Rejected payload ({e.status}): {e.reason}")
+                return jsonify({'error': e.reason, 'status': 'error'}), e.status
+            social_url = data.url
+            span.set('payload.kind', data.kind)
+            
+            print(f"Received {data.kind} payload ({len(body)} bytes)")
+            print(f"Extracted URL: {social_url}")
         
         # プラットフォーム検出
-        platform = detect_platform(social_url)
+        with tracing.span('detect_platform') as span:
+            platform = detect_platform(social_url)
+            span.set('platform', platform)
         if not platform:
-            return jsonify({'error': 'Unsupported platform. Supported: Instagram, TikTok'}), 400
+            return jsonify({'error': 'Unsupported platform. Supported: Instagram, TikTok, YouTube'}), 400
         
-        print(f"Processing {platform.title()} URL: {social_url}")
+        print(f"Processing {platform_name(platform)} URL: {social_url}")
         
-        # SNS情報取得
-        social_info = extract_social_media_info(social_url, data)
+        progressive_mode = _flag(request.args.get('progressive', data.get('progressive')),
+                                 progressive.PROGRESSIVE_MODE)
         
-        # X投稿文生成
-        tweet_text = create_tweet_text(social_info)
+        # 再送（同じIdempotency-Key、または同じ内容の短時間内の再送）なら保存済みレスポンスを返す
+        # キーはテナントごとに分ける
+        header_value = request.headers.get('Idempotency-Key', '').strip()
+        if header_value:
+            keys = [idempotency.header_key(header_value)]
+        else:
+            keys = idempotency.derived_keys(social_url, {
+                'username': data.get('username') or '',
+                'caption': data.get('caption') or '',
+                'progressive': progressive_mode,
+            })
+        idempotency_key, *aliases = [f'{tenant.id}:{key}' for key in keys]
         
-        # X投稿用URL生成
-        twitter_url = create_twitter_intent_url(tweet_text)
+        stored = idempotency.store.claim(idempotency_key, aliases)
+        if stored is not None:
+            print(f"✓ Replaying stored response: {idempotency_key}")
+            status, body = stored
+            return app.response_class(body, status=status, mimetype='application/json',
+                                      headers={'Idempotent-Replayed': 'true'})
+        
+        try:
+            if progressive_mode:
+                result = _start_progressive_share(platform, social_url, data, tenant)
+            else:
+                result = _process_share(platform, social_url, data, tenant)
+        except Exception:
+            idempotency.store.release(idempotency_key)
+            raise
         
-        # Pushover通知送信
-        notification_sent = send_pushover_notification(social_info, twitter_url)
+        response = jsonify(result)
+        idempotency.store.complete(idempotency_key, response.status_code, response.get_data())
+        return response
         
+    except admission.AdmissionRejected as e:
+        # スケジューラの待ち行列があふれた／待ちきれなかった、または同じキーの処理中リクエストを待ちきれなかった（409）
+        print(f"Rejected webhook ({e.status}): {e.reason}")
         return jsonify({
-            'status': 'success',
-            'platform': platform,
-            'info': {
-                'url': social_info.url,
-                'username': social_info.username,
-                'type': social_info.type,
-                'platform': social_info.platform
-            },
-            'tweet_text': tweet_text,
-            'twitter_url': twitter_url,
-            'notification_sent': notification_sent,
-            'timestamp': datetime.now().isoformat()
-        })
+            'error': e.reason,
+            'status': 'error'
+        }), e.status, {'Retry-After': str(e.retry_after)}
         
     except ValueError as e:
         print(f"Validation error: {e}")
@@ -203,15 +331,366 @@ def webhook():
         }), 500
 
 
+def _process_share(platform, social_url, data, tenant):
+    """共有1件を処理（情報抽出・投稿文生成・通知・履歴記録）してレスポンス内容を返す"""
+    
+    timings = {}
+    
+    # SNS情報取得（優先度レーンの処理枠内で）
+    started = time.perf_counter()
+    with scheduler.slot(), tracing.span('extract', platform=platform) as span:
+        social_info = extract_social_media_info(social_url, data)
+        span.set('post_code', social_info.post_code)
+        span.set('username', social_info.username)
+    timings['extract_ms'] = _elapsed_ms(started)
+    
+    # X投稿文生成
+    started = time.perf_counter()
+    with tracing.span('render', platform=platform) as span:
+        tweet_text = _render(tenant, 'tweet', social_info, create_tweet_text)
+        
+        # X投稿用URL生成
+        twitter_url = create_twitter_intent_url(tweet_text)
+        span.set('chars', len(tweet_text))
+    timings['render_ms'] = _elapsed_ms(started)
+    
+    # 通知送信（全通知先へ並行、優先度レーンの処理枠内で）
+    started = time.perf_counter()
+    with scheduler.slot(), tracing.span('notifications', sinks=len(tenant.notifiers)):
+        notifications = send_notifications(social_info, twitter_url, tenant)
+    # まとめ通知にためただけの場合は 'queued'（まだ届いていない）
+    notification_sent = delivery_status(notifications)
+    timings['notify_ms'] = _elapsed_ms(started)
+    
+    # 取得・解析ステージのピーク割り当て量（MEMORY_TRACING=1 のとき）
+    memory_peaks = memory.current_peaks()
+    timings.update(memory_peaks)
+    
+    # 共有履歴に記録（書き込みはバックグラウンド）
+    record_share({
+        'tenant': tenant.id,
+        'url': social_info.url,
+        'platform': social_info.platform,
+        'username': social_info.username,
+        'post_code': social_info.post_code,
+        'type': social_info.type,
+        'description': '' if social_info.description_fallback else social_info.description,
+        'hashtag': social_info.hashtag,
+        'tweet_text': tweet_text,
+        'notification_sent': notification_sent is True,
+        'timings': timings
+    })
+    
+    result = {
+        'status': 'success',
+        'platform': platform,
+        'info': {
+            'url': social_info.url,
+            'username': social_info.username,
+            'type': social_info.type,
+            'platform': social_info.platform
+        },
+        'tweet_text': tweet_text,
+        'twitter_url': twitter_url,
+        'notification_sent': notification_sent,
+        'notifications': notifications,
+        'timestamp': datetime.now().isoformat()
+    }
+    if memory_peaks:
+        result['memory'] = memory_peaks
+    
+    return result
+
+
+def _start_progressive_share(platform, social_url, data, tenant):
+    """URLから分かる情報だけで即座に応答し、本文の取得と通知はバックグラウンドで行う"""
+    
+    started = time.perf_counter()
+    quick_info = extract_social_media_info(social_url, data, fetch_remote=False)
+    tweet_text = _render(tenant, 'tweet', quick_info, create_tweet_text)
+    twitter_url = create_twitter_intent_url(tweet_text)
+    
+    initial = {
+        'status': 'success',
+        'platform': platform,
+        'progressive': True,
+        'enrichment': 'pending',
+        'info': {
+            'url': quick_info.url,
+            'username': quick_info.username,
+            'type': quick_info.type,
+            'platform': quick_info.platform
+        },
+        'tweet_text': tweet_text,
+        'twitter_url': twitter_url,
+        'notification_sent': False,
+        'timings': {'quick_ms': _elapsed_ms(started)},
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    lane = scheduler.current_lane()
+    trace_parent = tracing.current_context()
+    
+    def enrich():
+        # バックグラウンドでも同じデッドラインと優先度を適用し、同じトレースに記録
+        deadline_token = http_client.set_deadline(REQUEST_DEADLINE_SECONDS)
+        tenant_tokens = tenants.activate(tenant)
+        lane_token = scheduler.set_lane(lane)
+        try:
+            with tracing.span('enrich', parent=trace_parent, platform=platform):
+                return _process_share(platform, social_url, data, tenant)
+        finally:
+            scheduler.reset_lane(lane_token)
+            tenants.deactivate(tenant_tokens)
+            http_client.reset_deadline(deadline_token)
+    
+    job = progressive.start_job(initial, enrich)
+    return dict(initial, job_id=job.id, stream_url=f'/webhook/stream?id={job.id}')
+
+
+def _flag(value, default=False):
+    """クエリやJSONの真偽値指定を解釈"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _elapsed_ms(started):
+    """perf_counter の開始値からの経過ミリ秒"""
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _parse_time_param(name):
+    """ISO 8601 形式のクエリパラメータをUNIXタイムスタンプに変換"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value} (expected ISO 8601)")
+
+
+@app.route('/x/<key>')
+def intent_link(key):
+    """まとめ通知の短いリンクからX投稿画面へリダイレクト"""
+    twitter_url = digest.resolve_link(key)
+    if not twitter_url:
+        abort(404)
+    return redirect(twitter_url)
+
+
+@app.route('/webhook/stream')
+def webhook_stream():
+    """プログレッシブ処理のエンリッチ結果をServer-Sent Eventsで配信"""
+    job = progressive.get_job(request.args.get('id', ''))
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job', 'status': 'error'}), 404
+    
+    return app.response_class(
+        progressive.stream_events(job),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/history')
+def history():
+    """共有履歴（新しい順、cursor でページング）"""
+    return _history()
+
+
+@app.route('/t/<tenant_path>/history')
+def tenant_history(tenant_path):
+    """パスでテナントを指定する共有履歴"""
+    return _history(tenant_path)
+
+
+def _history(tenant_path=None):
+    try:
+        tenant = _resolve_reader(tenant_path)
+    except tenants.TenantError as e:
+        return jsonify({'error': e.reason, 'status': 'error'}), e.status
+    
+    try:
+        cursor = request.args.get('cursor')
+        rows, next_cursor = search_history(
+            tenant=tenant.id,
+            platform=request.args.get('platform') or None,
+            username=request.args.get('username') or None,
+            since=_parse_time_param('since'),
+            until=_parse_time_param('until'),
+            cursor=int(cursor) if cursor else None,
+            limit=int(request.args.get('limit', 50))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+    
+    for row in rows:
+        row['created_at'] = datetime.fromtimestamp(row['created_at']).isoformat()
+    
+    return jsonify({
+        'items': rows,
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/stats')
+def stats():
+    """共有の統計（プラットフォーム・種類・ユーザー名・時間ごとの共有数、本文取得と通知の成功率）"""
+    return _stats()
+
+
+@app.route('/t/<tenant_path>/stats')
+def tenant_stats(tenant_path):
+    """パスでテナントを指定する統計"""
+    return _stats(tenant_path)
+
+
+def _stats(tenant_path=None):
+    try:
+        tenant = _resolve_reader(tenant_path)
+    except tenants.TenantError as e:
+        return jsonify({'error': e.reason, 'status': 'error'}), e.status
+    
+    started = time.perf_counter()
+    try:
+        result = share_stats(
+            tenant=tenant.id,
+            since=_parse_time_param('since'),
+            until=_parse_time_param('until'),
+            bucket=request.args.get('bucket') or None,
+            top=int(request.args.get('top', 10))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+    
+    result['since'] = datetime.fromtimestamp(result['since']).isoformat()
+    result['until'] = datetime.fromtimestamp(result['until']).isoformat()
+    result['took_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(result)
+
+
+@app.route('/search')
+def search():
+    """共有履歴の全文検索（本文・ユーザー名・ハッシュタグ、関連度順、cursor でページング）"""
+    return _search()
+
+
+@app.route('/t/<tenant_path>/search')
+def tenant_search(tenant_path):
+    """パスでテナントを指定する全文検索"""
+    return _search(tenant_path)
+
+
+def _search(tenant_path=None):
+    try:
+        tenant = _resolve_reader(tenant_path)
+    except tenants.TenantError as e:
+        return jsonify({'error': e.reason, 'status': 'error'}), e.status
+    
+    started = time.perf_counter()
+    try:
+        rows, next_cursor = search_shares(
+            request.args.get('q', ''),
+            tenant=tenant.id,
+            platform=request.args.get('platform') or None,
+            since=_parse_time_param('since'),
+            until=_parse_time_param('until'),
+            cursor=request.args.get('cursor') or None,
+            limit=int(request.args.get('limit', 20))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+    elapsed = time.perf_counter() - started
+    metrics.observe('search_seconds', elapsed)
+    
+    for row in rows:
+        row['created_at'] = datetime.fromtimestamp(row['created_at']).isoformat()
+    
+    return jsonify({
+        'items': rows,
+        'next_cursor': next_cursor,
+        'took_ms': round(elapsed * 1000, 2)
+    })
+
+
+def _debug_token_valid():
+    """X-Debug-Token ヘッダーまたは token クエリが DEBUG_TOKEN と一致するか"""
+    if not DEBUG_TOKEN:
+        return False
+    provided = request.headers.get('X-Debug-Token') or request.args.get('token', '')
+    return hmac.compare_digest(provided.encode('utf-8'), DEBUG_TOKEN.encode('utf-8'))
+
+
+def _require_debug_token():
+    """/debug/* の認証（DEBUG_TOKEN 未設定ならエンドポイント自体を隠す）"""
+    if not DEBUG_TOKEN:
+        abort(404)
+    if not _debug_token_valid():
+        abort(403)
+
+
+@app.route('/debug/memory')
+def debug_memory():
+    """メモリ使用状況と割り当ての多い箇所（MEMORY_TRACING=1 のとき）"""
+    _require_debug_token()
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': f'Invalid group_by: {group_by}', 'status': 'error'}), 400
+    return jsonify(memory.summary(int(request.args.get('limit', 20)), group_by))
+
+
+@app.route('/debug/profiles')
+def debug_profiles():
+    """保存済みプロファイルの一覧（新しい順）"""
+    _require_debug_token()
+    return jsonify({'captures': profiling.list_captures()})
+
+
+@app.route('/debug/profiles/<name>')
+def debug_profile_file(name):
+    """プロファイルファイルを取得（.pstats または .collapsed）"""
+    _require_debug_token()
+    path = profiling.capture_path(name)
+    if path is None:
+        abort(404)
+    if name.endswith('.collapsed'):
+        return send_file(os.path.abspath(path), mimetype='text/plain')
+    return send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                     as_attachment=True, download_name=name)
+
+
+@app.after_request
+def _check_memory_soft_limit(response):
+    """レスポンス送信後にRSSを確認し、ソフトリミット超過ならワーカーを入れ替える"""
+    if memory.MEMORY_SOFT_LIMIT_MB:
+        server_software = request.environ.get('SERVER_SOFTWARE', '')
+        response.call_on_close(lambda: memory.check_soft_limit(server_software))
+    return response
+
+
 @app.route('/health')
 def health():
-    """ヘルスチェック"""
+    """ヘルスチェック（上流の状態はバックグラウンドの確認結果で、ここでは通信しない）"""
     return jsonify({
         'status': 'healthy',
+        'upstreams': upstreams.snapshot(),
+        'admission': admission.limiter.snapshot(),
+        'lanes': TENANTS.lanes(),
+        'scheduler': scheduler.scheduler.snapshot(),
         'timestamp': datetime.now().isoformat()
     })
 
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """プロセス内メトリクス（上流リトライ回数など）"""
+    return jsonify(metrics.snapshot())
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+保存済みリンクの一括変換（X投稿文の下書きを作る）
+
+  python backfill.py links.txt -o drafts.jsonl
+  cat links.txt | python backfill.py - -o drafts.jsonl
+
+入力は1行1URL（空行と # で始まる行は無視）。入力は1行ずつ読み、全体をメモリに載せない。
+結果は1行1件のJSONLで出力ファイルに追記する（通知・履歴記録は行わない）。
+
+進捗は <出力>.checkpoint に保存する。中断後に同じ入力・同じ出力で再実行すると、
+処理済みの行を飛ばして続きから再開する（出力はチェックポイント時点の長さに切り詰めるので重複しない）。
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from services import http_client, providers
+from services.admission import TokenBucket
+from services.common import create_twitter_intent_url, detect_platform
+from templates import create_tweet_text
+
+
+# チェックポイントを書き出す間隔（秒）
+CHECKPOINT_INTERVAL = 1.0
+
+
+class HostRateLimiter:
+    """ホストごとのトークンバケットで上流へのリクエストを間引く transport"""
+
+    def __init__(self, rate_per_second, burst=1, inner=None):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.inner = inner
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, method, url, **kwargs):
+        host = (urlsplit(url).hostname or '').lower()
+        while True:
+            with self._lock:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+                wait = bucket.take()
+            if not wait:
+                break
+            time.sleep(wait)
+        return (self.inner or requests.request)(method, url, **kwargs)
+
+
+class Checkpoint:
+    """処理済みの行と出力ファイルの長さを記録する
+
+    watermark より前の行はすべて処理済み。並行処理で先に終わった行は done に持つ
+    （done の大きさは同時処理数程度に収まる）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.watermark = 0
+        self.done = set()
+        self.output_offset = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.watermark = state['watermark']
+            self.done = set(state['done'])
+            self.output_offset = state['output_offset']
+
+    def is_done(self, line_no):
+        return line_no < self.watermark or line_no in self.done
+
+    def mark(self, line_no, output_offset):
+        self.done.add(line_no)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+        self.output_offset = output_offset
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'watermark': self.watermark,
+                'done': sorted(self.done),
+                'output_offset': self.output_offset,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+class Backfill:
+    """入力を流しながら、上限付きの並行数で抽出・投稿文生成を行う"""
+
+    def __init__(self, output_path, checkpoint_path, concurrency):
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.concurrency = concurrency
+        self.counts = {'ok': 0, 'error': 0, 'skipped': 0}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(concurrency * 2)
+        self._saved_at = 0.0
+
+        self.output = open(output_path, 'ab')
+        if self.checkpoint.output_offset is None:
+            # 新規の実行は既存の出力の後ろに追記
+            self.checkpoint.output_offset = self.output.seek(0, os.SEEK_END)
+        else:
+            # 前回の中断時にチェックポイント後に書かれた分を捨てる
+            self.output.truncate(self.checkpoint.output_offset)
+            self.output.seek(self.checkpoint.output_offset)
+
+    def run(self, lines):
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='backfill')
+        try:
+            for line_no, line in enumerate(lines):
+                if self.checkpoint.is_done(line_no):
+                    self.counts['skipped'] += 1
+                    continue
+                url = line.strip()
+                if not url or url.startswith('#'):
+                    self._complete(line_no, None)
+                    continue
+                # 同時処理数の2倍までしか先読みしない
+                self._slots.acquire()
+                executor.submit(self._process, line_no, url)
+        except KeyboardInterrupt:
+            print("Interrupted, finishing in-flight URLs...", file=sys.stderr)
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            with self._lock:
+                self.checkpoint.save()
+            self.output.close()
+
+    def _process(self, line_no, url):
+        try:
+            record = convert(url)
+        except Exception as e:
+            record = {'url': url, 'status': 'error', 'error': str(e)}
+        finally:
+            self._slots.release()
+        record['line'] = line_no
+        self._complete(line_no, record)
+
+    def _complete(self, line_no, record):
+        with self._lock:
+            if record is not None:
+                self.output.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.output.flush()
+                self.counts[record['status']] += 1
+            self.checkpoint.mark(line_no, self.output.tell())
+            now = time.monotonic()
+            if now - self._saved_at >= CHECKPOINT_INTERVAL:
+                self.checkpoint.save()
+                self._saved_at = now
+
+
+def convert(url):
+    """1件のURLから投稿情報とX投稿文を作る"""
+    platform = detect_platform(url)
+    if not platform:
+        return {'url': url, 'status': 'error', 'error': 'Unsupported platform'}
+
+    info = providers.extract(url, {})
+    tweet_text = create_tweet_text(info)
+    return {
+        'url': url,
+        'status': 'ok',
+        'platform': platform,
+        'info': info.to_dict(),
+        'tweet_text': tweet_text,
+        'twitter_url': create_twitter_intent_url(tweet_text),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert saved Instagram/TikTok/YouTube links into tweet drafts')
+    parser.add_argument('input', help="URL list file ('-' for stdin)")
+    parser.add_argument('-o', '--output', required=True, help='JSONL output file (appended)')
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <output>.checkpoint)')
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1.0, help='max upstream requests per second per host')
+    parser.add_argument('--burst', type=int, default=2)
+    args = parser.parse_args()
+
+    http_client.set_transport(HostRateLimiter(args.rate, args.burst, http_client.get_transport()))
+    backfill = Backfill(args.output, args.checkpoint or f'{args.output}.checkpoint', max(1, args.concurrency))
+
+    started = time.monotonic()
+    stream = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    try:
+        backfill.run(stream)
+    except KeyboardInterrupt:
+        print("Stopped. Progress saved; rerun the same command to resume.", file=sys.stderr)
+        return 130
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    counts = backfill.counts
+    print(f"✓ Backfill done in {time.monotonic() - started:.1f}s: "
+          f"{counts['ok']} ok, {counts['error']} errors, {counts['skipped']} skipped (already done)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
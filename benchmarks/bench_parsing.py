@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+HTML解析ベンチマーク
+同じプロセス内での解析（inline）とプロセスプールでの解析（pool）を、
+同時共有数 1 / 8 / 32 で比較する
+
+使い方:
+  python benchmarks/bench_parsing.py                 # 合成したInstagram風ページで計測
+  python benchmarks/bench_parsing.py saved_page.html # 保存したページで計測
+"""
+
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import parsing  # noqa: E402
+
+
+CONCURRENCY_LEVELS = [1, 8, 32]
+SHARES_PER_LEVEL = 64
+POOL_SIZE = os.cpu_count() or 2
+
+
+def synthetic_page(size_kb=400):
+    """Instagramのページに近いサイズ・構造のHTMLを生成"""
+    head = (
+        '<html><head><title>Instagram</title>'
+        '<meta property="og:title" content="example_user on Instagram">'
+        '<meta property="og:description" content="123 likes - example_user on Instagram: &quot;ラーメン巡り #ramen&quot;">'
+        '<meta property="og:image" content="https://example.com/image.jpg">'
+        '</head><body>'
+    )
+    block = '<div class="x1 x2"><span>投稿</span><a href="/p/ABC/">link</a></div>' * 20
+    script = '<script type="application/json">{"data": "' + 'x' * 2000 + '"}</script>'
+    body = []
+    while sum(len(part) for part in body) < size_kb * 1024:
+        body.append(block)
+        body.append(script)
+    return (head + ''.join(body) + '</body></html>').encode('utf-8')
+
+
+def run_level(html, concurrency):
+    latencies = []
+
+    def one():
+        started = time.perf_counter()
+        meta = parsing.parse_meta(html)
+        latencies.append(time.perf_counter() - started)
+        assert 'og:description' in meta
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(one) for _ in range(SHARES_PER_LEVEL)]:
+            future.result()
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'throughput': SHARES_PER_LEVEL / total,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            html = f.read()
+    else:
+        html = synthetic_page()
+
+    print(f"Page size: {len(html) / 1024:.0f} KB, pool workers: {POOL_SIZE}\n")
+    print(f"{'mode':<8}{'concurrency':>12}{'shares/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+
+    for mode in ('inline', 'pool'):
+        parsing.PARSE_POOL_SIZE = POOL_SIZE if mode == 'pool' else 0
+        parsing.PARSE_INLINE_THRESHOLD = 0
+        if mode == 'pool':
+            parsing.parse_meta(html)  # ワーカー起動分を除外
+        for concurrency in CONCURRENCY_LEVELS:
+            result = run_level(html, concurrency)
+            print(f"{mode:<8}{concurrency:>12}{result['throughput']:>12.1f}"
+                  f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+
+    parsing.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
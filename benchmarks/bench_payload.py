@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+ペイロード正規化のベンチマーク・ファズ
+1. payload_corpus.jsonl の各ケースが期待どおりのURLになるか（空文字は 400 で拒否）を確認
+2. コーパスを乱数で壊した入力（切り詰め・バイト置換・挿入・入れ子）で、
+   PayloadError 以外の例外が出ないことを確認
+3. 形式ごとの正規化と、上限超過ボディの拒否にかかる時間を計測
+
+使い方:
+  python benchmarks/bench_payload.py              # 既定（ファズ 20000 回）
+  python benchmarks/bench_payload.py 200000       # ファズの回数を指定
+"""
+
+import io
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import payload  # noqa: E402
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'payload_corpus.jsonl')
+FUZZ_ITERATIONS = 20000
+NUMBER = 20000
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize(body, content_type):
+    """URL（拒否されたら空文字）"""
+    try:
+        return payload.normalize(body, content_type).url
+    except payload.PayloadError as e:
+        assert e.status == 400, e.status
+        return ''
+
+
+def check_corpus(corpus):
+    failures = 0
+    for case in corpus:
+        got = normalize(case['body'].encode('utf-8'), case['content_type'])
+        if got != case['url']:
+            failures += 1
+            print(f"✗ {case['content_type'] or '(none)'} {case['body'][:60]!r}: {got!r} != {case['url']!r}")
+    print(f"corpus: {len(corpus) - failures}/{len(corpus)} ok")
+    return failures == 0
+
+
+def mutate(rng, body):
+    """ランダムに壊した入力"""
+    data = bytearray(body)
+    for _ in range(rng.randint(1, 4)):
+        action = rng.randrange(5)
+        position = rng.randint(0, len(data))
+        if action == 0:
+            del data[position:]
+        elif action == 1 and data:
+            data[min(position, len(data) - 1)] = rng.randrange(256)
+        elif action == 2:
+            data[position:position] = rng.choice([b'{', b'}', b'[', b'"', b'\\', b'\\/', b'%', b'=', b'&', b'\xe3\x81'])
+        elif action == 3:
+            data = bytearray(b'{"url": ' + json.dumps(data.decode('utf-8', 'replace')).encode('utf-8') + b'}')
+        else:
+            data = bytearray(rng.choice([b'[', b'{"url":']) * rng.randint(1, 2000) + bytes(data))
+    return bytes(data)
+
+
+def fuzz(corpus, iterations):
+    rng = random.Random(0)
+    content_types = sorted({case['content_type'] for case in corpus})
+    accepted = 0
+    for _ in range(iterations):
+        case = rng.choice(corpus)
+        body = mutate(rng, case['body'].encode('utf-8'))
+        url = normalize(body, rng.choice(content_types))
+        assert isinstance(url, str) and not url.startswith(('{', '[')), url
+        accepted += bool(url)
+    print(f"fuzz: {iterations} inputs, {accepted} accepted, no unexpected errors")
+
+
+def bench(corpus):
+    samples = {
+        'json        ': (corpus[0], 'application/json'),
+        'json (x3)   ': (corpus[5], 'application/json'),
+        'form        ': (corpus[12], 'application/x-www-form-urlencoded'),
+        'text (prose)': (corpus[17], 'text/plain'),
+    }
+    for label, (case, content_type) in samples.items():
+        body = case['body'].encode('utf-8')
+        seconds = min(timeit.repeat(lambda: payload.normalize(body, content_type), number=NUMBER, repeat=3))
+        print(f"{label}: {seconds / NUMBER * 1e6:6.2f} µs/payload")
+
+    # Content-Length なし（チャンク転送）の 16MB ボディでも上限+1バイトで読むのをやめる
+    huge = b'x' * (16 * 1024 * 1024)
+
+    def reject():
+        stream = io.BytesIO(huge)
+        try:
+            payload.read_body(stream)
+        except payload.PayloadError:
+            return stream.tell()
+
+    read = reject()
+    seconds = min(timeit.repeat(reject, number=200, repeat=3))
+    print(f"oversized   : {seconds / 200 * 1e6:6.2f} µs/payload (read {read} of {len(huge)} bytes)")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else FUZZ_ITERATIONS
+    corpus = load_corpus()
+    if not check_corpus(corpus):
+        sys.exit(1)
+    fuzz(corpus, iterations)
+    bench(corpus)
+
+
+if __name__ == '__main__':
+    main()
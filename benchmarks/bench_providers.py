@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+プロバイダーのベンチマーク
+oEmbed JSON と HTMLページ取得＋解析の、転送量とレイテンシを比較する
+
+使い方:
+  python benchmarks/bench_providers.py                     # 実際の上流に接続（要ネットワーク）
+  python benchmarks/bench_providers.py https://www.tiktok.com/@user/video/123 https://youtu.be/abc
+  python benchmarks/bench_providers.py --replay            # regression/corpus.jsonl.gz を再生（ネットワーク不要）
+  HTTP_REPLAY_PATH=corpus.jsonl.gz python benchmarks/bench_providers.py <URL> ...
+
+再生時のレイテンシは通信を含まず、解析などの処理時間だけになる（転送量は記録時のもの）
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import http_client  # noqa: E402
+from services.parsing import parse_meta  # noqa: E402
+from services.recording import ReplayTransport  # noqa: E402
+
+
+REPEATS = 5
+
+DEFAULT_URLS = [
+    'https://www.tiktok.com/@tiktok/video/7106594312292453675',
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://www.youtube.com/shorts/aqz-KE-bpKQ',
+]
+
+# リポジトリに含まれる合成コーパス（regression/synthetic.py）にoEmbedとページの両方があるURL
+REPLAY_CORPUS = os.path.join(os.path.dirname(__file__), '..', 'regression', 'corpus.jsonl.gz')
+REPLAY_URLS = [
+    'https://www.tiktok.com/@cafe.hanako/video/7300000000000000001',
+]
+
+HTML_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+}
+
+
+def oembed_endpoint(url):
+    if 'tiktok.com' in url:
+        return 'https://www.tiktok.com/oembed', {'url': url}
+    return 'https://www.youtube.com/oembed', {'url': url, 'format': 'json'}
+
+
+def measure(fetch):
+    sizes, latencies = [], []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        try:
+            size = fetch()
+        except Exception as e:
+            print(f"  failed: {e}")
+            continue
+        latencies.append(time.perf_counter() - started)
+        sizes.append(size)
+    if not latencies:
+        return None
+    return statistics.median(sizes), statistics.median(latencies) * 1000
+
+
+def fetch_oembed(url):
+    endpoint, params = oembed_endpoint(url)
+    response = http_client.get(endpoint, params=params, timeout=10)
+    response.json()
+    return len(response.content)
+
+
+def fetch_html(url):
+    response = http_client.get(url, headers=HTML_HEADERS, timeout=15)
+    parse_meta(response.content)
+    return len(response.content)
+
+
+def main():
+    args = sys.argv[1:]
+    if '--replay' in args:
+        args.remove('--replay')
+        http_client.set_transport(ReplayTransport(REPLAY_CORPUS))
+        print(f"Replaying {REPLAY_CORPUS} (no network)")
+    replaying = isinstance(http_client.get_transport(), ReplayTransport)
+    urls = args or (REPLAY_URLS if replaying else DEFAULT_URLS)
+    print(f"{'path':<8}{'bytes':>12}{'median ms':>12}  url")
+    for url in urls:
+        for name, fetch in (('oembed', fetch_oembed), ('html', fetch_html)):
+            result = measure(lambda: fetch(url))
+            if result is None:
+                print(f"{name:<8}{'-':>12}{'-':>12}  {url}")
+            else:
+                size, latency = result
+                print(f"{name:<8}{size:>12.0f}{latency:>12.1f}  {url}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
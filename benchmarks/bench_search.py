@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+共有履歴の全文検索ベンチマーク
+合成した日本語の本文を持つ履歴を一時DBに書き込み（索引はトリガーで1件ずつ更新）、
+/search と同じ検索のレイテンシ（p50 / p99）を語ごとに計測する
+
+使い方:
+  python benchmarks/bench_search.py           # 100000件
+  python benchmarks/bench_search.py 500000    # 件数を指定
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import history  # noqa: E402
+
+
+ROWS = 100000
+QUERIES_PER_TERM = 200
+
+WORDS = ['ラーメン', '寿司', 'カフェ巡り', '新しくオープン', '紅葉', '京都旅行', '猫', '筋トレ', 'メイク',
+         '朝ごはん', 'キャンプ', '夜景', '推し活', 'ライブ', '古着', 'ネイル', 'パン屋', '温泉', '花火', '韓国料理']
+FILLER = ['今日は', 'ずっと行きたかった', 'に行ってきました', 'めちゃくちゃ美味しかった', 'また行きたい',
+          '友達と', '週末に', 'おすすめです', '雰囲気も最高', '写真たくさん撮った']
+QUERIES = ['ラーメン', '寿司', 'カフェ巡り 京都', 'ラーメン 美味しかった', 'tokyo_foodie', '#tokyo_foodie', 'ramen_lover',
+           '存在しない語句']
+
+
+def synthetic_username(rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return ''.join(rng.choice(letters) for _ in range(rng.randint(5, 10))) + rng.choice(['', '_', '.']) + str(rng.randrange(100))
+
+
+def synthetic_entries(count, rng):
+    now = time.time()
+    usernames = [synthetic_username(rng) for _ in range(5000)]
+    usernames[42] = 'tokyo_foodie'
+    for i in range(count):
+        username = usernames[rng.randrange(len(usernames))] if rng.random() > 0.01 else 'ramen_lover'
+        words = rng.sample(WORDS, 2) + rng.sample(FILLER, 3)
+        rng.shuffle(words)
+        yield {
+            'created_at': now - (count - i) * 60,
+            'url': f'https://www.instagram.com/reel/{i:08d}/',
+            'platform': rng.choice(['instagram', 'tiktok', 'youtube']),
+            'username': username,
+            'post_code': f'{i:08d}',
+            'type': 'リール',
+            'description': ''.join(words) + '！',
+            'hashtag': f'#{username}',
+            'tweet_text': '',
+            'notification_sent': True,
+            'timings': {},
+            'tenant': 'default' if i % 10 else 'alice',
+        }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(), 'history.sqlite3')
+    conn = history.connect(path)
+    writer = history.HistoryWriter(path)
+
+    started = time.perf_counter()
+    entries = list(synthetic_entries(count, rng))
+    for i in range(0, count, history.BATCH_SIZE):
+        writer._write(conn, entries[i:i + history.BATCH_SIZE])
+    elapsed = time.perf_counter() - started
+    print(f"indexed {count} rows in {elapsed:.1f}s ({elapsed / count * 1e6:.0f} µs/row, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB)")
+
+    for q in QUERIES:
+        latencies = []
+        for _ in range(QUERIES_PER_TERM):
+            started = time.perf_counter()
+            rows, next_cursor = history.search(conn, q, tenant='default', limit=20)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(f"{q:12s}: p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  ({len(rows)} hits on first page)")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
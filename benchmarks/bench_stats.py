@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+共有統計のベンチマーク
+合成した履歴を一時DBに書き込み（集計テーブルは書き込みと同じトランザクションで更新）、
+/stats と同じ集計テーブルからの取得と、履歴テーブルを毎回 GROUP BY する場合の時間を比較する
+
+使い方:
+  python benchmarks/bench_stats.py           # 100000件
+  python benchmarks/bench_stats.py 300000    # 件数を指定
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import history, stats  # noqa: E402
+
+
+ROWS = 100000
+REPEAT = 50
+
+# (ラベル, 期間の秒数)
+RANGES = [('24h', 86400), ('7d', 7 * 86400), ('90d', 90 * 86400)]
+
+PLATFORM_TYPES = {'instagram': ['リール', '投稿'], 'tiktok': ['動画'], 'youtube': ['動画', 'ショート']}
+
+
+def synthetic_entries(count, rng, now):
+    usernames = [f'user{i}' for i in range(3000)]
+    # 直近180日に分散
+    step = 180 * 86400 / count
+    for i in range(count):
+        platform = rng.choice(list(PLATFORM_TYPES))
+        yield {
+            'created_at': now - (count - i) * step,
+            'url': f'https://example.com/{i}',
+            'platform': platform,
+            'username': rng.choice(usernames),
+            'type': rng.choice(PLATFORM_TYPES[platform]),
+            'description': 'caption' if rng.random() < 0.8 else '',
+            'notification_sent': rng.random() < 0.97,
+            'tenant': 'default',
+        }
+
+
+def scan(conn, since, until):
+    """集計テーブルを使わずに履歴を毎回集計する場合"""
+    where = 'tenant = ? AND created_at >= ? AND created_at < ?'
+    params = ['default', since, until]
+    conn.execute(f'SELECT COUNT(*), SUM(description != \'\'), SUM(notification_sent) FROM shares WHERE {where}',
+                 params).fetchall()
+    for column in ('platform', 'type'):
+        conn.execute(f'SELECT {column}, COUNT(*) FROM shares WHERE {where} GROUP BY {column}', params).fetchall()
+    conn.execute(f'SELECT username, COUNT(*) FROM shares WHERE {where} GROUP BY username'
+                 ' ORDER BY COUNT(*) DESC LIMIT 10', params).fetchall()
+    conn.execute(f'SELECT CAST(created_at / 3600 AS INTEGER), COUNT(*) FROM shares WHERE {where}'
+                 ' GROUP BY 1', params).fetchall()
+
+
+def timed(func, repeat=REPEAT):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    rng = random.Random(0)
+    now = time.time()
+    path = os.path.join(tempfile.mkdtemp(), 'history.sqlite3')
+    conn = history.connect(path)
+    writer = history.HistoryWriter(path)
+
+    entries = list(synthetic_entries(count, rng, now))
+    started = time.perf_counter()
+    for i in range(0, count, history.BATCH_SIZE):
+        writer._write(conn, entries[i:i + history.BATCH_SIZE])
+    elapsed = time.perf_counter() - started
+    rollup_rows = sum(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in stats.TABLES.values())
+    print(f"wrote {count} rows in {elapsed:.1f}s ({elapsed / count * 1e6:.0f} µs/row incl. rollups,"
+          f" {rollup_rows} rollup rows)")
+
+    for label, seconds in RANGES:
+        since, until = now - seconds, now
+        result = stats.query(conn, since=since, until=until)
+        rolled = timed(lambda: stats.query(conn, since=since, until=until))
+        scanned = timed(lambda: scan(conn, since, until), repeat=5)
+        print(f"{label:>4} ({result['bucket']:4s}, {result['totals']['shares']:6d} shares):"
+              f" rollups {rolled:6.2f} ms   history scan {scanned:7.2f} ms")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+テンプレート描画のベンチマーク
+標準の create_tweet_text / create_pushover_message と、同じ書式をテンプレートエンジンで
+コンパイルした関数（単体と、TemplateSet 経由の検索込み）の描画速度を比較する
+
+使い方:
+  python benchmarks/bench_templates.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import SocialMediaInfo  # noqa: E402
+from templates import create_pushover_message, create_tweet_text  # noqa: E402
+from templates.engine import TemplateSet, compile_template  # noqa: E402
+
+
+NUMBER = 50000
+
+# 標準のテンプレートと同じ出力になる書式
+CONFIG = {
+    'default': {
+        'tweet': '{emoji} {display_name}の{type}[[\n\n{caption}]]\n\n{url}\n\n{hashtag}',
+        'pushover_message': '{emoji} {display_name}の{type}[[\n📝 {description|200}]]\n\n🔗 {url}\n\n{hashtag}\n\n👇 タップしてXに投稿',
+    },
+}
+
+
+def sample_info():
+    info = SocialMediaInfo()
+    info.platform = 'instagram'
+    info.username = 'example_user'
+    info.type = 'リール'
+    info.emoji = '🎬'
+    info.url = 'https://www.instagram.com/reel/ABC123/'
+    info.hashtag = '#example_user'
+    info.description = '今日のカフェ巡り☕️ 新しくオープンしたお店に行ってきました。' * 4
+    return info
+
+
+def main():
+    info = sample_info()
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump(CONFIG, f, ensure_ascii=False)
+    templates = TemplateSet(f.name)
+
+    assert templates.render('tweet', info) == create_tweet_text(info)
+    assert templates.render('pushover_message', info) == create_pushover_message(info)
+
+    tweet = compile_template(CONFIG['default']['tweet'])
+    pushover = compile_template(CONFIG['default']['pushover_message'])
+    cases = [
+        ('tweet       builtin  ', lambda: create_tweet_text(info)),
+        ('tweet       compiled ', lambda: tweet(info)),
+        ('tweet       set      ', lambda: templates.render('tweet', info)),
+        ('pushover    builtin  ', lambda: create_pushover_message(info)),
+        ('pushover    compiled ', lambda: pushover(info)),
+        ('pushover    set      ', lambda: templates.render('pushover_message', info)),
+    ]
+    for label, func in cases:
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+        print(f"{label}: {seconds / NUMBER * 1e6:6.2f} µs/render")
+
+    os.remove(f.name)
+
+
+if __name__ == '__main__':
+    main()
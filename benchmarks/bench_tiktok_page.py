@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+TikTokページ解析ベンチマーク
+従来のBeautifulSoupでOGタグを読む方法（ページ全体を読んでDOMを組み立てる）と、
+埋め込みJSON（__UNIVERSAL_DATA_FOR_REHYDRATION__ / SIGI_STATE）だけをストリーミングで探す方法の
+1ページあたりの時間・読んだバイト数と、取れたユーザー名・本文を比較する
+
+使い方:
+  python benchmarks/bench_tiktok_page.py                  # 合成したTikTok風ページで計測
+  python benchmarks/bench_tiktok_page.py page1.html ...   # 保存したページで計測
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import parsing, tiktok_service  # noqa: E402
+
+
+NUMBER = 20
+
+
+def synthetic_page(size_kb=1200):
+    """TikTokの動画ページに近いサイズ・構造のHTMLを生成（埋め込みJSONはページの前半3割ほどの位置）"""
+    state = {'__DEFAULT_SCOPE__': {'webapp.video-detail': {'itemInfo': {'itemStruct': {
+        'id': '7312345678901234567',
+        'desc': '深夜のラーメン巡り🍜 #ramen #東京グルメ',
+        'author': {'uniqueId': 'ramen.taro', 'nickname': 'ラーメン太郎'},
+        'stats': {'playCount': 120345, 'diggCount': 8012, 'commentCount': 91, 'shareCount': 40},
+        'video': {'cover': 'https://example.com/cover.jpg', 'playAddr': 'https://example.com/' + 'v' * 400},
+        'music': {'title': 'original sound - ' + 'x' * 200},
+    }}}, 'webapp.app-context': {'language': 'ja-JP', 'config': {'flags': ['f' * 40] * 400}}}}
+    head = (
+        '<html><head><title>深夜のラーメン巡り🍜 #ramen | TikTok</title>'
+        '<meta property="og:title" content="ラーメン太郎 on TikTok">'
+        '<meta property="og:description" content="深夜のラーメン巡り🍜 #ramen #東京グルメ 8012 Likes, 91 Comments. '
+        'TikTok video from ラーメン太郎 (@ramen.taro): Watch more videos">'
+        '<meta property="og:image" content="https://example.com/cover.jpg">'
+        '<style>' + '.css-x{display:flex}' * 2000 + '</style></head><body>'
+    )
+    block = '<div class="css-1 css-2"><span>おすすめ</span><a href="/@user/video/1">link</a></div>' * 20
+    script = '<script>window.__chunk=' + json.dumps('x' * 4000) + '</script>'
+    embedded = ('<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">'
+                + json.dumps(state, ensure_ascii=False).replace('</', '<\\/') + '</script>')
+    parts = []
+    size = 0
+    while size < size_kb * 1024:
+        if embedded and size > size_kb * 1024 * 0.3:
+            parts.append(embedded)
+            embedded = ''
+        parts.append(block + script)
+        size += len(parts[-1])
+    return (head + ''.join(parts) + '</body></html>').encode('utf-8')
+
+
+def chunks(html):
+    return (html[i:i + tiktok_service.CHUNK_SIZE] for i in range(0, len(html), tiktok_service.CHUNK_SIZE))
+
+
+def with_soup(html):
+    """従来の方法: ページ全体をBeautifulSoupで解析してOGタグを読む"""
+    return tiktok_service.metadata_from_meta(parsing.extract_meta(html)), len(html)
+
+
+def with_embedded_json(html):
+    """埋め込みJSONだけを探す（見つからなければ読んだ部分のOGタグ）"""
+    _, state, read = parsing.find_script_json(chunks(html), tiktok_service.EMBEDDED_STATE_IDS)
+    if state is not None:
+        return tiktok_service.metadata_from_state(state), len(read)
+    return tiktok_service.metadata_from_meta(parsing.extract_meta(bytes(read))), len(read)
+
+
+def main():
+    pages = []
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        pages.append(('synthetic', synthetic_page()))
+
+    for name, html in pages:
+        print(f"{name}: {len(html) / 1024:.0f} KB")
+        for label, extract in (('soup', with_soup), ('embedded_json', with_embedded_json)):
+            metadata, read = extract(html)
+            seconds = min(timeit.repeat(lambda: extract(html), number=NUMBER, repeat=3)) / NUMBER
+            print(f"  {label:<14}{seconds * 1000:8.2f} ms  read {read / 1024:6.0f} KB  "
+                  f"username={metadata.get('username', '')!r}  description={metadata.get('description', '')[:40]!r}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+抽出結果の回帰チェック（オフライン）
+
+記録（要ネットワーク）:
+  python regression/run_regression.py record
+    urls.txt の各URLを実際に取得し、上流レスポンスを corpus.jsonl.gz に保存したうえで、
+    再生した抽出結果と処理時間を baseline.json に保存する
+
+チェック（ネットワーク不要）:
+  python regression/run_regression.py check [--no-timing]
+    corpus.jsonl.gz から上流レスポンスを再生して抽出し、
+    SocialMediaInfo の各フィールドと処理時間を baseline.json と比較する
+    （--no-timing ならフィールドだけ。処理時間はマシンの負荷で変わるのでCIではこちらを使う）
+
+合成コーパスの作成（ネットワーク不要）:
+  python regression/run_regression.py synthesize
+    synthetic.py のスタブが返す合成レスポンスを記録して corpus.jsonl.gz と baseline.json を作る
+    （リポジトリに含めているのはこの合成コーパス。record で実際のレスポンスに置き換えられる）
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from services import http_client  # noqa: E402
+from services.cache import MemoryCache, set_cache  # noqa: E402
+from services.common import detect_platform  # noqa: E402
+from services.providers import get_provider  # noqa: E402
+from services.recording import Recorder, ReplayTransport  # noqa: E402
+from synthetic import URLS as SYNTHETIC_URLS, stub_transport  # noqa: E402
+
+
+URLS_PATH = os.path.join(HERE, 'urls.txt')
+CORPUS_PATH = os.path.join(HERE, 'corpus.jsonl.gz')
+BASELINE_PATH = os.path.join(HERE, 'baseline.json')
+
+REPEATS = 5
+
+# 処理時間の許容範囲（ベースラインの何倍＋何ミリ秒まで）
+TIMING_FACTOR = 1.5
+TIMING_SLACK_MS = 5.0
+
+
+def read_urls(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def extract(url):
+    """キャッシュを空にした状態で1回抽出"""
+    set_cache(MemoryCache())
+    platform = detect_platform(url)
+    if not platform:
+        raise ValueError(f"Unsupported platform: {url}")
+    return get_provider(platform)(url)
+
+
+def replay_all(urls, corpus_path):
+    """コーパスを再生して各URLの抽出結果と処理時間（中央値）を得る"""
+    results = {}
+    for url in urls:
+        timings = []
+        info = None
+        # 1回目は遅延importなどのウォームアップとして計測しない
+        for i in range(REPEATS + 1):
+            # 再生位置を毎回先頭に戻す
+            http_client.set_transport(ReplayTransport(corpus_path))
+            started = time.perf_counter()
+            info = extract(url)
+            if i:
+                timings.append((time.perf_counter() - started) * 1000)
+        results[url] = {
+            'info': info.to_dict(),
+            'median_ms': round(statistics.median(timings), 2),
+        }
+    http_client.set_transport(None)
+    return results
+
+
+def record(args, urls=None, inner=None):
+    urls = urls or read_urls(args.urls)
+    if os.path.exists(args.corpus):
+        os.remove(args.corpus)
+
+    recorder = Recorder(args.corpus, inner)
+    http_client.set_transport(recorder)
+    for url in urls:
+        print(f"Recording {url}")
+        extract(url)
+    recorder.save()
+
+    baseline = replay_all(urls, args.corpus)
+    with open(args.baseline, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    print(f"✓ Baseline written for {len(baseline)} URLs: {args.baseline}")
+    return 0
+
+
+def synthesize(args):
+    return record(args, SYNTHETIC_URLS, stub_transport)
+
+
+def check(args):
+    if not os.path.exists(args.corpus) or not os.path.exists(args.baseline):
+        print("Corpus or baseline not found. Run `record` (needs network) or `synthesize` first.")
+        return 2
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    results = replay_all(list(baseline), args.corpus)
+    failures = 0
+    for url, expected in baseline.items():
+        actual = results[url]
+        problems = [
+            f"{field}: {expected['info'].get(field)!r} -> {value!r}"
+            for field, value in actual['info'].items()
+            if expected['info'].get(field) != value
+        ]
+        limit = expected['median_ms'] * TIMING_FACTOR + TIMING_SLACK_MS
+        if args.timing and actual['median_ms'] > limit:
+            problems.append(f"time: {expected['median_ms']} ms -> {actual['median_ms']} ms")
+
+        status = 'ok' if not problems else 'FAIL'
+        print(f"[{status}] {url} ({actual['median_ms']} ms)")
+        for problem in problems:
+            print(f"    {problem}")
+        failures += bool(problems)
+
+    print(f"\n{len(baseline) - failures}/{len(baseline)} passed")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extraction regression check with recorded upstream responses')
+    parser.add_argument('mode', choices=['record', 'check', 'synthesize'])
+    parser.add_argument('--urls', default=URLS_PATH)
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    # 処理時間はベースラインを記録したマシンに依存するため、CIではフィールドだけを比較する
+    parser.add_argument('--no-timing', dest='timing', action='store_false',
+                        help='compare extracted fields only (check)')
+    args = parser.parse_args()
+    return {'record': record, 'check': check, 'synthesize': synthesize}[args.mode](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
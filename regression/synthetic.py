@@ -0,0 +1,125 @@
+"""
+合成した上流レスポンス（ネットワークなしでコーパスとベースラインを作るためのスタブ）
+実際のページと同じ形（oEmbed JSON、OGタグ、TikTokの埋め込みJSON、短縮URLのリダイレクト）を返す
+
+  python regression/run_regression.py synthesize
+"""
+
+import json
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+URLS = [
+    # Instagram: oEmbed が使えず、ページのOGタグから取得
+    'https://www.instagram.com/tokyo.foodie/p/C5synth0001/',
+    # Instagram: URLにユーザー名がなく、oEmbed の author_name から取得
+    'https://www.instagram.com/reel/C5synth0002/',
+    # TikTok: oEmbed に本文がなく、ページの埋め込みJSONから取得
+    'https://www.tiktok.com/@cafe.hanako/video/7300000000000000001',
+    # TikTok: 短縮URLを展開してから oEmbed
+    'https://vt.tiktok.com/ZSsynth01/',
+    # YouTube: oEmbed（author_url のハンドル）
+    'https://www.youtube.com/watch?v=synthVid001',
+    # YouTube Shorts: oEmbed が失敗し、ページのOGタグから取得
+    'https://youtube.com/shorts/synthShort01',
+]
+
+_INSTAGRAM_PAGE = '''<html><head><title>Instagram</title>
+<meta property="og:title" content="Tokyo Foodie on Instagram: &quot;新しくオープンしたカフェに行ってきました☕️ #カフェ巡り&quot;">
+<meta property="og:description" content="1,234 likes, 56 comments - tokyo.foodie on January 2, 2025: &quot;新しくオープンしたカフェに行ってきました☕️ #カフェ巡り&quot;.">
+<meta property="og:image" content="https://scontent.example.com/C5synth0001.jpg">
+<meta property="og:type" content="article">
+</head><body>''' + '<div class="x1"><span>post</span></div>' * 200 + '</body></html>'
+
+_TIKTOK_STATE = {'__DEFAULT_SCOPE__': {'webapp.video-detail': {'itemInfo': {'itemStruct': {
+    'id': '7300000000000000001',
+    'desc': '朝ごはんのパン屋さん🥐 #パン屋 #朝活',
+    'author': {'uniqueId': 'cafe.hanako', 'nickname': 'はなこ'},
+    'stats': {'playCount': 12034, 'diggCount': 801, 'commentCount': 12, 'shareCount': 4},
+    'video': {'cover': 'https://p16.example.com/7300000000000000001.jpeg'},
+}}}}}
+
+_TIKTOK_PAGE = (
+    '<html><head><meta property="og:description" content="朝ごはんのパン屋さん🥐 801 Likes. '
+    'TikTok video from はなこ (@cafe.hanako): Watch more videos"></head><body>'
+    + '<div class="css-1"><a href="/@user/video/1">link</a></div>' * 300
+    + '<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">'
+    + json.dumps(_TIKTOK_STATE, ensure_ascii=False).replace('</', '<\\/') + '</script>'
+    + '<div class="css-2">tail</div>' * 300 + '</body></html>'
+)
+
+_YOUTUBE_SHORTS_PAGE = '''<html><head><title>夜景タイムラプス - YouTube</title>
+<meta property="og:title" content="夜景タイムラプス #shorts">
+<meta property="og:image" content="https://i.ytimg.com/vi/synthShort01/hq720.jpg">
+</head><body></body></html>'''
+
+
+def _response(url, status=200, body=b'', content_type='application/json'):
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type})
+    response._content = body.encode('utf-8') if isinstance(body, str) else body
+    response._content_consumed = True
+    return response
+
+
+def _json(url, data, status=200):
+    return _response(url, status, json.dumps(data, ensure_ascii=False))
+
+
+def _html(url, body):
+    return _response(url, 200, body, 'text/html; charset=utf-8')
+
+
+def stub_transport(method, url, **kwargs):
+    """requests.request と同じ引数で、合成したレスポンスを返す transport"""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    query.update(kwargs.get('params') or {})
+    target = query.get('url', '')
+
+    if parts.hostname == 'graph.facebook.com':
+        if 'C5synth0002' in target:
+            return _json(url, {
+                'author_name': 'ramen.taro',
+                'title': 'ramen.taro on Instagram: "深夜のラーメン巡り🍜 #ramen"',
+                'thumbnail_url': 'https://scontent.example.com/C5synth0002.jpg',
+            })
+        return _json(url, {'error': {'message': 'Invalid OAuth access token'}}, status=400)
+
+    if parts.hostname == 'www.instagram.com' and 'C5synth0001' in parts.path:
+        return _html(url, _INSTAGRAM_PAGE)
+
+    if parts.hostname == 'vt.tiktok.com':
+        return _response('https://www.tiktok.com/@cafe.hanako/video/7300000000000000002?_r=1', 200, b'', 'text/html')
+
+    if parts.hostname == 'www.tiktok.com' and parts.path == '/oembed':
+        if target.endswith('7300000000000000002'):
+            return _json(url, {
+                'author_unique_id': 'cafe.hanako',
+                'title': '週末の古着屋めぐり👕 #古着',
+                'thumbnail_url': 'https://p16.example.com/7300000000000000002.jpeg',
+            })
+        return _json(url, {'author_unique_id': 'cafe.hanako', 'title': ''})
+
+    if parts.hostname == 'www.tiktok.com' and parts.path.endswith('7300000000000000001'):
+        return _html(url, _TIKTOK_PAGE)
+
+    if parts.hostname == 'www.youtube.com' and parts.path == '/oembed':
+        if 'synthVid001' in target:
+            return _json(url, {
+                'author_name': '夜景チャンネル',
+                'author_url': 'https://www.youtube.com/@yakei_ch',
+                'title': '東京の夜景を空から 4K',
+                'thumbnail_url': 'https://i.ytimg.com/vi/synthVid001/hqdefault.jpg',
+            })
+        return _response(url, 404, 'Not Found', 'text/plain')
+
+    if parts.hostname == 'youtube.com' and 'synthShort01' in parts.path:
+        return _html(url, _YOUTUBE_SHORTS_PAGE)
+
+    return _response(url, 404, 'Not Found', 'text/plain')
@@ -16,6 +16,9 @@ class SocialMediaInfo:
         self.is_video = False    # 動画かどうか
         self.hashtag = ''        # ハッシュタグ
         self.emoji = ''          # 絵文字
+        self.image_url = ''      # サムネイル画像URL（og:image など）
+        self.description_fallback = False  # 本文が取れず、description がフォールバック文言か
+        self.upstream_skipped = False      # 上流が落ちていて取得を飛ばしたか（結果をキャッシュしない）
     
     def to_dict(self):
         """辞書形式に変換"""
@@ -28,5 +31,16 @@ class SocialMediaInfo:
             'type': self.type,
             'is_video': self.is_video,
             'hashtag': self.hashtag,
-            'emoji': self.emoji
+            'emoji': self.emoji,
+            'image_url': self.image_url,
+            'description_fallback': self.description_fallback
         }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """辞書形式から復元"""
+        info = cls()
+        for key, value in data.items():
+            if hasattr(info, key):
+                setattr(info, key, value)
+        return info
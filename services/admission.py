@@ -0,0 +1,163 @@
+"""
+アドミッション制御
+/webhook の同時処理数・待ち行列・クライアントごとのレートを制限し、
+混雑時は 429 / 503 と Retry-After を即座に返して、全員がタイムアウトする事態を防ぐ
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '4'))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '16'))
+ADMISSION_MAX_QUEUE_SECONDS = float(os.environ.get('ADMISSION_MAX_QUEUE_SECONDS', '5'))
+
+# クライアントごとのトークンバケット（1分あたりの補充数とバースト上限、0で無効）
+CLIENT_RATE_PER_MINUTE = float(os.environ.get('CLIENT_RATE_PER_MINUTE', '30'))
+CLIENT_BURST = int(os.environ.get('CLIENT_BURST', '10'))
+
+# 手前にある信頼できるプロキシの段数（Render は1段）。X-Forwarded-For の右からこの位置を
+# クライアントとみなす（それより左はクライアントが自由に付けられるので使わない）。0なら接続元アドレス
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '1'))
+
+# 保持するクライアント数の上限
+MAX_TRACKED_CLIENTS = 4096
+
+
+def client_id(forwarded_for, remote_addr, trusted_proxies=None):
+    """レート制限用のクライアント識別子（信頼できるプロキシが付けた X-Forwarded-For の値）"""
+    trusted_proxies = TRUSTED_PROXY_COUNT if trusted_proxies is None else trusted_proxies
+    hops = [hop.strip() for hop in (forwarded_for or '').split(',') if hop.strip()]
+    if trusted_proxies <= 0 or not hops:
+        return remote_addr or 'unknown'
+    # 段数より少なければ、先頭もプロキシが付けた値
+    return hops[-min(trusted_proxies, len(hops))]
+
+
+class AdmissionRejected(Exception):
+    """受け付けを拒否した（status と retry_after 秒を持つ）"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class TokenBucket:
+    """トークンバケット"""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        """トークンを1つ消費する。足りなければ補充までの秒数を返す（成功時は0）"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """クライアントごとのトークンバケット（古いクライアントから破棄）"""
+
+    def __init__(self, rate_per_minute=CLIENT_RATE_PER_MINUTE, burst=CLIENT_BURST):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client_id):
+        """レート超過なら AdmissionRejected(429) を送出"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+            wait = bucket.take()
+        if wait:
+            metrics.increment('admission_rejected', reason='rate_limited')
+            raise AdmissionRejected(429, 'Too many requests from this client', wait)
+
+
+class ConcurrencyLimiter:
+    """同時処理数の上限と、上限付き・待ち時間付きの待ち行列"""
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, max_queue=ADMISSION_MAX_QUEUE,
+                 max_queue_seconds=ADMISSION_MAX_QUEUE_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_seconds = max_queue_seconds
+        self.active = 0
+        self.waiting = 0
+        self._service_time = 1.0   # 処理時間の移動平均（Retry-After の見積もり用）
+        self._condition = threading.Condition()
+
+    def _retry_after(self):
+        backlog = self.waiting + self.active
+        return self._service_time * backlog / max(1, self.max_concurrent)
+
+    def acquire(self):
+        """処理枠を確保する。確保できなければ AdmissionRejected(503) を送出"""
+        with self._condition:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                return time.monotonic()
+
+            if self.waiting >= self.max_queue:
+                metrics.increment('admission_rejected', reason='queue_full')
+                raise AdmissionRejected(503, 'Server busy', self._retry_after())
+
+            self.waiting += 1
+            queued = time.monotonic()
+            try:
+                admitted = self._condition.wait_for(
+                    lambda: self.active < self.max_concurrent, self.max_queue_seconds
+                )
+            finally:
+                self.waiting -= 1
+
+            if not admitted:
+                metrics.increment('admission_rejected', reason='queue_timeout')
+                raise AdmissionRejected(503, 'Server busy', self._retry_after())
+
+            self.active += 1
+            metrics.observe('admission_queue_seconds', time.monotonic() - queued)
+            return time.monotonic()
+
+    def release(self, started):
+        """処理枠を返す（acquire の戻り値を渡す）"""
+        with self._condition:
+            self.active -= 1
+            elapsed = time.monotonic() - started
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self._condition.notify()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+            }
+
+
+rate_limiter = ClientRateLimiter()
+limiter = ConcurrencyLimiter()
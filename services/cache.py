@@ -0,0 +1,360 @@
+"""
+キャッシュバックエンド
+gunicornの複数ワーカーで取得結果を共有するための共通インターフェース
+
+- memory: プロセス内（ワーカー間では共有されない）
+- sqlite: ローカルのSQLiteファイル（同一ホストのワーカー間で共有）
+- redis : Redisプロトコル互換サーバー（ホストをまたいで共有）
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from . import SocialMediaInfo, metrics
+
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', 'cache.sqlite3')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '3600'))
+
+
+class CacheBackend:
+    """キャッシュの共通インターフェース
+
+    値はJSONにシリアライズして保存する。サブクラスは
+    _get_raw_many / _set_raw_many / delete を実装する。
+    キャッシュはベストエフォートで、障害時はミス扱いにする。
+    """
+
+    name = 'base'
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def get_many(self, keys):
+        """複数キーをまとめて取得（見つかったものだけを返す）"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            raw = self._get_raw_many(keys)
+        except Exception as e:
+            print(f"Cache get failed ({self.name}): {e}")
+            metrics.increment('cache_errors', backend=self.name, op='get')
+            return {}
+
+        result = {}
+        for key, value in raw.items():
+            try:
+                result[key] = json.loads(value)
+            except (TypeError, ValueError) as e:
+                # 壊れた値はミス扱い（上書きされるまで読み飛ばす）
+                print(f"Cache value for {key} is not valid JSON ({self.name}): {e}")
+                metrics.increment('cache_errors', backend=self.name, op='decode')
+        metrics.increment('cache_hits', len(result), backend=self.name)
+        metrics.increment('cache_misses', len(keys) - len(result), backend=self.name)
+        return result
+
+    def set_many(self, mapping, ttl=None):
+        """複数キーをまとめて保存"""
+        if not mapping:
+            return
+        ttl = CACHE_TTL_SECONDS if ttl is None else ttl
+        raw = {key: json.dumps(value, ensure_ascii=False) for key, value in mapping.items()}
+        try:
+            self._set_raw_many(raw, ttl)
+        except Exception as e:
+            print(f"Cache set failed ({self.name}): {e}")
+            metrics.increment('cache_errors', backend=self.name, op='set')
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def _get_raw_many(self, keys):
+        raise NotImplementedError
+
+    def _set_raw_many(self, mapping, ttl):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """プロセス内キャッシュ（上限付きLRU）"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_raw_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def _set_raw_many(self, mapping, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteCache(CacheBackend):
+    """ローカルSQLiteファイルのキャッシュ（WALモード）"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache (expires_at)')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _get_raw_many(self, keys):
+        conn = self._connection()
+        placeholders = ','.join('?' * len(keys))
+        rows = conn.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?',
+            (*keys, time.time()),
+        ).fetchall()
+        return dict(rows)
+
+    def _set_raw_many(self, mapping, ttl):
+        conn = self._connection()
+        expires_at = time.time() + ttl
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                [(key, value, expires_at) for key, value in mapping.items()],
+            )
+            # 書き込みのついでに期限切れを掃除
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+
+    def delete(self, key):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+class RedisError(RuntimeError):
+    """サーバーが返したエラー応答（-ERR など）"""
+
+
+class RedisCache(CacheBackend):
+    """Redisプロトコル（RESP）互換サーバーのキャッシュ
+
+    外部ライブラリを使わず、必要なコマンド（MGET/SET/DEL/AUTH/SELECT）だけを話す。
+    """
+
+    name = 'redis'
+
+    def __init__(self, url=CACHE_REDIS_URL, timeout=2.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # ----- RESP -----
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        try:
+            if self.password:
+                self._call('AUTH', self.password)
+            if self.db:
+                self._call('SELECT', self.db)
+        except Exception:
+            self._close()
+            raise
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    @staticmethod
+    def _encode(*args):
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    def _read_reply(self):
+        """応答を1つ読む（エラー応答は例外にせず RedisError を返し、後続の応答も読めるようにする）"""
+        reader = self._local.reader
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by cache server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            return RedisError(payload.decode('utf-8'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RuntimeError(f'Unexpected reply from cache server: {line!r}')
+
+    def _pipeline(self, commands):
+        """コマンドをまとめて送信し、応答を順に返す（切断時は1回だけ再接続）
+
+        エラー応答があってもすべての応答を読み切ってから例外にする（次のコマンドが前の応答を読まないように）。
+        応答を読み切れなかった場合は接続を閉じる。
+        """
+        for attempt in range(2):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                self._local.sock.sendall(b''.join(self._encode(*cmd) for cmd in commands))
+                replies = [self._read_reply() for _ in commands]
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._close()
+                raise
+            for reply in replies:
+                if isinstance(reply, RedisError):
+                    raise reply
+            return replies
+
+    def _call(self, *args):
+        self._local.sock.sendall(self._encode(*args))
+        reply = self._read_reply()
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    # ----- CacheBackend -----
+
+    def _get_raw_many(self, keys):
+        values = self._pipeline([('MGET', *keys)])[0]
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def _set_raw_many(self, mapping, ttl):
+        ttl_ms = max(1, int(ttl * 1000))
+        self._pipeline([('SET', key, value, 'PX', ttl_ms) for key, value in mapping.items()])
+
+    def delete(self, key):
+        try:
+            self._pipeline([('DEL', key)])
+        except Exception as e:
+            print(f"Cache delete failed ({self.name}): {e}")
+
+
+# ===== SocialMediaInfo のシリアライズ =====
+
+def get_info(backend, key):
+    """キャッシュから SocialMediaInfo を取得"""
+    data = backend.get(key)
+    return SocialMediaInfo.from_dict(data) if data else None
+
+
+def set_info(backend, key, info, ttl=None):
+    """SocialMediaInfo をキャッシュに保存"""
+    backend.set(key, info.to_dict(), ttl)
+
+
+# ===== 設定からのバックエンド生成 =====
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(kind=None):
+    """種類を指定してバックエンドを生成"""
+    kind = (kind or CACHE_BACKEND).lower()
+    if kind == 'sqlite':
+        return SQLiteCache(CACHE_SQLITE_PATH)
+    if kind == 'redis':
+        return RedisCache(CACHE_REDIS_URL)
+    if kind == 'memory':
+        return MemoryCache()
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+def set_cache(backend):
+    """キャッシュバックエンドを差し替え（テストや回帰チェック用）"""
+    global _backend
+    _backend = backend
+
+
+def get_cache():
+    """設定済みのキャッシュバックエンド（プロセス内で共有）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+                print(f"✓ Cache backend: {_backend.name}")
+    return _backend
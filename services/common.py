@@ -4,9 +4,12 @@
 """
 
 import re
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit, parse_qs
 
 
+# プラットフォームの表示名（ハッシュタグや通知タイトルに使う）
+PLATFORM_NAMES = {'instagram': 'Instagram', 'tiktok': 'TikTok', 'youtube': 'YouTube'}
+
 def detect_platform(url):
     """URLからプラットフォームを検出"""
     url_lower = url.lower()
@@ -25,13 +28,25 @@ def clean_url(url):
     """URLをクリーンアップ（クエリパラメータ削除など）"""
     # クエリパラメータを削除
     clean = url.split('?')[0].rstrip('/')
+    
+    # YouTubeのwatch URLは動画IDがクエリ（v）にあるので残す
+    if clean.lower().endswith('youtube.com/watch'):
+        video_ids = parse_qs(urlsplit(url).query).get('v')
+        if video_ids:
+            clean = f'{clean}?v={video_ids[0]}'
+    
     return clean
 
 
+def platform_name(platform):
+    """プラットフォームの表示名（Youtube ではなく YouTube）"""
+    return PLATFORM_NAMES.get(platform, platform.title())
+
+
 def create_hashtag(username, platform):
     """ユーザー名とプラットフォームからハッシュタグを生成"""
-    if not username or username in ['Instagram', 'TikTok', 'YouTube']:
-        return f'#{platform.title()}'
+    if not username or username in PLATFORM_NAMES.values():
+        return f'#{platform_name(platform)}'
     
     # ユーザー名をハッシュタグ化（スペースや特殊文字を削除）
     clean_username = username.replace(' ', '').replace('@', '')
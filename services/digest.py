@@ -0,0 +1,150 @@
+"""
+ダイジェスト通知
+短時間に続けて共有された投稿を1件のPushover通知にまとめ、API呼び出しと通知の数を減らす
+
+- 直前の共有から DIGEST_WINDOW_SECONDS 以上空いた共有はすぐに送信し、ウィンドウを開始する
+- ウィンドウ内の共有はためておき、ウィンドウ終了時か DIGEST_MAX_ITEMS 件に達した時点でまとめて送信する
+- 終了時（atexit）にたまっている分を送信する
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+
+from . import history, metrics
+from .cache import get_cache
+from .notifiers import QUEUED, Notification, Notifier
+
+
+DIGEST_MODE = os.environ.get('DIGEST_MODE', '0') == '1'
+DIGEST_WINDOW_SECONDS = float(os.environ.get('DIGEST_WINDOW_SECONDS', '60'))
+DIGEST_MAX_ITEMS = int(os.environ.get('DIGEST_MAX_ITEMS', '10'))
+
+# 公開URL（例: https://xxx.onrender.com）を設定すると、まとめ通知のX投稿リンクを /x/<key> の短いリンクにする
+# リンクは履歴DB（HISTORY_ENABLED=0 なら sqlite / redis のキャッシュ）に保存する。どちらもなければ元のURLのまま
+DIGEST_LINK_BASE_URL = os.environ.get('DIGEST_LINK_BASE_URL', '').rstrip('/')
+DIGEST_LINK_TTL_SECONDS = int(os.environ.get('DIGEST_LINK_TTL_SECONDS', str(7 * 24 * 3600)))
+
+
+class DigestNotifier(Notifier):
+    """通知先をラップし、バースト中の共有をまとめて送信する"""
+
+    def __init__(self, inner, build, window=DIGEST_WINDOW_SECONDS, max_items=DIGEST_MAX_ITEMS,
+                 link_base=DIGEST_LINK_BASE_URL):
+        super().__init__(timeout=inner.timeout)
+        self.inner = inner
+        self.name = inner.name
+        self.build = build              # templates.create_pushover_digest
+        self.window = window
+        self.max_items = max_items
+        self.link_base = link_base
+        self._pending = []
+        self._window_until = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def send(self, notification):
+        batch = None
+        with self._lock:
+            now = time.monotonic()
+            if not self._pending and now >= self._window_until:
+                # バースト外の共有はすぐ送る
+                self._window_until = now + self.window
+                immediate = True
+            else:
+                immediate = False
+                self._pending.append(notification)
+                if len(self._pending) >= self.max_items:
+                    batch = self._take('size')
+                elif self._timer is None:
+                    self._start_timer(self._window_until - now)
+
+        if immediate:
+            return self.inner.send(notification)
+        if batch:
+            return self._send_digest(batch)
+        print(f"✓ Queued for digest: {notification.info.url}")
+        return QUEUED
+
+    def flush(self, reason='shutdown'):
+        """たまっている共有をまとめて送信"""
+        with self._lock:
+            batch = self._take(reason)
+        if batch:
+            self._send_digest(batch)
+
+    def _start_timer(self, delay):
+        self._timer = threading.Timer(max(0.0, delay), self.flush, kwargs={'reason': 'window'})
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _take(self, reason):
+        """ロック内で呼ぶ。ためた分を取り出し、続くバーストに備えてウィンドウを延長する"""
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if batch:
+            self._window_until = time.monotonic() + self.window
+            metrics.increment('digest_flushes', reason=reason)
+            metrics.observe('digest_size', len(batch))
+        return batch
+
+    def _send_digest(self, batch):
+        entries = [(n.info, self._link(n.twitter_url)) for n in batch]
+        digests, oversized = self.build(entries)
+
+        success = True
+        for title, message, _ in digests:
+            digest = Notification(None, '', title=title, message=message, html=True)
+            success = self._safe_send(digest) and success
+        # 1件だけでも本文の上限を超えるもの（長いX投稿リンク）は個別に送る
+        for index in oversized:
+            success = self._safe_send(batch[index]) and success
+
+        print(f"✓ Digest sent: {len(batch)} shares in {len(digests) + len(oversized)} notifications")
+        return success
+
+    def _safe_send(self, notification):
+        # タイマーや終了処理から呼ばれるため、例外はここで止める
+        try:
+            return bool(self.inner.send(notification))
+        except Exception as e:
+            print(f"Error sending digest via {self.name}: {e}")
+            return False
+
+    def _link(self, twitter_url):
+        if not self.link_base:
+            return twitter_url
+        key = hashlib.sha256(twitter_url.encode('utf-8')).hexdigest()[:16]
+        if not _save_link(key, twitter_url):
+            return twitter_url
+        return f'{self.link_base}/x/{key}'
+
+
+def _save_link(key, twitter_url):
+    """他のワーカーや再起動後も引ける保存先に短いリンクを保存（保存先がなければ False）"""
+    if history.HISTORY_ENABLED:
+        return history.save_link(key, twitter_url, DIGEST_LINK_TTL_SECONDS)
+    cache = get_cache()
+    if cache.name == 'memory':
+        return False
+    cache.set(f'intent:{key}', twitter_url, DIGEST_LINK_TTL_SECONDS)
+    return True
+
+
+def resolve_link(key):
+    """短いリンクのキーからX投稿用のIntent URLを取得（見つからなければ None）"""
+    if history.HISTORY_ENABLED:
+        return history.get_link(key)
+    return get_cache().get(f'intent:{key}')
+
+
+def wrap(notifiers, build):
+    """ダイジェストモードならPushoverの通知先をまとめ送信でラップ"""
+    if not DIGEST_MODE:
+        return notifiers
+    return [DigestNotifier(n, build) if n.name == 'pushover' else n for n in notifiers]
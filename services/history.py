@@ -0,0 +1,483 @@
+"""
+共有履歴ストア
+処理した共有をSQLite（WALモード）に記録し、キーセットページングで検索する
+書き込みはバックグラウンドスレッドでまとめて行い、リクエスト処理を待たせない
+（同じトランザクションで統計の集計テーブルも更新する）
+
+本文・ユーザー名・ハッシュタグは FTS5（trigram トークナイザ）で全文検索できる。
+日本語のように単語の区切りがない文章でも部分一致で引け、索引はトリガーで1件ずつ更新する
+"""
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from . import metrics, stats
+
+
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', 'history.sqlite3')
+HISTORY_ENABLED = os.environ.get('HISTORY_ENABLED', '1') == '1'
+
+# まとめ書きの件数と間隔
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+
+# 書き込み用の接続に失敗したときの再試行間隔（秒、倍々に延ばす）
+CONNECT_RETRY_SECONDS = 1.0
+CONNECT_RETRY_MAX_SECONDS = 60.0
+
+# 1ページの最大件数
+MAX_PAGE_SIZE = 200
+
+# 全文検索の語数の上限
+MAX_SEARCH_TERMS = 8
+
+# 全文検索のスコアの重み（本文、ユーザー名、ハッシュタグ）
+SEARCH_WEIGHTS = (1.0, 5.0, 3.0)
+
+# 関連度で並べる対象にする、新しい順の一致件数（よくある語でもスコア計算を一定量に抑える）
+# ページングで辿れるのもこの件数まで
+SEARCH_RANK_WINDOW = 500
+MAX_SEARCH_OFFSET = SEARCH_RANK_WINDOW
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS shares ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+    ' created_at REAL NOT NULL,'
+    ' url TEXT NOT NULL,'
+    ' platform TEXT NOT NULL,'
+    ' username TEXT,'
+    ' post_code TEXT,'
+    ' type TEXT,'
+    ' tweet_text TEXT,'
+    ' notification_sent INTEGER NOT NULL DEFAULT 0,'
+    ' timings TEXT,'
+    " tenant TEXT NOT NULL DEFAULT 'default',"
+    ' description TEXT,'
+    ' hashtag TEXT)',
+    'CREATE INDEX IF NOT EXISTS idx_shares_created ON shares (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_shares_platform ON shares (platform, id)',
+    'CREATE INDEX IF NOT EXISTS idx_shares_username ON shares (username COLLATE NOCASE, id)',
+    # まとめ通知の短いリンク（/x/<key>、ワーカー間・再起動後も引けるようにDBに置く）
+    'CREATE TABLE IF NOT EXISTS links (key TEXT PRIMARY KEY, url TEXT NOT NULL, expires_at REAL NOT NULL)',
+]
+
+_COLUMNS = ('id', 'created_at', 'url', 'platform', 'username', 'post_code',
+            'type', 'tweet_text', 'notification_sent', 'timings', 'tenant',
+            'description', 'hashtag')
+
+# 全文検索の索引（shares を外部コンテンツとし、トリガーで追従する）
+_FTS_SCHEMA = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS shares_fts USING fts5('
+    " description, username, hashtag, content='shares', content_rowid='id', tokenize='trigram')",
+    'CREATE TRIGGER IF NOT EXISTS shares_fts_insert AFTER INSERT ON shares BEGIN'
+    ' INSERT INTO shares_fts (rowid, description, username, hashtag)'
+    ' VALUES (new.id, new.description, new.username, new.hashtag); END',
+    'CREATE TRIGGER IF NOT EXISTS shares_fts_delete AFTER DELETE ON shares BEGIN'
+    " INSERT INTO shares_fts (shares_fts, rowid, description, username, hashtag)"
+    " VALUES ('delete', old.id, old.description, old.username, old.hashtag); END",
+    'CREATE TRIGGER IF NOT EXISTS shares_fts_update AFTER UPDATE ON shares BEGIN'
+    " INSERT INTO shares_fts (shares_fts, rowid, description, username, hashtag)"
+    " VALUES ('delete', old.id, old.description, old.username, old.hashtag);"
+    ' INSERT INTO shares_fts (rowid, description, username, hashtag)'
+    ' VALUES (new.id, new.description, new.username, new.hashtag); END',
+]
+
+# フラグ導入前は、本文が取れなかった共有のフォールバック文言（〜さんの〜をチェック！）を本文として記録していた
+# 該当する行を一度だけ空にする（PRAGMA user_version で実施済みかを記録）
+_FALLBACK_CLEANUP_VERSION = 1
+_FALLBACK_DESCRIPTIONS_SQL = (
+    "UPDATE shares SET description = '' WHERE"
+    " (platform = 'instagram' AND description = username || 'さんの' || type || 'をチェック！')"
+    " OR (platform = 'tiktok' AND description = username || 'さんのTikTok動画をチェック！')"
+    " OR (platform = 'youtube' AND description = username || 'さんのYouTube' || type || 'をチェック！')"
+    " OR description IN ('Instagram投稿をチェック！', 'TikTok動画をチェック！', 'YouTube動画をチェック！')"
+)
+
+# trigram トークナイザ（SQLite 3.34 以降）が使えない環境では LIKE で検索する
+_fts_available = None
+
+
+def connect(path=None):
+    """WALモードでDBに接続し、スキーマを用意する"""
+    conn = sqlite3.connect(path or HISTORY_DB_PATH, timeout=5, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    _migrate(conn)
+    conn.commit()
+    return conn
+
+
+def _migrate(conn):
+    """既存DBに後から追加した列とインデックスを用意する"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(shares)')}
+    if 'tenant' not in columns:
+        conn.execute("ALTER TABLE shares ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+    for column in ('description', 'hashtag'):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE shares ADD COLUMN {column} TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_shares_tenant ON shares (tenant, id)')
+    _setup_fts(conn)
+    stats.setup(conn)
+    _clear_fallback_descriptions(conn)
+
+
+def _clear_fallback_descriptions(conn):
+    """本文として記録されたフォールバック文言を空にし、索引（トリガー）と統計を直す"""
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= _FALLBACK_CLEANUP_VERSION:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # 他の接続が先に済ませていないか、書き込みロックを取ってから確認する
+        if conn.execute('PRAGMA user_version').fetchone()[0] < _FALLBACK_CLEANUP_VERSION:
+            cleared = conn.execute(_FALLBACK_DESCRIPTIONS_SQL).rowcount
+            if cleared:
+                stats.rebuild(conn)
+                print(f"✓ Cleared {cleared} fallback descriptions from share history")
+            conn.execute(f'PRAGMA user_version = {_FALLBACK_CLEANUP_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _setup_fts(conn):
+    """全文検索の索引を用意（既存DBに後から作った場合は既存の行から作り直す）"""
+    global _fts_available
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'shares_fts'").fetchone()
+    try:
+        for statement in _FTS_SCHEMA:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        if _fts_available is None:
+            print(f"⚠ Full-text search unavailable, falling back to LIKE: {e}")
+        _fts_available = False
+        return
+    if not exists:
+        conn.execute("INSERT INTO shares_fts (shares_fts) VALUES ('rebuild')")
+    _fts_available = True
+
+
+class HistoryWriter:
+    """共有履歴をキューに積み、バックグラウンドでまとめて書き込む"""
+
+    def __init__(self, path=None):
+        self.path = path or HISTORY_DB_PATH
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        """1件の共有を記録（書き込みは非同期、時刻はキューに積んだ時点）"""
+        entry.setdefault('created_at', time.time())
+        self._ensure_started()
+        self._queue.put(entry)
+
+    def flush(self, timeout=5.0):
+        """キューに残っている分を書き込み終えるまで待つ"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self._thread.start()
+
+    def _connect(self):
+        """DBに接続できるまで間隔を延ばしながら再試行（その間の記録はキューにたまる）"""
+        delay = CONNECT_RETRY_SECONDS
+        while True:
+            try:
+                return connect(self.path)
+            except Exception as e:
+                print(f"⚠ Could not open share history DB {self.path}: {e} (retrying in {delay:.0f}s)")
+                metrics.increment('history_connect_errors')
+                time.sleep(delay)
+                delay = min(delay * 2, CONNECT_RETRY_MAX_SECONDS)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if isinstance(batch[-1], threading.Event):
+                    break
+
+            entries = [item for item in batch if not isinstance(item, threading.Event)]
+            if entries:
+                try:
+                    self._write(conn, entries)
+                except Exception as e:
+                    print(f"Error writing share history: {e}")
+                    metrics.increment('history_write_errors')
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, conn, entries):
+        now = time.time()
+        rollup = stats.Rollup()
+        for entry in entries:
+            entry.setdefault('created_at', now)    # record() を通らずに直接書き込む場合
+            rollup.add(entry)
+        rows = [
+            (
+                entry['created_at'],
+                entry['url'],
+                entry['platform'],
+                entry.get('username', ''),
+                entry.get('post_code', ''),
+                entry.get('type', ''),
+                entry.get('tweet_text', ''),
+                1 if entry.get('notification_sent') else 0,
+                json.dumps(entry.get('timings', {})),
+                entry.get('tenant', 'default'),
+                entry.get('description', ''),
+                entry.get('hashtag', ''),
+            )
+            for entry in entries
+        ]
+        with conn:
+            conn.executemany(
+                'INSERT INTO shares (created_at, url, platform, username, post_code, type,'
+                ' tweet_text, notification_sent, timings, tenant, description, hashtag)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+            rollup.flush(conn)
+        metrics.increment('history_rows_written', len(rows))
+
+
+def query(conn, tenant=None, platform=None, username=None, since=None, until=None, cursor=None, limit=50):
+    """新しい順に履歴を取得（キーセットページング）
+
+    since/until はUNIXタイムスタンプ、cursor は前ページの next_cursor（id）。
+    戻り値は (rows, next_cursor)。
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    conditions = []
+    params = []
+
+    if tenant:
+        conditions.append('tenant = ?')
+        params.append(tenant)
+    if platform:
+        conditions.append('platform = ?')
+        params.append(platform)
+    if username:
+        conditions.append('username = ? COLLATE NOCASE')
+        params.append(username)
+    if since is not None:
+        conditions.append('created_at >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('created_at < ?')
+        params.append(until)
+    if cursor is not None:
+        conditions.append('id < ?')
+        params.append(int(cursor))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f"SELECT {', '.join(_COLUMNS)} FROM shares {where} ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    rows = [dict(zip(_COLUMNS, row)) for row in conn.execute(sql, params)]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]['id']
+
+    return [_decode(row) for row in rows], next_cursor
+
+
+def search(conn, q, tenant=None, platform=None, since=None, until=None, cursor=None, limit=20):
+    """本文・ユーザー名・ハッシュタグを全文検索（関連度順、cursor は前ページの next_cursor）
+
+    空白区切りの語をすべて含む共有を返す。3文字以上の語は索引で引き、関連度（bm25）順に並べる。
+    関連度を計算するのは新しい順に SEARCH_RANK_WINDOW 件までの一致。
+    2文字以下の語（trigram で引けない）は部分一致で当て、その場合は新しい順に並べる。
+    戻り値は (rows, next_cursor)。各行には一致箇所を【】で囲んだ snippet が付く。
+    """
+    terms = q.split()[:MAX_SEARCH_TERMS]
+    if not terms:
+        raise ValueError('Empty query')
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    offset = int(cursor) if cursor else 0
+    if not 0 <= offset <= MAX_SEARCH_OFFSET:
+        raise ValueError('Invalid cursor')
+
+    indexed = [term for term in terms if len(term) >= 3] if _fts_available else []
+    conditions = []
+    params = []
+
+    if indexed:
+        conditions.append('shares_fts MATCH ?')
+        params.append(' '.join('"' + term.replace('"', '""') + '"' for term in indexed))
+    for term in terms:
+        if term not in indexed:
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append("(s.description LIKE ? ESCAPE '\\' OR s.username LIKE ? ESCAPE '\\'"
+                              " OR s.hashtag LIKE ? ESCAPE '\\')")
+            params.extend([pattern] * 3)
+    if tenant:
+        conditions.append('s.tenant = ?')
+        params.append(tenant)
+    if platform:
+        conditions.append('s.platform = ?')
+        params.append(platform)
+    if since is not None:
+        conditions.append('s.created_at >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('s.created_at < ?')
+        params.append(until)
+
+    columns = ', '.join(f's.{column}' for column in _COLUMNS)
+    source = 'FROM shares_fts JOIN shares s ON s.id = shares_fts.rowid'
+    if indexed and len(indexed) == len(terms):
+        # 一致が多い場合は、新しい順で SEARCH_RANK_WINDOW 件目より新しい行だけをスコア計算する
+        cutoff = conn.execute(
+            f"SELECT shares_fts.rowid {source} WHERE {' AND '.join(conditions)}"
+            f" ORDER BY shares_fts.rowid DESC LIMIT 1 OFFSET ?",
+            params + [SEARCH_RANK_WINDOW - 1],
+        ).fetchone()
+        if cutoff:
+            conditions.append('shares_fts.rowid >= ?')
+            params.append(cutoff[0])
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        sql = (f"SELECT {columns}, snippet(shares_fts, -1, '【', '】', '…', 16) {source}"
+               f" WHERE {' AND '.join(conditions)}"
+               f" ORDER BY bm25(shares_fts, {weights}), s.id DESC LIMIT ? OFFSET ?")
+    elif indexed:
+        # 部分一致の語を含む場合は新しい順に走査し、1ページ分そろった時点で打ち切る
+        sql = (f"SELECT {columns}, snippet(shares_fts, -1, '【', '】', '…', 16) {source}"
+               f" WHERE {' AND '.join(conditions)} ORDER BY shares_fts.rowid DESC LIMIT ? OFFSET ?")
+    else:
+        sql = (f"SELECT {columns}, NULL FROM shares s WHERE {' AND '.join(conditions)}"
+               f" ORDER BY s.id DESC LIMIT ? OFFSET ?")
+    params.extend([limit + 1, offset])
+
+    rows = []
+    for row in conn.execute(sql, params):
+        item = dict(zip(_COLUMNS, row))
+        item['snippet'] = row[-1] or _snippet(item, terms)
+        rows.append(_decode(item))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit <= MAX_SEARCH_OFFSET:
+            next_cursor = offset + limit
+    return rows, next_cursor
+
+
+def _snippet(row, terms):
+    """索引を使わなかった場合の一致箇所（本文の先頭の一致の前後）"""
+    text = row.get('description') or ''
+    lowered = text.lower()
+    for term in terms:
+        position = lowered.find(term.lower())
+        if position >= 0:
+            start = max(0, position - 16)
+            end = position + len(term)
+            return ('…' if start else '') + text[start:position] + '【' + text[position:end] + '】' + text[end:end + 16]
+    return text[:32]
+
+
+def _decode(row):
+    row['notification_sent'] = bool(row['notification_sent'])
+    row['timings'] = json.loads(row['timings']) if row['timings'] else {}
+    return row
+
+
+# ===== プロセス共通のインスタンス =====
+
+_writer = HistoryWriter()
+_reader = threading.local()
+_links_conn = None
+_links_lock = threading.Lock()
+
+
+def record_share(entry):
+    """共有を履歴に記録（HISTORY_ENABLED=0 なら何もしない）"""
+    if HISTORY_ENABLED:
+        _writer.record(entry)
+
+
+def search_history(**filters):
+    """履歴を検索（スレッドごとに読み取り用接続を持つ）"""
+    return query(_reader_conn(), **filters)
+
+
+def search_shares(q, **filters):
+    """履歴を全文検索（スレッドごとに読み取り用接続を持つ）"""
+    return search(_reader_conn(), q, **filters)
+
+
+def share_stats(**filters):
+    """集計テーブルから統計を取得（スレッドごとに読み取り用接続を持つ）"""
+    return stats.query(_reader_conn(), **filters)
+
+
+def _reader_conn():
+    conn = getattr(_reader, 'conn', None)
+    if conn is None:
+        conn = connect()
+        _reader.conn = conn
+    return conn
+
+
+atexit.register(_writer.flush)
+
+
+def save_link(key, url, ttl):
+    """短いリンクを保存（HISTORY_ENABLED=0 か保存に失敗したら False）"""
+    global _links_conn
+    if not HISTORY_ENABLED:
+        return False
+    now = time.time()
+    try:
+        with _links_lock:
+            if _links_conn is None:
+                _links_conn = connect()
+            with _links_conn:
+                _links_conn.execute('DELETE FROM links WHERE expires_at <= ?', (now,))
+                _links_conn.execute('INSERT OR REPLACE INTO links (key, url, expires_at) VALUES (?, ?, ?)',
+                                    (key, url, now + ttl))
+        return True
+    except sqlite3.Error as e:
+        print(f"⚠ Could not save short link: {e}")
+        metrics.increment('link_save_errors')
+        return False
+
+
+def get_link(key):
+    """短いリンクのURL（見つからないか期限切れなら None）"""
+    if not HISTORY_ENABLED:
+        return None
+    row = _reader_conn().execute('SELECT url FROM links WHERE key = ? AND expires_at > ?',
+                                 (key, time.time())).fetchone()
+    return row[0] if row else None
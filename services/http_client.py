@@ -0,0 +1,239 @@
+"""
+上流HTTP呼び出しの共通クライアント
+ホスト別リトライポリシー、ジッター付き指数バックオフ、Retry-After、
+リクエスト全体のデッドラインを一箇所で扱う
+"""
+
+import contextvars
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+
+from . import metrics, tracing
+
+
+# 一時的な失敗とみなすステータス
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# サーバーが「処理していない」と明示するステータス（非冪等リクエストでも再送可）
+UNPROCESSED_STATUSES = {429, 503}
+
+# 接続エラー時に再送してよいメソッド（スクレイピングはGET/HEADのみ）
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+
+# 1回の試行に最低限必要な残り時間（秒）
+MIN_ATTEMPT_TIME = 0.5
+
+
+class DeadlineExceeded(requests.Timeout):
+    """リクエストのデッドラインを超過した"""
+
+
+class RetryPolicy:
+    """ホスト単位のリトライ設定"""
+
+    def __init__(self, max_attempts=3, base_delay=0.25, max_delay=4.0, max_retry_after=10.0):
+        self.max_attempts = max_attempts        # 初回を含む最大試行回数
+        self.base_delay = base_delay            # バックオフの基準秒数
+        self.max_delay = max_delay              # バックオフの上限秒数
+        self.max_retry_after = max_retry_after  # これを超えるRetry-Afterは待たずに諦める
+
+    def backoff(self, attempt):
+        """attempt回目の失敗後の待ち時間（フルジッター）"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+DEFAULT_POLICY = RetryPolicy(max_attempts=2)
+
+HOST_POLICIES = {
+    'www.instagram.com': RetryPolicy(max_attempts=3),
+    'instagram.com': RetryPolicy(max_attempts=3),
+    'graph.facebook.com': RetryPolicy(max_attempts=2),
+    'www.tiktok.com': RetryPolicy(max_attempts=3),
+    'vt.tiktok.com': RetryPolicy(max_attempts=3),
+    'vm.tiktok.com': RetryPolicy(max_attempts=3),
+    'www.youtube.com': RetryPolicy(max_attempts=3),
+    'youtu.be': RetryPolicy(max_attempts=3),
+    'api.pushover.net': RetryPolicy(max_attempts=4, base_delay=0.5),
+}
+
+
+def get_policy(host):
+    """ホストに対応するリトライポリシーを取得"""
+    return HOST_POLICIES.get((host or '').lower(), DEFAULT_POLICY)
+
+
+def set_host_policy(host, policy):
+    """ホストのリトライポリシーを上書き"""
+    HOST_POLICIES[host.lower()] = policy
+
+
+# ===== transport（記録・再生の差し替え口） =====
+
+# 実際の送信関数。None なら requests.request を使う
+_transport = None
+
+
+def set_transport(transport):
+    """送信関数を差し替え（requests.request と同じ引数を受け取る callable、None で元に戻す）"""
+    global _transport
+    _transport = transport
+
+
+def get_transport():
+    """現在の送信関数（差し替えていなければ None）"""
+    return _transport
+
+
+def _configure_transport_from_env():
+    """HTTP_RECORD_PATH / HTTP_REPLAY_PATH が設定されていれば記録・再生モードにする"""
+    from .recording import Recorder, ReplayTransport
+    replay_path = os.environ.get('HTTP_REPLAY_PATH')
+    record_path = os.environ.get('HTTP_RECORD_PATH')
+    if replay_path:
+        set_transport(ReplayTransport(replay_path))
+        print(f"✓ Replaying upstream responses from {replay_path}")
+    elif record_path:
+        set_transport(Recorder(record_path))
+        print(f"✓ Recording upstream responses to {record_path}")
+
+
+# ===== デッドライン =====
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+def set_deadline(seconds):
+    """現在のコンテキストにデッドラインを設定し、解除用トークンを返す"""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    """set_deadline で設定したデッドラインを解除"""
+    _deadline.reset(token)
+
+
+def remaining_time():
+    """デッドラインまでの残り秒数（未設定ならNone）"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def parse_retry_after(value):
+    """Retry-Afterヘッダー（秒数またはHTTP日付）を秒数に変換"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# ===== リクエスト =====
+
+def request(method, url, idempotent=None, **kwargs):
+    """リトライポリシーとデッドラインを適用してHTTPリクエストを送信
+
+    idempotent が None の場合はメソッドから判定する（GET/HEADのみ冪等）。
+    非冪等リクエストは接続エラーでは再送せず、429/503 のみ再送する。
+    """
+    method = method.upper()
+    parts = urlsplit(url)
+    with tracing.span(f'http {method}', kind='client', host=parts.hostname or '', path=parts.path) as span:
+        response = _request(method, url, idempotent, **kwargs)
+        span.set('status', response.status_code)
+        if not kwargs.get('stream'):
+            span.set('bytes', len(response.content))
+        return response
+
+
+def _request(method, url, idempotent, **kwargs):
+    host = urlsplit(url).hostname or ''
+    policy = get_policy(host)
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+
+    requested_timeout = kwargs.pop('timeout', 10)
+    attempt = 0
+
+    while True:
+        attempt += 1
+        tracing.annotate(attempts=attempt)
+
+        remaining = remaining_time()
+        timeout = requested_timeout
+        if remaining is not None:
+            if remaining <= 0:
+                metrics.increment('upstream_deadline_exceeded', host=host)
+                raise DeadlineExceeded(f"Deadline exceeded before {method} {url}")
+            timeout = min(requested_timeout, remaining)
+
+        started = time.perf_counter()
+        try:
+            response = (_transport or requests.request)(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.increment('upstream_errors', host=host, error=type(e).__name__)
+            if not idempotent or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt)
+            reason = type(e).__name__
+            response = None
+        else:
+            metrics.observe('upstream_latency_seconds', time.perf_counter() - started, host=host)
+            metrics.increment('upstream_responses', host=host, status=response.status_code)
+
+            retryable = UNPROCESSED_STATUSES if not idempotent else RETRYABLE_STATUSES
+            if response.status_code not in retryable or attempt >= policy.max_attempts:
+                return response
+
+            delay = policy.backoff(attempt)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > policy.max_retry_after:
+                    return response
+                delay = max(delay, retry_after)
+            reason = f"HTTP {response.status_code}"
+
+        # デッドラインを超える待ちはしない
+        remaining = remaining_time()
+        if remaining is not None and delay + MIN_ATTEMPT_TIME > remaining:
+            metrics.increment('upstream_retry_skipped', host=host)
+            if response is not None:
+                return response
+            raise DeadlineExceeded(f"No time left to retry {method} {url} ({reason})")
+
+        if response is not None:
+            response.close()
+
+        print(f"Retrying {method} {host} after {reason} (attempt {attempt}/{policy.max_attempts}, wait {delay:.2f}s)")
+        metrics.increment('upstream_retries', host=host)
+        time.sleep(delay)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request('HEAD', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+_configure_transport_from_env()
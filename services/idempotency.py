@@ -0,0 +1,118 @@
+"""
+Idempotency-Key 対応
+同じ共有の再送（ショートカットのリトライなど）に保存済みのレスポンスを返し、
+情報抽出や通知を繰り返さないようにする
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+from .admission import AdmissionRejected
+from .common import clean_url
+
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '600'))
+IDEMPOTENCY_BUCKET_SECONDS = int(os.environ.get('IDEMPOTENCY_BUCKET_SECONDS', '120'))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', '1024'))
+
+# 同じキーの処理中リクエストを待つ最大秒数（待ちきれなければ 409 と Retry-After を返す）
+INFLIGHT_WAIT_SECONDS = 30
+INFLIGHT_RETRY_AFTER_SECONDS = 5
+
+
+def header_key(value):
+    """Idempotency-Key ヘッダーからキーを生成"""
+    return f'hdr:{value.strip()}'
+
+
+def derived_keys(url, fields=None, now=None):
+    """正規化URL・手動指定の項目・時間バケットからキーを生成（現在と直前のバケット）
+
+    fields（username / caption / progressive など）が違えば別のキーになるので、
+    キャプションを直して送り直した場合は再送扱いにしない。
+    バケット境界をまたいだ再送も拾えるよう、直前のバケットも返す。
+    """
+    now = time.time() if now is None else now
+    bucket = int(now // IDEMPOTENCY_BUCKET_SECONDS)
+    canonical = clean_url(url).lower()
+    extra = '|'.join(f'{name}={str(value).strip()}' for name, value in sorted((fields or {}).items()))
+    return [
+        'url:' + hashlib.sha256(f'{canonical}|{extra}|{b}'.encode('utf-8')).hexdigest()
+        for b in (bucket, bucket - 1)
+    ]
+
+
+class IdempotencyStore:
+    """上限付き・期限付きのレスポンス保存領域"""
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, max_entries=IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._responses = OrderedDict()   # key -> (expires_at, status, body)
+        self._inflight = {}               # key -> threading.Event
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, now):
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._responses[key]
+            return None
+        return entry[1], entry[2]
+
+    def claim(self, key, aliases=(), timeout=INFLIGHT_WAIT_SECONDS):
+        """キーの処理権を取得する
+
+        保存済みレスポンスがあれば (status, body) を返す。
+        None が返った場合は呼び出し側が処理し、complete か release を呼ぶこと。
+        同じキーを処理中のリクエストがあれば、その完了を待って結果を返す。
+        待ちきれなければ処理権を持たないまま実行しないよう AdmissionRejected(409) を送出する。
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.time()
+                for candidate in (key, *aliases):
+                    stored = self._lookup(candidate, now)
+                    if stored is not None:
+                        metrics.increment('idempotency_replays')
+                        return stored
+
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    return None
+
+            # 処理中の同一リクエストを待つ（先行が失敗したら次のループで処理権を取る）
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.increment('idempotency_conflicts')
+                raise AdmissionRejected(409, 'Request with the same key is in progress',
+                                        INFLIGHT_RETRY_AFTER_SECONDS)
+            event.wait(remaining)
+
+    def complete(self, key, status, body):
+        """レスポンスを保存し、待機中のリクエストを起こす"""
+        with self._lock:
+            self._responses[key] = (time.time() + self.ttl, status, body)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def release(self, key):
+        """保存せずに処理権を手放す（エラー時）"""
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+store = IdempotencyStore()
@@ -3,14 +3,21 @@ Instagram情報抽出サービス
 """
 
 import re
-import requests
-from bs4 import BeautifulSoup
-from . import SocialMediaInfo
+from . import SocialMediaInfo, http_client, memory, metrics, upstreams
+from .cache import get_cache
 from .common import clean_url
+from .parsing import parse_meta
 
 
-def extract_instagram_info(url, provided_username='', provided_caption=''):
-    """Instagram URLから投稿情報を取得"""
+# 取得に失敗した結果をキャッシュする秒数
+NEGATIVE_CACHE_TTL = 300
+
+
+def extract_instagram_info(url, provided_username='', provided_caption='', fetch_remote=True):
+    """Instagram URLから投稿情報を取得
+
+    fetch_remote=False の場合は通信せず、URLから分かる情報だけで組み立てる
+    """
     
     info = SocialMediaInfo()
     info.platform = 'instagram'
@@ -42,27 +49,40 @@ def extract_instagram_info(url, provided_username='', provided_caption=''):
                 username = potential_username
                 print(f"✓ Extracted username from URL: {username}")
         
+        # URLと手動指定で足りない項目があれば、1回の取得でまとめて補う（ワーカー間で共有キャッシュ）
+        metadata = {}
+        if fetch_remote and not (provided_caption and (provided_username or username)):
+            metadata = _cached_metadata(info.url)
+            info.upstream_skipped = bool(metadata.get('skipped'))
+        
         # 提供されたユーザー名を優先
         if provided_username:
             info.username = provided_username
             print(f"✓ Using provided username: {provided_username}")
         elif username:
             info.username = username
+        elif metadata.get('username'):
+            info.username = metadata['username']
+            print(f"✓ Extracted username from metadata: {info.username}")
         else:
             info.username = 'Instagram'
             print(f"⚠ Using fallback username: Instagram")
         
+        # 投稿の中身が動画と分かれば /p/ の投稿でも動画として扱う
+        if metadata.get('is_video'):
+            info.is_video = True
+            info.emoji = '🎬'
+        info.image_url = metadata.get('image_url', '')
+        
         # 提供された投稿本文を優先
         if provided_caption:
             info.description = provided_caption
             print(f"✓ Using provided caption: {provided_caption[:100]}")
+        elif metadata.get('description'):
+            info.description = metadata['description']
         else:
-            # OGタグから取得を試みる
-            description = _fetch_og_description(info.url)
-            if description:
-                info.description = description
-            else:
-                info.description = f'{info.username}さんの{info.type}をチェック！'
+            info.description = f'{info.username}さんの{info.type}をチェック！'
+            info.description_fallback = True
         
         # ハッシュタグを生成
         if info.username == 'Instagram':
@@ -85,6 +105,7 @@ def extract_instagram_info(url, provided_username='', provided_caption=''):
         info.url = clean_url(url)
         info.username = provided_username or 'Instagram'
         info.description = provided_caption or 'Instagram投稿をチェック！'
+        info.description_fallback = not provided_caption
         info.type = 'リール' if '/reel/' in url else '投稿'
         info.emoji = '🎬' if '/reel/' in url else '📷'
         info.hashtag = '#Instagram'
@@ -92,24 +113,57 @@ def extract_instagram_info(url, provided_username='', provided_caption=''):
         return info
 
 
-def _fetch_og_description(url):
-    """OGタグから説明文を取得（ベストエフォート）"""
+def _empty_metadata():
+    return {'username': '', 'description': '', 'image_url': '', 'is_video': None}
+
+
+def _cached_metadata(url):
+    """キャッシュ経由で投稿のメタ情報（ユーザー名・本文・サムネイルURL・動画かどうか）を取得
+
+    取得失敗も短時間キャッシュする
+    """
+    cache = get_cache()
+    cache_key = f'meta:instagram:{url}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"✓ Using cached metadata: {url}")
+        return cached
+    
+    if not upstreams.available('instagram') and not upstreams.available('instagram_oembed'):
+        # どちらの取得元も落ちているので待たずにフォールバック（キャッシュもしない）
+        print("⚠ Instagram is down, skipping metadata fetch")
+        metrics.increment('upstream_skipped', upstream='instagram')
+        return {**_empty_metadata(), 'skipped': True}
+    
+    metadata = _fetch_metadata(url)
+    cache.set(cache_key, metadata, None if metadata['description'] else NEGATIVE_CACHE_TTL)
+    return metadata
+
+
+def _fetch_metadata(url):
+    """oEmbedまたはHTMLページからメタ情報を取得（ベストエフォート、落ちている取得元は飛ばす）
+
+    どちらも1回の取得・1回の解析で全項目を取り出す。oEmbedで本文が取れればHTMLは取りに行かない。
+    """
+    metadata = _empty_metadata()
     try:
         # 方法1: oEmbed API
+        if not upstreams.available('instagram_oembed'):
+            raise RuntimeError('instagram_oembed is down')
         oembed_url = f"https://graph.facebook.com/v12.0/instagram_oembed?url={url}&access_token=&omitscript=true"
-        oembed_response = requests.get(oembed_url, timeout=10)
+        oembed_response = http_client.get(oembed_url, timeout=10)
         
         if oembed_response.status_code == 200:
-            oembed_data = oembed_response.json()
-            if 'title' in oembed_data and ' on Instagram:' in oembed_data['title']:
-                description = oembed_data['title'].split(' on Instagram:', 1)[1].strip().strip('"').strip('"')
-                if description:
-                    print(f"✓ Extracted description from oEmbed: {description[:100]}")
-                    return description
+            metadata = metadata_from_oembed(oembed_response.json())
+            if metadata['description']:
+                print(f"✓ Extracted description from oEmbed: {metadata['description'][:100]}")
+                return metadata
     except Exception as e:
         print(f"oEmbed API failed: {e}")
     
     # 方法2: HTMLページから取得
+    if not upstreams.available('instagram'):
+        return metadata
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -117,25 +171,110 @@ def _fetch_og_description(url):
             'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
         }
         
-        response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
+        with memory.track('scrape'):
+            response = http_client.get(url, headers=headers, timeout=15, allow_redirects=True)
         
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # 大きなページはプロセスプールで解析（設定時）
+            with memory.track('parse'):
+                meta = parse_meta(response.content)
             
-            # OGタグから取得
-            og_description = soup.find('meta', property='og:description')
-            if og_description and 'content' in og_description.attrs:
-                desc_text = og_description['content']
-                
-                # クリーニング
-                if ' - ' in desc_text and ' on Instagram:' in desc_text:
-                    parts = desc_text.split(' on Instagram:', 1)
-                    if len(parts) == 2:
-                        description = parts[1].strip().strip('"').strip('"')
-                        if description:
-                            print(f"✓ Extracted description from OG tag: {description[:100]}")
-                            return description
+            # oEmbedで取れた項目は残し、足りない項目だけOGタグで埋める
+            page = metadata_from_meta(meta)
+            for key, value in page.items():
+                if not metadata[key]:
+                    metadata[key] = value
+            if metadata['description']:
+                print(f"✓ Extracted description from OG tag: {metadata['description'][:100]}")
     except Exception as e:
         print(f"HTML fetch failed: {e}")
     
+    return metadata
+
+
+# OGタグの本文に付く定型文（本文ではない）
+UNWANTED_PHRASES = [
+    'See Instagram photos and videos',
+    'See photos, videos and more on Instagram',
+    'View this post on Instagram',
+]
+
+_HANDLE_RE = re.compile(r'\(@([A-Za-z0-9_.]+)\)')
+
+# "123 likes, 4 comments - username on January 1, 2024: "本文"" 形式の og:description
+_COUNTS_RE = re.compile(r'^[^"]*?\blikes?, [^"]*?\bcomments? - @?([A-Za-z0-9_.]+) on [^:"]+:(.*)$', re.S)
+
+
+def _strip_quotes(text):
+    return text.strip().strip('"').strip('“”').strip()
+
+
+def _handle(text):
+    """"(@username)" や "... comments - username on 日付:" からアカウント名を取り出す"""
+    match = _HANDLE_RE.search(text) or _COUNTS_RE.match(text)
+    return match.group(1) if match else ''
+
+
+def _username_from_title(title):
+    """タイトルからユーザー名を取り出す
+
+    "Username on Instagram: "本文"" / "Display Name (@username) • Instagram photos and videos" / "@username ..."
+    """
+    title = (title or '').strip()
+    handle = _handle(title)
+    if handle:
+        return handle
+    if ' on Instagram' in title:
+        name = title.split(' on Instagram', 1)[0].strip()
+        # "123 likes, 4 comments - username on Instagram" の形式
+        name = name.rsplit(' - ', 1)[-1].strip().lstrip('@')
+        if name and name != 'Instagram':
+            return name
+    if title.startswith('@'):
+        return title.split()[0].lstrip('@')
     return ''
+
+
+def _caption_from_text(text):
+    """"... on Instagram: "本文"" の形式から本文を取り出す（定型文だけなら空文字）"""
+    text = (text or '').strip()
+    if ' on Instagram:' in text:
+        return _strip_quotes(text.split(' on Instagram:', 1)[1])
+    match = _COUNTS_RE.match(text)
+    if match:
+        return _strip_quotes(match.group(2).strip().rstrip('.'))
+    if not text or text.startswith('See Instagram'):
+        return ''
+    for phrase in UNWANTED_PHRASES:
+        if phrase in text:
+            text = text.split(phrase, 1)[0].strip()
+    return text
+
+
+def metadata_from_oembed(data):
+    """oEmbedの応答からメタ情報を組み立てる"""
+    metadata = _empty_metadata()
+    title = data.get('title') or ''
+    metadata['username'] = (data.get('author_name') or '').strip().lstrip('@') or _username_from_title(title)
+    if ' on Instagram:' in title:
+        metadata['description'] = _caption_from_text(title)
+    metadata['image_url'] = data.get('thumbnail_url') or ''
+    return metadata
+
+
+def metadata_from_meta(meta):
+    """parse_meta の結果（OG/Twitterカードのタグ）からメタ情報を組み立てる"""
+    metadata = _empty_metadata()
+    title = meta.get('og:title') or meta.get('twitter:title') or ''
+    description = meta.get('og:description') or meta.get('twitter:description') or ''
+    # 表示名よりアカウント名（@なしのID）を優先する
+    metadata['username'] = _handle(title) or _handle(description) \
+        or _username_from_title(title) or _username_from_title(description)
+    # 本文はタイトル（"username on Instagram: "本文""）の方が切り詰められていない
+    metadata['description'] = (_caption_from_text(title) if ' on Instagram:' in title else '') \
+        or _caption_from_text(description)
+    metadata['image_url'] = meta.get('og:image') or meta.get('twitter:image') or ''
+    og_type = meta.get('og:type') or ''
+    if og_type or 'og:video' in meta:
+        metadata['is_video'] = og_type.startswith('video') or 'og:video' in meta
+    return metadata
@@ -0,0 +1,154 @@
+"""
+メモリ計測
+tracemalloc による割り当て箇所の集計、取得・解析ステージごとのピーク割り当て量、
+ソフトリミット超過時のワーカー再起動を扱う（すべてオプトイン）
+"""
+
+import contextvars
+import os
+import signal
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from . import metrics
+
+
+MEMORY_TRACING = os.environ.get('MEMORY_TRACING', '0') == '1'
+MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', '1'))
+
+# RSSがこれを超えたらワーカーを入れ替える（0なら無効）
+MEMORY_SOFT_LIMIT_MB = int(os.environ.get('MEMORY_SOFT_LIMIT_MB', '0'))
+
+# リクエスト中のステージ別ピーク（バイト）
+_request_peaks = contextvars.ContextVar('memory_request_peaks', default=None)
+
+# tracemalloc のピークはプロセス全体で1つなので、計測区間を直列化する
+_track_lock = threading.Lock()
+_recycle_requested = False
+
+
+def start():
+    """MEMORY_TRACING=1 なら tracemalloc を開始"""
+    if MEMORY_TRACING and not tracemalloc.is_tracing():
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+        print(f"✓ Memory tracing enabled ({MEMORY_TRACE_FRAMES} frames)")
+
+
+def begin_request():
+    """リクエスト単位のピーク記録を開始し、解除用トークンを返す"""
+    return _request_peaks.set({})
+
+
+def current_peaks():
+    """現在のリクエストのステージ別ピーク（KB）"""
+    peaks = _request_peaks.get() or {}
+    return {f'{stage}_peak_kb': round(size / 1024, 1) for stage, size in peaks.items()}
+
+
+def end_request(token):
+    """リクエスト単位のピーク記録を終え、ステージ別ピーク（KB）を返す"""
+    peaks = current_peaks()
+    _request_peaks.reset(token)
+    return peaks
+
+
+@contextmanager
+def track(stage):
+    """ステージ中に増えた割り当てのピークを記録
+
+    tracemalloc が無効なら何もしない。同時に走る他リクエストの割り当ても
+    含まれうるため、並行時の値は目安として扱うこと。
+    """
+    if not tracemalloc.is_tracing() or not _track_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        _track_lock.release()
+        grown = max(0, peak - baseline)
+        metrics.observe('memory_stage_peak_bytes', grown, stage=stage)
+        peaks = _request_peaks.get()
+        if peaks is not None:
+            peaks[stage] = max(peaks.get(stage, 0), grown)
+
+
+def top_allocations(limit=20, group_by='lineno'):
+    """割り当て量の多い箇所を返す"""
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    return [
+        {
+            'location': str(stat.traceback),
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def rss_bytes():
+    """現在の常駐メモリ量（取得できなければ None）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOSはバイト、Linuxはキロバイト
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def summary(limit=20, group_by='lineno'):
+    """/debug/memory 用の集計"""
+    rss = rss_bytes()
+    result = {
+        'tracing': tracemalloc.is_tracing(),
+        'rss_mb': round(rss / 1024 / 1024, 1) if rss else None,
+        'soft_limit_mb': MEMORY_SOFT_LIMIT_MB or None,
+        'recycle_requested': _recycle_requested,
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        result['traced_current_kb'] = round(current / 1024, 1)
+        result['traced_peak_kb'] = round(peak / 1024, 1)
+        result['top'] = top_allocations(limit, group_by)
+    return result
+
+
+def check_soft_limit(server_software=''):
+    """RSSがソフトリミットを超えていればワーカーの入れ替えを要求
+
+    gunicornのワーカーは SIGTERM を受けると処理中のリクエストを終えてから終了し、
+    マスターが新しいワーカーを起動する。開発サーバーではログを出すだけにする。
+    """
+    global _recycle_requested
+    if not MEMORY_SOFT_LIMIT_MB or _recycle_requested:
+        return False
+
+    rss = rss_bytes()
+    if rss is None or rss < MEMORY_SOFT_LIMIT_MB * 1024 * 1024:
+        return False
+
+    print(f"⚠ RSS {rss / 1024 / 1024:.0f} MB exceeds soft limit {MEMORY_SOFT_LIMIT_MB} MB")
+    metrics.increment('memory_soft_limit_exceeded')
+    if 'gunicorn' not in server_software.lower():
+        return False
+
+    _recycle_requested = True
+    print(f"Recycling worker {os.getpid()}")
+    os.kill(os.getpid(), signal.SIGTERM)
+    return True
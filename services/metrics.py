@@ -0,0 +1,79 @@
+"""
+プロセス内メトリクス
+カウンターと計測値（件数・合計・最大）をラベル付きで集計する
+"""
+
+import contextvars
+import threading
+from collections import defaultdict
+
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_observations = {}
+
+# リクエスト単位で付けるラベル（テナントなど）
+_context_labels = contextvars.ContextVar('metrics_labels', default=None)
+
+
+def _key(name, labels):
+    context_labels = _context_labels.get()
+    if context_labels:
+        labels = {**context_labels, **labels}
+    return (name, tuple(sorted(labels.items())))
+
+
+def set_labels(**labels):
+    """現在のコンテキストで記録するメトリクスすべてにラベルを付ける（戻り値は reset_labels に渡す）"""
+    return _context_labels.set(labels)
+
+
+def reset_labels(token):
+    _context_labels.reset(token)
+
+
+def increment(name, value=1, **labels):
+    """カウンターを加算"""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name, value, **labels):
+    """計測値（レイテンシなど）を記録"""
+    key = _key(name, labels)
+    with _lock:
+        stat = _observations.get(key)
+        if stat is None:
+            _observations[key] = [1, value, value]
+        else:
+            stat[0] += 1
+            stat[1] += value
+            if value > stat[2]:
+                stat[2] = value
+
+
+def snapshot():
+    """現在の値を辞書形式で取得"""
+    with _lock:
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in _counters.items()
+        ]
+        observations = [
+            {
+                'name': name,
+                'labels': dict(labels),
+                'count': count,
+                'sum': round(total, 6),
+                'max': round(maximum, 6),
+            }
+            for (name, labels), (count, total, maximum) in _observations.items()
+        ]
+    return {'counters': counters, 'observations': observations}
+
+
+def reset():
+    """すべての値をクリア"""
+    with _lock:
+        _counters.clear()
+        _observations.clear()
@@ -0,0 +1,297 @@
+"""
+通知送信モジュール
+Pushover、汎用Webhook、ntfy、JSONLファイルなどの通知先に同じ共有を配信する
+すべての通知先へ並行して送るため、全体の待ち時間は最も遅い通知先の分だけになる
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import http_client, metrics, tracing
+
+
+NOTIFY_WEBHOOK_URL = os.environ.get('NOTIFY_WEBHOOK_URL', '')
+NTFY_URL = os.environ.get('NTFY_URL', '')            # 例: https://ntfy.sh/my-topic
+NTFY_TOKEN = os.environ.get('NTFY_TOKEN', '')
+NOTIFY_JSONL_PATH = os.environ.get('NOTIFY_JSONL_PATH', '')
+
+# 通知先ごとのタイムアウト（秒、リトライを含めて送信開始からこの時間で打ち切る）
+NOTIFY_TIMEOUT_SECONDS = float(os.environ.get('NOTIFY_TIMEOUT_SECONDS', '10'))
+
+# 通知先ごとの同時送信数（遅い通知先が他の通知先の送信スレッドを使い切らないよう、通知先ごとにスレッドを分ける）
+NOTIFY_SINK_MAX_CONCURRENT = int(os.environ.get('NOTIFY_SINK_MAX_CONCURRENT', '4'))
+
+# タイムアウト後、送信中の通知先の結果を待つ猶予（秒、応答の読み込み中など）
+NOTIFY_TIMEOUT_GRACE_SECONDS = 2.0
+
+# Notifier.send の戻り値: まだ送らず、後でまとめて送るためにためた（まとめ通知）
+QUEUED = 'queued'
+
+_executors_lock = threading.Lock()
+
+
+class Notification:
+    """通知先に渡す内容"""
+
+    def __init__(self, info, twitter_url, title, message, attachment=None, html=False):
+        self.info = info                # SocialMediaInfo（まとめ通知では None）
+        self.twitter_url = twitter_url  # X投稿用のIntent URL
+        self.title = title
+        self.message = message
+        self.attachment = attachment    # thumbnails.Attachment（Pushoverのみ添付）
+        self.html = html                # 本文がHTML（まとめ通知）
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'message': self.message,
+            'twitter_url': self.twitter_url,
+            'info': self.info.to_dict() if self.info else None,
+        }
+
+
+class Notifier:
+    """通知先の共通インターフェース"""
+
+    name = 'base'
+
+    def __init__(self, timeout=NOTIFY_TIMEOUT_SECONDS, max_concurrent=NOTIFY_SINK_MAX_CONCURRENT):
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self._executor = None
+
+    def send(self, notification):
+        """通知を送信し、成功したら True を返す（ためて後で送る場合は QUEUED）"""
+
+    @property
+    def executor(self):
+        """この通知先専用の送信スレッド（最初の送信時に作る）"""
+        if self._executor is None:
+            with _executors_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                                        thread_name_prefix=f'notify-{self.name}')
+        return self._executor
+        raise NotImplementedError
+
+
+class PushoverNotifier(Notifier):
+    """Pushover（X投稿リンク付き）"""
+
+    name = 'pushover'
+
+    def __init__(self, token, user, **kwargs):
+        super().__init__(**kwargs)
+        self.token = token
+        self.user = user
+
+    def send(self, notification):
+        files = None
+        if notification.attachment is not None:
+            attachment = notification.attachment
+            files = {'attachment': (attachment.filename, attachment.content, attachment.mime_type)}
+        data = {
+            'token': self.token,
+            'user': self.user,
+            'message': notification.message,
+            'title': notification.title,
+            'priority': 0
+        }
+        if notification.twitter_url:
+            data['url'] = notification.twitter_url
+            data['url_title'] = 'Xに投稿する'
+        if notification.html:
+            data['html'] = 1
+        response = http_client.post(
+            'https://api.pushover.net/1/messages.json',
+            files=files,
+            data=data,
+            timeout=self.timeout
+        )
+        return response.status_code == 200
+
+
+class WebhookNotifier(Notifier):
+    """汎用の送信先Webhook（JSONをPOST）"""
+
+    name = 'webhook'
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+
+    def send(self, notification):
+        response = http_client.post(self.url, json=notification.to_dict(), timeout=self.timeout)
+        return 200 <= response.status_code < 300
+
+
+class NtfyNotifier(Notifier):
+    """ntfy形式のHTTPプッシュ（本文をPOSTし、タイトルやリンクはヘッダーで渡す）"""
+
+    name = 'ntfy'
+
+    def __init__(self, url, token='', **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.token = token
+
+    def send(self, notification):
+        headers = {
+            # ヘッダーはlatin-1しか通らないため、RFC 2047形式でエンコード
+            'Title': _encode_header(notification.title),
+            'Click': notification.twitter_url,
+            'Actions': f'view, Post to X, {notification.twitter_url}',
+        }
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        response = http_client.post(
+            self.url,
+            data=notification.message.encode('utf-8'),
+            headers=headers,
+            timeout=self.timeout
+        )
+        return 200 <= response.status_code < 300
+
+
+class JsonlFileNotifier(Notifier):
+    """ローカルのJSONLファイルに1行ずつ追記"""
+
+    name = 'jsonl'
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, notification):
+        record = notification.to_dict()
+        record['timestamp'] = time.time()
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return True
+
+
+def _encode_header(value):
+    """非ASCII文字を含むヘッダー値をRFC 2047形式にする"""
+    try:
+        value.encode('latin-1')
+        return value
+    except UnicodeEncodeError:
+        from email.header import Header
+        return Header(value, 'utf-8').encode()
+
+
+def configured_notifiers(pushover_token='', pushover_user='', webhook_url=NOTIFY_WEBHOOK_URL,
+                         ntfy_url=NTFY_URL, ntfy_token=NTFY_TOKEN, jsonl_path=NOTIFY_JSONL_PATH):
+    """設定された通知先の一覧を生成（省略時は環境変数の値）"""
+    notifiers = []
+    if pushover_token and pushover_user:
+        notifiers.append(PushoverNotifier(pushover_token, pushover_user))
+    if webhook_url:
+        notifiers.append(WebhookNotifier(webhook_url))
+    if ntfy_url:
+        notifiers.append(NtfyNotifier(ntfy_url, ntfy_token))
+    if jsonl_path:
+        notifiers.append(JsonlFileNotifier(jsonl_path))
+    return notifiers
+
+
+class _SendState:
+    """送信の開始時刻（スレッドプールの空き待ちはタイムアウトに含めない）"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.started_at = None
+
+
+def _timed_send(notifier, notification, state):
+    state.started_at = time.monotonic()
+    state.started.set()
+    # リトライも含めて通知先のタイムアウト内に収める（リクエスト全体のデッドラインの方が短ければそちら）
+    budget = notifier.timeout
+    remaining = http_client.remaining_time()
+    if remaining is not None:
+        budget = min(budget, remaining)
+    deadline_token = http_client.set_deadline(budget)
+    started = time.perf_counter()
+    try:
+        with tracing.span('notify', sink=notifier.name) as span:
+            try:
+                outcome = notifier.send(notification)
+                status = QUEUED if outcome == QUEUED else 'sent' if outcome else 'failed'
+                error = None
+            except Exception as e:
+                print(f"Error sending {notifier.name} notification: {e}")
+                status = 'failed'
+                error = str(e)
+            span.set('status', status)
+            span.set('error', error)
+    finally:
+        http_client.reset_deadline(deadline_token)
+    return status, time.perf_counter() - started, error
+
+
+def dispatch(notifiers, notification):
+    """すべての通知先へ並行して送信し、通知先ごとの結果を返す
+
+    戻り値: {通知先名: {'status': 'sent' / 'queued' / 'failed' / 'timeout', 'success': bool（送信済みか）,
+                       'latency_ms': float, 'error': str（失敗時のみ）}}
+    通知先ごとのタイムアウトは送信を始めた時点から数え、送信側でもリトライをその時間で打ち切る。
+    タイムアウト内に始められなかった送信は取り消す。送信中にタイムアウトした分は結果をログとメトリクスに残す。
+    """
+    started = time.perf_counter()
+    sends = []
+    for notifier in notifiers:
+        state = _SendState()
+        future = notifier.executor.submit(contextvars.copy_context().run, _timed_send, notifier, notification, state)
+        sends.append((notifier, state, future))
+
+    results = {}
+    for notifier, state, future in sends:
+        try:
+            # 通知先の送信スレッドの空き待ち（始まらなければ取り消す）
+            if not state.started.wait(max(0, notifier.timeout - (time.perf_counter() - started))) \
+                    and future.cancel():
+                raise TimeoutError
+            state.started.wait()
+            remaining = state.started_at + notifier.timeout + NOTIFY_TIMEOUT_GRACE_SECONDS - time.monotonic()
+            status, elapsed, error = future.result(timeout=max(0, remaining))
+            success = status == 'sent'
+        except Exception:
+            success, elapsed, error, status = False, time.perf_counter() - started, 'timeout', 'timeout'
+            if not future.cancelled():
+                future.add_done_callback(lambda f, name=notifier.name: _report_late(name, f))
+
+        result = {'status': status, 'success': success, 'latency_ms': round(elapsed * 1000, 1)}
+        if error:
+            result['error'] = error
+        results[notifier.name] = result
+
+        metrics.increment('notifications', sink=notifier.name, status=status)
+        metrics.observe('notification_latency_seconds', elapsed, sink=notifier.name)
+
+    return results
+
+
+def _report_late(name, future):
+    """タイムアウトと報告した後に終わった送信の結果を残す"""
+    try:
+        status, elapsed, _ = future.result()
+    except Exception:
+        status, elapsed = 'failed', 0.0
+    print(f"⚠ {name} notification finished after timeout ({elapsed:.1f}s, {status})")
+    metrics.increment('notifications_late', sink=name, status=status)
+
+
+def delivery_status(results):
+    """dispatch の結果全体（いずれかに送信済みなら True、ためただけなら 'queued'、それ以外は False）"""
+    statuses = {result['status'] for result in results.values()}
+    if 'sent' in statuses:
+        return True
+    return QUEUED if QUEUED in statuses else False
@@ -0,0 +1,173 @@
+"""
+HTMLメタタグ解析
+BeautifulSoupでの解析はGILを握り続けるため、大きなページはプロセスプールに回す
+ワーカーには生のバイト列を渡し、抽出した小さなメタ情報の辞書だけを受け取る
+
+ページに埋め込まれたJSON（<script id="..."> の中身）だけが欲しい場合は find_script_json で
+DOMを組み立てずにストリーミングで取り出す
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from bs4 import BeautifulSoup
+
+from . import metrics, tracing
+
+
+# プロセスプールのワーカー数（0ならすべて同じプロセス内で解析）
+PARSE_POOL_SIZE = int(os.environ.get('PARSE_POOL_SIZE', '0'))
+
+# ワーカーを作り直すまでの処理件数（メモリ断片化対策）
+PARSE_POOL_MAX_TASKS = int(os.environ.get('PARSE_POOL_MAX_TASKS', '200'))
+
+# これより小さいHTMLはプロセス間通信の方が高くつくので同じプロセスで解析
+PARSE_INLINE_THRESHOLD = int(os.environ.get('PARSE_INLINE_THRESHOLD', '65536'))
+
+# プールでの解析を待つ最大秒数
+PARSE_TIMEOUT_SECONDS = 10
+
+# 埋め込みJSONを探して読む最大バイト数（見つからなければここで読むのをやめる）
+EMBEDDED_JSON_MAX_BYTES = int(os.environ.get('EMBEDDED_JSON_MAX_BYTES', str(4 * 1024 * 1024)))
+
+_SCRIPT_END = b'</script>'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def extract_meta(html):
+    """HTMLから meta タグ（property/name → content）と title を抽出
+
+    プロセスプールのワーカーでも実行されるため、モジュールレベルの関数にしている。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    meta = {}
+    for tag in soup.find_all('meta'):
+        key = tag.get('property') or tag.get('name')
+        content = tag.get('content')
+        if key and content is not None and key not in meta:
+            meta[key] = content
+    if soup.title and soup.title.string:
+        meta.setdefault('title', soup.title.string.strip())
+    return meta
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                context = multiprocessing.get_context('spawn')
+                try:
+                    _pool = ProcessPoolExecutor(
+                        max_workers=PARSE_POOL_SIZE,
+                        mp_context=context,
+                        max_tasks_per_child=PARSE_POOL_MAX_TASKS
+                    )
+                except TypeError:
+                    # Python 3.10以前は max_tasks_per_child 非対応
+                    _pool = ProcessPoolExecutor(max_workers=PARSE_POOL_SIZE, mp_context=context)
+                print(f"✓ Parse pool started: {PARSE_POOL_SIZE} workers")
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_meta(html):
+    """HTML（bytes または str）から meta 情報を抽出
+
+    PARSE_POOL_SIZE > 0 かつ PARSE_INLINE_THRESHOLD 以上のサイズならプロセスプールで解析する。
+    プールが使えない場合は同じプロセスで解析する。
+    """
+    with tracing.span('parse', bytes=len(html)) as span:
+        meta = _parse_meta(html)
+        span.set('fields', len(meta))
+        return meta
+
+
+def _parse_meta(html):
+    if PARSE_POOL_SIZE <= 0 or len(html) < PARSE_INLINE_THRESHOLD:
+        metrics.increment('html_parses', mode='inline')
+        return extract_meta(html)
+
+    try:
+        meta = _get_pool().submit(extract_meta, html).result(timeout=PARSE_TIMEOUT_SECONDS)
+        metrics.increment('html_parses', mode='pool')
+        return meta
+    except BrokenProcessPool as e:
+        print(f"Parse pool broken, restarting: {e}")
+        _reset_pool()
+    except Exception as e:
+        print(f"Parse pool failed: {e}")
+
+    metrics.increment('html_parses', mode='inline_fallback')
+    return extract_meta(html)
+
+
+def find_script_json(chunks, element_ids, limit=None):
+    """ストリーミングで受け取ったHTMLから、指定IDの <script> に埋め込まれたJSONだけを取り出す
+
+    DOMは組み立てず、id 属性のバイト列を探して閉じタグまでをデコードし、見つかった時点で読むのをやめる。
+    戻り値は (見つかったID, デコードしたJSON, 読んだバイト列)。見つからない・壊れている場合は
+    ID と JSON が None になる（読んだバイト列は OG タグへのフォールバックに使える）。
+    """
+    limit = EMBEDDED_JSON_MAX_BYTES if limit is None else limit
+    markers = [(element_id, f'id="{element_id}"'.encode('utf-8')) for element_id in element_ids]
+    longest = max(len(marker) for _, marker in markers)
+    buffer = bytearray()
+    searched = 0     # ここより前にマーカーはない
+    found = None     # (ID, マーカーの位置)
+    body_start = -1  # JSONの開始位置
+    end_searched = 0
+
+    with tracing.span('embedded_json') as span:
+        for chunk in chunks:
+            buffer += chunk
+            if found is None:
+                for element_id, marker in markers:
+                    position = buffer.find(marker, searched)
+                    if position != -1:
+                        found = (element_id, position)
+                        break
+                else:
+                    searched = max(0, len(buffer) - longest + 1)
+            if found is not None and body_start == -1:
+                tag_end = buffer.find(b'>', found[1])
+                if tag_end != -1:
+                    body_start = end_searched = tag_end + 1
+            if body_start != -1:
+                end = buffer.find(_SCRIPT_END, end_searched)
+                if end != -1:
+                    span.set('bytes', len(buffer))
+                    try:
+                        data = json.loads(bytes(buffer[body_start:end]))
+                    except ValueError as e:
+                        print(f"⚠ Embedded JSON {found[0]} is not valid: {e}")
+                        metrics.increment('embedded_json', result='invalid')
+                        return None, None, buffer
+                    span.set('found', found[0])
+                    metrics.increment('embedded_json', result='found')
+                    return found[0], data, buffer
+                end_searched = max(body_start, len(buffer) - len(_SCRIPT_END) + 1)
+            if len(buffer) > limit:
+                break
+
+        span.set('bytes', len(buffer))
+        metrics.increment('embedded_json', result='missing')
+        return None, None, buffer
+
+
+def shutdown():
+    """プロセスプールを停止"""
+    _reset_pool()
@@ -0,0 +1,170 @@
+"""
+ペイロード正規化
+webhook のリクエストボディを上限付きで1回だけ読み込み、共有されたURLと追加の項目を取り出す
+
+対応する形式:
+- JSON: {"url": "..."}、{"url": {"url": "..."}}、文字列化・二重エンコードされたJSON、\\/ のエスケープ
+- フォーム（application/x-www-form-urlencoded）: url=...&username=...
+- テキスト（text/plain など）: URLそのもの、または共有シートの文章に埋め込まれたURL
+上限（PAYLOAD_MAX_BYTES）を超えるボディは読み切る前に 413 で拒否する
+"""
+
+import json
+import os
+import re
+from urllib.parse import parse_qsl
+
+from . import metrics
+from .common import detect_platform
+
+
+# ボディの上限（バイト）
+PAYLOAD_MAX_BYTES = int(os.environ.get('PAYLOAD_MAX_BYTES', '65536'))
+
+# 入れ子・多重エンコードを辿る深さの上限
+MAX_DEPTH = 4
+
+# URLとして扱うキー（先に見つかったものを使う）
+URL_KEYS = ('url', 'link', 'text')
+
+# 呼び出し側に渡す追加の項目
+FIELD_KEYS = ('username', 'caption', 'progressive')
+
+_READ_CHUNK = 8192
+
+_URL_RE = re.compile(r'https?://[^\s<>"\'`「」『』（）【】、。，　]+', re.IGNORECASE)
+_FORM_RE = re.compile(r'^[A-Za-z_][\w.\-]*=[^\s]*$')
+_TRAILING = '.,;:!?)]}>\'"'
+
+
+class PayloadError(Exception):
+    """ペイロードを受け付けられない（status: HTTPステータス）"""
+
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class Payload:
+    """正規化したペイロード"""
+
+    def __init__(self, url, fields, kind):
+        self.url = url
+        self.fields = fields    # username / caption / progressive（指定されたものだけ）
+        self.kind = kind        # json / form / text
+
+    def get(self, key, default=None):
+        return self.fields.get(key, default)
+
+
+def check_length(content_length, limit=None):
+    """Content-Length だけで判定できる上限超過を、ボディを読む前に拒否"""
+    limit = PAYLOAD_MAX_BYTES if limit is None else limit
+    if content_length is not None and content_length > limit:
+        metrics.increment('payload_rejected', reason='too_large')
+        raise PayloadError(413, 'Payload too large')
+
+
+def read_body(stream, content_length=None, limit=None):
+    """ボディを上限+1バイトまで読む（超えたら 413、チャンク転送でも上限以上は読まない）"""
+    limit = PAYLOAD_MAX_BYTES if limit is None else limit
+    check_length(content_length, limit)
+
+    chunks = []
+    size = 0
+    while size <= limit:
+        chunk = stream.read(min(_READ_CHUNK, limit + 1 - size))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    if size > limit:
+        metrics.increment('payload_rejected', reason='too_large')
+        raise PayloadError(413, 'Payload too large')
+    return b''.join(chunks)
+
+
+def normalize(body, content_type=''):
+    """ボディからURLと追加の項目を取り出す（取り出せなければ PayloadError(400)）"""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8-sig', errors='replace')
+    text = body.strip()
+    if not text:
+        raise PayloadError(400, 'No data provided')
+
+    mime = (content_type or '').split(';', 1)[0].strip().lower()
+    if mime == 'application/x-www-form-urlencoded' or (mime != 'application/json' and _FORM_RE.match(text)):
+        kind = 'form'
+        value = dict(parse_qsl(text, keep_blank_values=True))
+    else:
+        value = _loads(text)
+        kind = 'text' if value is None else 'json'
+        if value is None:
+            value = text
+
+    url, fields = _unwrap(value, 0)
+    if not url:
+        metrics.increment('payload_rejected', reason='no_url')
+        raise PayloadError(400, 'No URL provided')
+    return Payload(url, fields, kind)
+
+
+def _loads(text):
+    """JSONらしければ解析（JSONでなければ None）"""
+    if text[:1] not in '{["':
+        return None
+    try:
+        return json.loads(text)
+    except (ValueError, RecursionError):
+        return None
+
+
+def _unwrap(value, depth):
+    """入れ子の辞書・リスト・文字列化されたJSONを辿ってURLを探す"""
+    if depth > MAX_DEPTH:
+        return '', {}
+
+    if isinstance(value, dict):
+        fields = {}
+        for key in FIELD_KEYS:
+            field = value.get(key)
+            if isinstance(field, (str, int, float, bool)):
+                fields[key] = field if key == 'progressive' else str(field)
+        for key in URL_KEYS:
+            if key in value:
+                url, inner = _unwrap(value[key], depth + 1)
+                if url:
+                    for name, field in inner.items():
+                        fields.setdefault(name, field)
+                    return url, fields
+        return '', fields
+
+    if isinstance(value, list):
+        for item in value[:16]:
+            url, fields = _unwrap(item, depth + 1)
+            if url:
+                return url, fields
+        return '', {}
+
+    if isinstance(value, str):
+        text = value.strip()
+        if '\\/' in text:
+            text = text.replace('\\/', '/')
+        parsed = _loads(text)
+        if parsed is not None and not isinstance(parsed, (int, float, bool)):
+            return _unwrap(parsed, depth + 1)
+        return find_url(text), {}
+
+    return '', {}
+
+
+def find_url(text):
+    """文章中のURLを探す（対応プラットフォームのURLを優先、なければ最初のURL）"""
+    first = ''
+    for match in _URL_RE.finditer(text):
+        url = match.group(0).rstrip(_TRAILING)
+        if detect_platform(url):
+            return url
+        first = first or url
+    return first
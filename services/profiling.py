@@ -0,0 +1,155 @@
+"""
+リクエストプロファイラ
+指定されたリクエスト（またはサンプリング対象）をプロファイルし、
+pstats（cProfile）と collapsed-stack（サンプリング、フレームグラフ用）をローカルに保存する
+"""
+
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from . import metrics
+
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MAX_CAPTURES = int(os.environ.get('PROFILE_MAX_CAPTURES', '50'))
+
+# スタックサンプリングの間隔（秒）
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5')) / 1000
+
+_CAPTURE_NAME = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}\.(pstats|collapsed)$')
+_rotate_lock = threading.Lock()
+
+# cProfile は同時に1つしか有効にできない（Python 3.12以降は2つ目の enable() が ValueError）ため、1件ずつプロファイルする
+_active = threading.Lock()
+
+
+def should_sample():
+    """設定されたサンプリング率でプロファイル対象にするか判定"""
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class _StackSampler(threading.Thread):
+    """対象スレッドのスタックを一定間隔で採取し、collapsed形式で集計する"""
+
+    def __init__(self, thread_id):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profile_request(label=''):
+    """ブロック内の処理をプロファイルしてファイルに保存する
+
+    他のリクエストをプロファイル中なら、プロファイルせずにそのまま実行する（capture_id は None）
+    """
+    if not _active.acquire(blocking=False):
+        print(f"⚠ Profiler busy, skipped: {label}")
+        metrics.increment('profiles_skipped', reason='busy')
+        yield None
+        return
+
+    try:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # このアプリ以外のプロファイラ（sys.monitoring の利用者など）が有効
+            print(f"⚠ Profiler unavailable, skipped: {e}")
+            metrics.increment('profiles_skipped', reason='unavailable')
+            yield None
+            return
+
+        capture_id = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        sampler = _StackSampler(threading.get_ident())
+        started = time.perf_counter()
+        try:
+            sampler.start()
+            yield capture_id
+        finally:
+            profiler.disable()
+            if sampler.ident is not None:
+                sampler.stop()
+            elapsed = time.perf_counter() - started
+            try:
+                _save(capture_id, profiler, sampler.stacks)
+                print(f"✓ Profile saved: {capture_id} ({label}, {elapsed * 1000:.0f} ms)")
+                metrics.increment('profiles_captured')
+            except OSError as e:
+                print(f"Failed to save profile: {e}")
+    finally:
+        _active.release()
+
+
+def _save(capture_id, profiler, stacks):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f'{capture_id}.pstats'))
+    with open(os.path.join(PROFILE_DIR, f'{capture_id}.collapsed'), 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    _rotate()
+
+
+def _rotate():
+    """古いキャプチャを削除して PROFILE_MAX_CAPTURES 件に保つ"""
+    with _rotate_lock:
+        captures = list_captures()
+        for capture in captures[PROFILE_MAX_CAPTURES:]:
+            for name in capture['files']:
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, name))
+                except OSError:
+                    pass
+
+
+def list_captures():
+    """保存済みキャプチャ（新しい順）"""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except OSError:
+        return []
+
+    captures = {}
+    for name in names:
+        if not _CAPTURE_NAME.match(name):
+            continue
+        capture_id = name.rsplit('.', 1)[0]
+        entry = captures.setdefault(capture_id, {'id': capture_id, 'files': [], 'size_bytes': 0})
+        entry['files'].append(name)
+        entry['size_bytes'] += os.path.getsize(os.path.join(PROFILE_DIR, name))
+
+    return sorted(captures.values(), key=lambda c: c['id'], reverse=True)
+
+
+def capture_path(name):
+    """キャプチャファイルのパス（不正な名前や存在しない場合は None）"""
+    if not _CAPTURE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
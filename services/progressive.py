@@ -0,0 +1,118 @@
+"""
+プログレッシブ応答
+URLだけで作れる投稿文を即座に返し、本文の取得（エンリッチ）はバックグラウンドで続ける
+エンリッチ結果はジョブごとのイベントとして Server-Sent Events で配信する
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+
+PROGRESSIVE_MODE = os.environ.get('PROGRESSIVE_MODE', '0') == '1'
+PROGRESSIVE_WORKERS = int(os.environ.get('PROGRESSIVE_WORKERS', '4'))
+
+# ジョブを保持する秒数と最大件数
+JOB_TTL_SECONDS = 600
+MAX_JOBS = 256
+
+# SSEのハートビート間隔と最大接続時間
+HEARTBEAT_SECONDS = 15
+STREAM_TIMEOUT_SECONDS = 120
+
+_executor = ThreadPoolExecutor(max_workers=PROGRESSIVE_WORKERS, thread_name_prefix='enrich')
+
+
+class Job:
+    """エンリッチ中の共有1件"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.created_at = time.time()
+        self.events = []        # (イベント名, データ)
+        self.done = False
+        self._condition = threading.Condition()
+
+    def publish(self, event, data, final=False):
+        with self._condition:
+            self.events.append((event, data))
+            if final:
+                self.done = True
+            self._condition.notify_all()
+
+    def wait_for(self, index, timeout):
+        """index番目以降のイベントが届くか完了するまで待つ"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > index or self.done, timeout)
+            return self.events[index:], self.done
+
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _prune(now):
+    while _jobs:
+        job = next(iter(_jobs.values()))
+        if len(_jobs) <= MAX_JOBS and now - job.created_at < JOB_TTL_SECONDS:
+            break
+        _jobs.popitem(last=False)
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def start_job(initial, enrich):
+    """ジョブを登録し、バックグラウンドでエンリッチを開始する
+
+    initial: 即時レスポンスの内容（最初のイベントとして配信）
+    enrich : 引数なしで呼ばれ、エンリッチ後の内容を返す関数
+    """
+    job = Job(uuid.uuid4().hex)
+    job.publish('initial', initial)
+    with _jobs_lock:
+        _prune(time.time())
+        _jobs[job.id] = job
+
+    def run():
+        started = time.perf_counter()
+        try:
+            job.publish('enriched', enrich(), final=True)
+            metrics.increment('progressive_enrichments', success=True)
+        except Exception as e:
+            print(f"Error enriching share: {e}")
+            job.publish('error', {'error': str(e)}, final=True)
+            metrics.increment('progressive_enrichments', success=False)
+        metrics.observe('progressive_enrich_seconds', time.perf_counter() - started)
+
+    # リクエストのコンテキスト（デッドラインなど）は引き継がない
+    _executor.submit(contextvars.Context().run, run)
+    return job
+
+
+def stream_events(job):
+    """ジョブのイベントをSSE形式で順に生成"""
+    index = 0
+    deadline = time.monotonic() + STREAM_TIMEOUT_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events, done = job.wait_for(index, min(HEARTBEAT_SECONDS, remaining))
+        if not events and not done:
+            yield ': keep-alive\n\n'
+            continue
+        for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        index += len(events)
+        if done and index >= len(job.events):
+            return
@@ -0,0 +1,72 @@
+"""
+プラットフォーム別の情報抽出プロバイダー
+各プロバイダーは次の形の関数:
+    extract(url, provided_username='', provided_caption='', fetch_remote=True) -> SocialMediaInfo
+
+extract(url, data) はプラットフォームの判定・結果のキャッシュを含めた入口（webhook と一括変換で共通）
+"""
+
+from .cache import get_cache, get_info, set_info
+from .common import clean_url, detect_platform
+from .instagram_service import extract_instagram_info
+from .tiktok_service import extract_tiktok_info
+from .youtube_service import extract_youtube_info
+
+
+PROVIDERS = {
+    'instagram': extract_instagram_info,
+    'tiktok': extract_tiktok_info,
+    'youtube': extract_youtube_info,
+}
+
+# 本文が取得できなかった結果をキャッシュする秒数
+FALLBACK_CACHE_TTL = 300
+
+
+def get_provider(platform):
+    """プラットフォームに対応する抽出関数を取得"""
+    provider = PROVIDERS.get(platform)
+    if provider is None:
+        raise ValueError(f"Platform not implemented: {platform}")
+    return provider
+
+
+def supported_platforms():
+    return list(PROVIDERS)
+
+
+def extract(url, data, fetch_remote=True):
+    """URLからプラットフォームを検出し、適切な情報抽出サービスを呼び出す
+
+    fetch_remote=False の場合は上流に問い合わせず、URL（とキャッシュ）から分かる情報だけを返す
+    """
+    
+    platform = detect_platform(url)
+    
+    if not platform:
+        raise ValueError(f"Unsupported platform: {url}")
+    
+    print(f"✓ Detected platform: {platform}")
+    
+    # 共通パラメータを取得
+    provided_username = data.get('username', '').strip()
+    provided_caption = data.get('caption', '').strip()
+    
+    # 手動指定がなければ、他ワーカーが取得済みの結果を再利用
+    cache_key = None
+    if not provided_username and not provided_caption:
+        cache_key = f'info:{platform}:{clean_url(url)}'
+        cached_info = get_info(get_cache(), cache_key)
+        if cached_info:
+            print(f"✓ Using cached info: {cache_key}")
+            return cached_info
+    
+    # プラットフォーム別に情報抽出
+    info = get_provider(platform)(url, provided_username, provided_caption, fetch_remote)
+    
+    if cache_key and fetch_remote and not info.upstream_skipped:
+        # 本文が取れなかった（フォールバック文言の）結果は短時間だけ保持
+        # 上流が落ちていて取得を飛ばした結果は保持しない（復旧したらすぐ取り直す）
+        set_info(get_cache(), cache_key, info, FALLBACK_CACHE_TTL if info.description_fallback else None)
+    
+    return info
@@ -0,0 +1,114 @@
+"""
+上流レスポンスの記録と再生
+記録モードでは http_client を通るすべてのレスポンス（oEmbed JSON、HTML、リダイレクト、
+Pushoverの応答）を gzip 圧縮の JSONL コーパスに保存する
+再生モードではコーパスからレスポンスを返し、ネットワークには一切アクセスしない
+"""
+
+import atexit
+import base64
+import gzip
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# コーパスに残すレスポンスヘッダー
+KEPT_HEADERS = ('Content-Type', 'Location', 'Retry-After', 'Content-Encoding')
+
+
+def request_key(method, url, params=None):
+    """メソッドとクエリを正規化したURLからコーパスのキーを作る"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend(params.items() if isinstance(params, dict) else params)
+    normalized = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(sorted(query)), ''))
+    return f'{method.upper()} {normalized}'
+
+
+def _encode_response(response):
+    return {
+        'status': response.status_code,
+        'url': response.url,
+        'headers': {k: v for k, v in response.headers.items() if k in KEPT_HEADERS},
+        'body': base64.b64encode(response.content).decode('ascii'),
+    }
+
+
+def _decode_response(entry, method):
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.url = entry['url']
+    response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+    response._content = base64.b64decode(entry['body'])
+    response._content_consumed = True
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.request = requests.Request(method, entry['url']).prepare()
+    response.history = [_decode_response(hop, method) for hop in entry.get('history', [])]
+    return response
+
+
+class Recorder:
+    """実際に通信し、レスポンスをコーパスに追記する transport"""
+
+    def __init__(self, path, inner=None):
+        self.path = path
+        self.inner = inner    # 実際の送信関数（省略時は requests.request）
+        self._entries = []
+        self._lock = threading.Lock()
+        atexit.register(self.save)
+
+    def __call__(self, method, url, **kwargs):
+        response = (self.inner or requests.request)(method, url, **kwargs)
+        entry = _encode_response(response)
+        entry['key'] = request_key(method, url, kwargs.get('params'))
+        entry['history'] = [_encode_response(hop) for hop in response.history]
+        entry['elapsed_ms'] = round(response.elapsed.total_seconds() * 1000, 1)
+        with self._lock:
+            self._entries.append(entry)
+        return response
+
+    def save(self):
+        """記録した分をコーパスに追記（gzipのメンバーとして追記するので既存分は残る）"""
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        print(f"✓ Recorded {len(entries)} responses to {self.path}")
+
+
+class ReplayTransport:
+    """コーパスからレスポンスを返す transport（ネットワークにはアクセスしない）
+
+    同じキーが複数回記録されている場合は記録順に返し、尽きたら最後のものを返し続ける。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._responses = defaultdict(list)
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._responses[entry['key']].append(entry)
+
+    def __call__(self, method, url, **kwargs):
+        key = request_key(method, url, kwargs.get('params'))
+        with self._lock:
+            entries = self._responses.get(key)
+            if not entries:
+                raise requests.ConnectionError(f"Not in replay corpus: {key}")
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+        return _decode_response(entry, method)
@@ -0,0 +1,186 @@
+"""
+優先度スケジューラ
+情報抽出と通知の各ステージの前で処理枠を割り当て、
+一括処理（bulk）や再送（retry）が多くても、手元からの共有（interactive）を待たせない
+
+- 重み付き公平配分: 空いた枠は「これまでに割り当てた数 / 重み」が最も小さいレーンへ
+- レーンごとの同時実行数の上限: bulk が全枠を占有しない
+- 飢餓防止: SCHEDULER_STARVATION_SECONDS 以上待っている要求は重みに関係なく先に通す
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+
+from . import http_client, metrics
+from .admission import AdmissionRejected
+
+
+LANES = ('interactive', 'retry', 'bulk')
+DEFAULT_LANE = 'interactive'
+
+
+def _parse_lane_map(value, default):
+    """'interactive=8,retry=3,bulk=1' 形式の設定を辞書にする"""
+    result = dict(default)
+    for item in value.split(','):
+        if '=' in item:
+            name, number = item.split('=', 1)
+            if name.strip() in LANES:
+                result[name.strip()] = float(number)
+    return result
+
+
+SCHEDULER_MAX_CONCURRENT = int(os.environ.get('SCHEDULER_MAX_CONCURRENT', '4'))
+SCHEDULER_WEIGHTS = _parse_lane_map(os.environ.get('SCHEDULER_WEIGHTS', ''),
+                                    {'interactive': 8, 'retry': 3, 'bulk': 1})
+SCHEDULER_LANE_CAPS = _parse_lane_map(os.environ.get('SCHEDULER_LANE_CAPS', ''),
+                                      {'interactive': 4, 'retry': 2, 'bulk': 2})
+SCHEDULER_MAX_QUEUE = int(os.environ.get('SCHEDULER_MAX_QUEUE', '32'))
+SCHEDULER_MAX_WAIT_SECONDS = float(os.environ.get('SCHEDULER_MAX_WAIT_SECONDS', '20'))
+SCHEDULER_STARVATION_SECONDS = float(os.environ.get('SCHEDULER_STARVATION_SECONDS', '2'))
+
+_current_lane = contextvars.ContextVar('scheduler_lane', default=DEFAULT_LANE)
+
+
+class _Waiter:
+    __slots__ = ('enqueued', 'granted')
+
+    def __init__(self):
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class _Lane:
+    def __init__(self, name, weight, cap):
+        self.name = name
+        self.weight = max(weight, 0.001)
+        self.cap = int(cap)
+        self.active = 0
+        self.waiters = deque()
+        self.vtime = 0.0    # 割り当て数 / 重み（仮想時間）
+
+
+class PriorityScheduler:
+    """レーンごとの待ち行列から、重み付き公平に処理枠を割り当てる"""
+
+    def __init__(self, max_concurrent=SCHEDULER_MAX_CONCURRENT, weights=SCHEDULER_WEIGHTS,
+                 caps=SCHEDULER_LANE_CAPS, max_queue=SCHEDULER_MAX_QUEUE,
+                 starvation_seconds=SCHEDULER_STARVATION_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.starvation_seconds = starvation_seconds
+        self.lanes = {name: _Lane(name, weights[name], caps[name]) for name in LANES}
+        self.active = 0
+        self._vclock = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, lane, timeout=SCHEDULER_MAX_WAIT_SECONDS):
+        """処理枠を確保する。確保できなければ AdmissionRejected(503) を送出"""
+        target = self.lanes[lane]
+        with self._condition:
+            if self._can_run(target) and not any(l.waiters for l in self.lanes.values()):
+                self._grant(target)
+                return time.monotonic()
+
+            if len(target.waiters) >= self.max_queue:
+                metrics.increment('scheduler_rejected', lane=lane, reason='queue_full')
+                raise AdmissionRejected(503, 'Server busy', 1)
+
+            waiter = _Waiter()
+            if not target.waiters:
+                # 空だったレーンは過去の未使用分を貯めない
+                target.vtime = max(target.vtime, self._vclock)
+            target.waiters.append(waiter)
+            self._dispatch()
+            self._condition.wait_for(lambda: waiter.granted, max(0.0, timeout))
+
+            if not waiter.granted:
+                target.waiters.remove(waiter)
+                metrics.increment('scheduler_rejected', lane=lane, reason='timeout')
+                raise AdmissionRejected(503, 'Server busy', 1)
+
+        metrics.observe('scheduler_wait_seconds', time.monotonic() - waiter.enqueued, lane=lane)
+        return time.monotonic()
+
+    def release(self, lane):
+        with self._condition:
+            self.lanes[lane].active -= 1
+            self.active -= 1
+            self._dispatch()
+
+    def _can_run(self, lane):
+        return self.active < self.max_concurrent and lane.active < lane.cap
+
+    def _grant(self, lane):
+        lane.active += 1
+        self.active += 1
+        self._vclock = lane.vtime
+        lane.vtime += 1 / lane.weight
+
+    def _dispatch(self):
+        """ロック内で呼ぶ。空いている枠を待っているレーンに割り当てる"""
+        granted = False
+        while self.active < self.max_concurrent:
+            candidates = [l for l in self.lanes.values() if l.waiters and l.active < l.cap]
+            if not candidates:
+                break
+            now = time.monotonic()
+            starving = [l for l in candidates if now - l.waiters[0].enqueued >= self.starvation_seconds]
+            if starving:
+                lane = min(starving, key=lambda l: l.waiters[0].enqueued)
+                metrics.increment('scheduler_starvation_grants', lane=lane.name)
+            else:
+                lane = min(candidates, key=lambda l: l.vtime)
+            lane.waiters.popleft().granted = True
+            self._grant(lane)
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'active': self.active,
+                'max_concurrent': self.max_concurrent,
+                'lanes': {
+                    name: {'active': lane.active, 'waiting': len(lane.waiters), 'cap': lane.cap}
+                    for name, lane in self.lanes.items()
+                },
+            }
+
+
+scheduler = PriorityScheduler()
+
+
+def set_lane(lane):
+    """現在のコンテキストのレーンを設定（戻り値は reset_lane に渡す）"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown priority: {lane}")
+    return _current_lane.set(lane)
+
+
+def reset_lane(token):
+    _current_lane.reset(token)
+
+
+def current_lane():
+    return _current_lane.get()
+
+
+@contextlib.contextmanager
+def slot(lane=None):
+    """現在のレーンで処理枠を確保してブロックを実行（待ち時間はデッドラインの残りまで）"""
+    lane = lane or current_lane()
+    timeout = SCHEDULER_MAX_WAIT_SECONDS
+    remaining = http_client.remaining_time()
+    if remaining is not None:
+        timeout = min(timeout, remaining)
+    scheduler.acquire(lane, timeout)
+    try:
+        yield
+    finally:
+        scheduler.release(lane)
@@ -0,0 +1,200 @@
+"""
+共有の統計（ロールアップ）
+共有履歴の書き込みと同じトランザクションで、時間・日ごとの集計テーブルにカウンターを足し込む
+（プラットフォーム、種類、ユーザー名ごとの共有数、本文の取得成功数、通知の成功数）
+
+/stats は集計テーブルだけを読むので、履歴の件数に関係なく期間と集計キーの数だけで応答時間が決まる
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+# 粒度 → テーブル
+TABLES = {'hour': 'stats_hourly', 'day': 'stats_daily'}
+
+# 期間の指定がない場合の日数と、ユーザー名ランキングの件数
+DEFAULT_RANGE_DAYS = 7
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+# これより長い期間は日単位で集計する（秒）
+HOURLY_MAX_RANGE = 2 * 86400
+
+# 既存の履歴から集計し直すときに一度に読む件数
+_BACKFILL_CHUNK = 5000
+
+_SCHEMA = [
+    f'CREATE TABLE IF NOT EXISTS {table} ('
+    ' tenant TEXT NOT NULL,'
+    ' dimension TEXT NOT NULL,'
+    ' bucket INTEGER NOT NULL,'
+    ' key TEXT NOT NULL,'
+    ' shares INTEGER NOT NULL DEFAULT 0,'
+    ' scraped INTEGER NOT NULL DEFAULT 0,'
+    ' notified INTEGER NOT NULL DEFAULT 0,'
+    ' PRIMARY KEY (tenant, dimension, bucket, key)) WITHOUT ROWID'
+    for table in TABLES.values()
+]
+
+
+def hour_bucket(ts):
+    """時間の区切り（UNIXタイムスタンプ）"""
+    return int(ts // 3600 * 3600)
+
+
+def day_bucket(ts):
+    """日の区切り（ローカル時刻の0時、UNIXタイムスタンプ）"""
+    t = time.localtime(ts)
+    return int(time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1)))
+
+
+BUCKETS = {'hour': hour_bucket, 'day': day_bucket}
+
+
+def setup(conn):
+    """集計テーブルを用意（後から作った場合は既存の履歴から集計する）
+
+    複数の接続が同時に初回の集計をしないよう、書き込みロックを取ってから確認する
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'stats_hourly'").fetchone()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        if not exists:
+            _backfill(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rebuild(conn):
+    """集計テーブルを履歴から集計し直す（呼び出し側のトランザクション内で実行する）"""
+    for table in TABLES.values():
+        conn.execute(f'DELETE FROM {table}')
+    _backfill(conn)
+
+
+def _backfill(conn):
+    rollup = Rollup()
+    count = 0
+    cursor = conn.execute('SELECT created_at, tenant, platform, type, username, description, notification_sent'
+                          ' FROM shares')
+    while True:
+        rows = cursor.fetchmany(_BACKFILL_CHUNK)
+        if not rows:
+            break
+        for created_at, tenant, platform, kind, username, description, notification_sent in rows:
+            rollup.add({
+                'created_at': created_at, 'tenant': tenant, 'platform': platform, 'type': kind,
+                'username': username, 'description': description, 'notification_sent': notification_sent,
+            })
+        count += len(rows)
+    rollup.flush(conn)
+    if count:
+        print(f"✓ Built share statistics from {count} history rows")
+
+
+class Rollup:
+    """共有をメモリ上で集計し、まとめて集計テーブルに足し込む"""
+
+    def __init__(self):
+        self._counts = defaultdict(lambda: [0, 0, 0])
+
+    def add(self, entry):
+        created_at = entry.get('created_at') or time.time()
+        tenant = entry.get('tenant') or 'default'
+        scraped = 1 if entry.get('description') else 0
+        notified = 1 if entry.get('notification_sent') else 0
+        # 集計の軸（all は全体）
+        keys = (
+            ('all', ''),
+            ('platform', entry.get('platform') or ''),
+            ('type', entry.get('type') or ''),
+            ('username', entry.get('username') or ''),
+        )
+        for granularity, bucket_of in BUCKETS.items():
+            bucket = bucket_of(created_at)
+            for dimension, key in keys:
+                counts = self._counts[(granularity, tenant, dimension, bucket, key)]
+                counts[0] += 1
+                counts[1] += scraped
+                counts[2] += notified
+
+    def flush(self, conn):
+        """集計テーブルに足し込む（呼び出し側のトランザクション内で実行する）"""
+        rows = defaultdict(list)
+        for (granularity, *key), counts in self._counts.items():
+            rows[granularity].append((*key, *counts))
+        for granularity, values in rows.items():
+            conn.executemany(
+                f'INSERT INTO {TABLES[granularity]} (tenant, dimension, bucket, key, shares, scraped, notified)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (tenant, dimension, bucket, key) DO UPDATE SET'
+                ' shares = shares + excluded.shares,'
+                ' scraped = scraped + excluded.scraped,'
+                ' notified = notified + excluded.notified',
+                values,
+            )
+        self._counts.clear()
+
+
+def query(conn, tenant='default', since=None, until=None, bucket=None, top=DEFAULT_TOP):
+    """期間内の統計を集計テーブルから返す
+
+    since/until はUNIXタイムスタンプ（省略時は直近 DEFAULT_RANGE_DAYS 日）。
+    bucket は hour / day（省略時は期間が2日以内なら hour）。期間は bucket の区切りに切り下げる。
+    """
+    until = time.time() if until is None else until
+    since = until - DEFAULT_RANGE_DAYS * 86400 if since is None else since
+    if since >= until:
+        raise ValueError('since must be before until')
+    if bucket is None:
+        bucket = 'hour' if until - since <= HOURLY_MAX_RANGE else 'day'
+    if bucket not in TABLES:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    top = max(1, min(int(top), MAX_TOP))
+
+    table = TABLES[bucket]
+    start = BUCKETS[bucket](since)
+    where = 'tenant = ? AND dimension = ? AND bucket >= ? AND bucket < ?'
+
+    def grouped(dimension, limit=None):
+        sql = (f'SELECT key, SUM(shares), SUM(scraped), SUM(notified) FROM {table} WHERE {where}'
+               ' GROUP BY key ORDER BY SUM(shares) DESC, key')
+        params = [tenant, dimension, start, until]
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return conn.execute(sql, params).fetchall()
+
+    series = conn.execute(
+        f'SELECT bucket, shares, scraped, notified FROM {table} WHERE {where} ORDER BY bucket',
+        [tenant, 'all', start, until],
+    ).fetchall()
+
+    totals = [sum(row[i] for row in series) for i in (1, 2, 3)]
+    return {
+        'since': start,
+        'until': until,
+        'bucket': bucket,
+        'totals': _summary(*totals),
+        'platforms': {key: _summary(*counts) for key, *counts in grouped('platform')},
+        'types': {key: _summary(*counts) for key, *counts in grouped('type')},
+        'usernames': [{'username': key, **_summary(*counts)} for key, *counts in grouped('username', top)],
+        'series': [{'bucket': datetime.fromtimestamp(start_at).isoformat(), **_summary(*counts)}
+                   for start_at, *counts in series],
+    }
+
+
+def _summary(shares, scraped, notified):
+    return {
+        'shares': shares,
+        'scrape_success_rate': round(scraped / shares, 4) if shares else None,
+        'notification_success_rate': round(notified / shares, 4) if shares else None,
+    }
@@ -0,0 +1,170 @@
+"""
+テナント管理
+1つのデプロイを複数人で使うため、APIキーまたはパスのセグメントでテナントを切り替える
+
+テナントごとに通知先の認証情報・テンプレート・同時処理枠（レーン）を持つ。
+起動時に設定ファイル（TENANTS_PATH）を一度だけ読み込み、辞書で引く。
+設定がない場合は環境変数（PUSHOVER_TOKEN など）から作る default テナントだけになる。
+
+設定ファイル（JSON）の例:
+{
+  "tenants": [
+    {
+      "id": "alice",
+      "api_key": "<ランダムな文字列>",
+      "path": "alice-7f3a",
+      "pushover_token": "...", "pushover_user": "...",
+      "templates": {"tweet": "{emoji} {display_name}の{type}\\n\\n{url}\\n\\n{hashtag}"},
+      "max_concurrent": 2, "max_queue": 8
+    }
+  ]
+}
+"""
+
+import contextvars
+import hmac
+import json
+import os
+
+from . import admission, metrics
+
+
+TENANTS_PATH = os.environ.get('TENANTS_PATH', '')
+
+# 1 ならAPIキーかパスでテナントを指定しないリクエストを拒否する
+TENANT_REQUIRED = os.environ.get('TENANT_REQUIRED', '0') == '1'
+
+DEFAULT_TENANT_ID = 'default'
+
+# テナント設定で上書きできるテンプレート
+TEMPLATE_NAMES = ('tweet', 'pushover_title', 'pushover_message')
+
+_current = contextvars.ContextVar('tenant', default=None)
+
+
+class TenantError(Exception):
+    """テナントを特定できない（status: HTTPステータス）"""
+
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class Tenant:
+    """テナント1件分の設定"""
+
+    def __init__(self, tenant_id, notifiers, limiter, api_key='', path='', templates=None):
+        self.id = tenant_id
+        self.api_key = api_key
+        self.path = path
+        self.notifiers = notifiers    # 通知先の一覧
+        self.limiter = limiter        # admission.ConcurrencyLimiter（テナント専用レーン）
+        self.templates = templates or {}
+
+
+class TenantRegistry:
+    """APIキー・パスからテナントを O(1) で引く"""
+
+    def __init__(self, default, tenants=()):
+        self.default = default
+        self.tenants = {tenant.id: tenant for tenant in tenants}
+        self._by_key = {tenant.api_key: tenant for tenant in tenants if tenant.api_key}
+        self._by_path = {tenant.path: tenant for tenant in tenants if tenant.path}
+
+    def resolve(self, api_key='', path=None):
+        """リクエストのテナントを返す。見つからなければ TenantError"""
+        if path is not None:
+            tenant = self._by_path.get(path)
+            if tenant is None:
+                raise TenantError(404, 'Unknown tenant')
+            # APIキーのあるテナントは、パスを知っているだけでは使えない
+            if tenant.api_key and not hmac.compare_digest(api_key.encode('utf-8'), tenant.api_key.encode('utf-8')):
+                raise TenantError(401, 'Invalid API key' if api_key else 'API key required')
+            return tenant
+        if api_key:
+            tenant = self._by_key.get(api_key)
+            if tenant is None:
+                raise TenantError(401, 'Invalid API key')
+            return tenant
+        if TENANT_REQUIRED and self.tenants:
+            raise TenantError(401, 'API key required')
+        return self.default
+
+    def lanes(self):
+        """テナントごとのレーンの状態"""
+        lanes = {self.default.id: self.default.limiter.snapshot()}
+        for tenant in self.tenants.values():
+            lanes[tenant.id] = tenant.limiter.snapshot()
+        return lanes
+
+
+def load_registry(default, build_notifiers, path=TENANTS_PATH):
+    """設定ファイルからレジストリを作る（不正な設定は起動時に ValueError）
+
+    build_notifiers(config) はテナント設定から通知先の一覧を作る関数
+    """
+    if not path:
+        return TenantRegistry(default)
+
+    with open(path, encoding='utf-8') as f:
+        configs = json.load(f).get('tenants', [])
+
+    tenants = []
+    seen = {'id': {DEFAULT_TENANT_ID}, 'api_key': set(), 'path': set()}
+    for config in configs:
+        tenant_id = str(config.get('id', '')).strip()
+        if not tenant_id:
+            raise ValueError('Tenant without id')
+        for field in ('id', 'api_key', 'path'):
+            value = tenant_id if field == 'id' else config.get(field, '')
+            if value and value in seen[field]:
+                raise ValueError(f'Duplicate tenant {field}: {tenant_id}')
+            seen[field].add(value)
+        if not config.get('api_key') and not config.get('path'):
+            raise ValueError(f'Tenant {tenant_id} needs api_key or path')
+
+        templates = config.get('templates', {})
+        _validate_templates(tenant_id, templates)
+
+        tenants.append(Tenant(
+            tenant_id,
+            notifiers=build_notifiers(config),
+            limiter=admission.ConcurrencyLimiter(
+                int(config.get('max_concurrent', admission.ADMISSION_MAX_CONCURRENT)),
+                int(config.get('max_queue', admission.ADMISSION_MAX_QUEUE)),
+                float(config.get('max_queue_seconds', admission.ADMISSION_MAX_QUEUE_SECONDS)),
+            ),
+            api_key=config.get('api_key', ''),
+            path=config.get('path', ''),
+            templates=templates,
+        ))
+
+    print(f"✓ Loaded {len(tenants)} tenants from {path}")
+    return TenantRegistry(default, tenants)
+
+
+def _validate_templates(tenant_id, templates):
+    """未知のテンプレート名や使えないフィールドを起動時に検出"""
+    from templates.engine import compile_template
+
+    for name, template in templates.items():
+        if name not in TEMPLATE_NAMES:
+            raise ValueError(f'Unknown template for tenant {tenant_id}: {name}')
+        compile_template(template, f'tenants.{tenant_id}.{name}')
+
+
+def activate(tenant):
+    """現在のコンテキストのテナントを設定し、メトリクスにテナントのラベルを付ける"""
+    return _current.set(tenant), metrics.set_labels(tenant=tenant.id)
+
+
+def deactivate(tokens):
+    tenant_token, labels_token = tokens
+    metrics.reset_labels(labels_token)
+    _current.reset(tenant_token)
+
+
+def current():
+    """現在のテナント（未設定なら None）"""
+    return _current.get()
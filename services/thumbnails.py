@@ -0,0 +1,217 @@
+"""
+サムネイル画像の取得とキャッシュ
+og:image をストリーミングで取得し（バイト数上限付き）、Pushoverの添付サイズ上限に収まるよう
+縮小・JPEG再エンコードして通知に添付する
+
+ディスクキャッシュ:
+  blobs/<sha256>.jpg : 変換済み画像（内容のハッシュで保存するので同じ画像は1つだけ）
+  refs/<sha256(投稿URL)> : 投稿URL → blob のハッシュ
+合計サイズが上限を超えたら、最終アクセス（mtime）が古いblobから削除する
+"""
+
+import hashlib
+import io
+import os
+import threading
+
+from . import http_client, metrics
+
+try:
+    from PIL import Image
+except ImportError:  # Pillowがない場合は縮小せず、上限内の画像だけそのまま添付する
+    Image = None
+
+
+THUMBNAIL_ENABLED = os.environ.get('THUMBNAIL_ENABLED', '1') == '1'
+THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR', 'thumbnails')
+THUMBNAIL_CACHE_MAX_MB = float(os.environ.get('THUMBNAIL_CACHE_MAX_MB', '50'))
+THUMBNAIL_MAX_DIMENSION = int(os.environ.get('THUMBNAIL_MAX_DIMENSION', '640'))
+
+# ダウンロードを打ち切るサイズ（元画像）
+THUMBNAIL_MAX_DOWNLOAD_BYTES = int(os.environ.get('THUMBNAIL_MAX_DOWNLOAD_BYTES', str(8 * 1024 * 1024)))
+
+# デコードする元画像の画素数の上限（小さいファイルで巨大な画像になる展開爆弾はデコード前に捨てる）
+THUMBNAIL_MAX_PIXELS = int(os.environ.get('THUMBNAIL_MAX_PIXELS', str(40_000_000)))
+
+# 取得に使える時間（秒、リクエストのデッドラインの残りの方が短ければそちら）
+THUMBNAIL_TIMEOUT_SECONDS = float(os.environ.get('THUMBNAIL_TIMEOUT_SECONDS', '5'))
+
+# Pushoverの添付ファイル上限
+PUSHOVER_ATTACHMENT_LIMIT = 2_500_000
+
+JPEG_QUALITIES = (85, 75, 60, 45)
+CHUNK_SIZE = 64 * 1024
+
+if Image is not None:
+    # 上限を超える画像は Image.open の時点で拒否させる（既定の警告だけでは止まらない）
+    Image.MAX_IMAGE_PIXELS = THUMBNAIL_MAX_PIXELS
+
+_lock = threading.Lock()
+
+
+class Attachment:
+    """通知に添付する画像"""
+
+    def __init__(self, filename, content, mime_type='image/jpeg'):
+        self.filename = filename
+        self.content = content
+        self.mime_type = mime_type
+
+
+def get_thumbnail(post_url, image_url):
+    """投稿のサムネイルを返す（キャッシュ優先・失敗時は None）"""
+    if not THUMBNAIL_ENABLED or not image_url:
+        return None
+
+    ref_key = hashlib.sha256(post_url.encode('utf-8')).hexdigest()
+    content = _read_cached(ref_key)
+    if content is not None:
+        metrics.increment('thumbnail_cache', result='hit')
+        return Attachment(f'{ref_key[:16]}.jpg', content)
+    metrics.increment('thumbnail_cache', result='miss')
+
+    # 通知の前に同期で取得するので、リクエストのデッドラインの残りを超えて待たない
+    budget = THUMBNAIL_TIMEOUT_SECONDS
+    remaining = http_client.remaining_time()
+    if remaining is not None:
+        budget = min(budget, remaining)
+    deadline_token = http_client.set_deadline(budget)
+    try:
+        original = _download(image_url)
+        content = _encode(original) if original else None
+    except Exception as e:
+        print(f"Thumbnail fetch failed: {e}")
+        content = None
+    finally:
+        http_client.reset_deadline(deadline_token)
+
+    if not content:
+        metrics.increment('thumbnail_failures')
+        return None
+
+    _write_cached(ref_key, content)
+    print(f"✓ Thumbnail ready: {len(content)} bytes")
+    return Attachment(f'{ref_key[:16]}.jpg', content)
+
+
+def _download(image_url):
+    """画像をストリーミングで取得（上限を超えたら打ち切って None）"""
+    response = http_client.get(image_url, stream=True, timeout=10)
+    try:
+        if response.status_code != 200:
+            return None
+        if not response.headers.get('Content-Type', 'image/').startswith('image/'):
+            return None
+        declared = int(response.headers.get('Content-Length') or 0)
+        if declared > THUMBNAIL_MAX_DOWNLOAD_BYTES:
+            print(f"⚠ Thumbnail too large ({declared} bytes), skipped")
+            return None
+
+        buffer = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > THUMBNAIL_MAX_DOWNLOAD_BYTES:
+                print(f"⚠ Thumbnail exceeded {THUMBNAIL_MAX_DOWNLOAD_BYTES} bytes, aborted")
+                return None
+            # 少しずつ届く応答でもデッドラインで打ち切る（タイムアウトは1回の読み込みごとなので）
+            remaining = http_client.remaining_time()
+            if remaining is not None and remaining <= 0:
+                print("⚠ Thumbnail download exceeded its deadline, aborted")
+                metrics.increment('thumbnail_timeouts')
+                return None
+        return bytes(buffer)
+    finally:
+        response.close()
+
+
+def _encode(original):
+    """縮小してJPEGに再エンコード（添付上限に収まるまで画質を下げる）"""
+    if Image is None:
+        return original if len(original) <= PUSHOVER_ATTACHMENT_LIMIT else None
+
+    # Image.open はヘッダーだけを読むので、画素データを展開する前に寸法を確認できる
+    with Image.open(io.BytesIO(original)) as image:
+        if image.width * image.height > THUMBNAIL_MAX_PIXELS:
+            print(f"⚠ Thumbnail too large ({image.width}x{image.height}), skipped")
+            return None
+        image.thumbnail((THUMBNAIL_MAX_DIMENSION, THUMBNAIL_MAX_DIMENSION))
+        image = image.convert('RGB')
+        for quality in JPEG_QUALITIES:
+            out = io.BytesIO()
+            image.save(out, format='JPEG', quality=quality, optimize=True)
+            if out.tell() <= PUSHOVER_ATTACHMENT_LIMIT:
+                return out.getvalue()
+    return None
+
+
+# ===== ディスクキャッシュ =====
+
+def _paths(ref_key, digest=None):
+    ref_path = os.path.join(THUMBNAIL_CACHE_DIR, 'refs', ref_key)
+    blob_path = os.path.join(THUMBNAIL_CACHE_DIR, 'blobs', f'{digest}.jpg') if digest else None
+    return ref_path, blob_path
+
+
+def _read_cached(ref_key):
+    ref_path, _ = _paths(ref_key)
+    try:
+        with open(ref_path, encoding='ascii') as f:
+            digest = f.read().strip()
+        _, blob_path = _paths(ref_key, digest)
+        with open(blob_path, 'rb') as f:
+            content = f.read()
+        # 最終アクセスを更新（LRU）
+        os.utime(blob_path)
+        return content
+    except OSError:
+        return None
+
+
+def _write_cached(ref_key, content):
+    digest = hashlib.sha256(content).hexdigest()
+    ref_path, blob_path = _paths(ref_key, digest)
+    try:
+        with _lock:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+            if not os.path.exists(blob_path):
+                _atomic_write(blob_path, content)
+            else:
+                os.utime(blob_path)
+            _atomic_write(ref_path, digest.encode('ascii'))
+            _evict()
+    except OSError as e:
+        print(f"Thumbnail cache write failed: {e}")
+
+
+def _atomic_write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _evict():
+    """合計サイズが上限を超えていれば古いblobから削除（参照切れのrefは読み込み時にミス扱い）"""
+    blob_dir = os.path.join(THUMBNAIL_CACHE_DIR, 'blobs')
+    entries = []
+    total = 0
+    with os.scandir(blob_dir) as it:
+        for entry in it:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    limit = THUMBNAIL_CACHE_MAX_MB * 1024 * 1024
+    if total <= limit:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        metrics.increment('thumbnail_evictions')
+        if total <= limit:
+            break
@@ -3,14 +3,34 @@ TikTok情報抽出サービス
 """
 
 import re
-import requests
-from bs4 import BeautifulSoup
-from . import SocialMediaInfo
+from . import SocialMediaInfo, http_client, memory, metrics, tracing, upstreams
+from .cache import get_cache
 from .common import clean_url
+from .parsing import find_script_json, parse_meta
 
 
-def extract_tiktok_info(url, provided_username='', provided_caption=''):
-    """TikTok URLから投稿情報を取得"""
+# 取得に失敗した結果をキャッシュする秒数
+NEGATIVE_CACHE_TTL = 300
+
+# ページに埋め込まれた投稿データのscript要素のID（新しい形式から探す）
+EMBEDDED_STATE_IDS = ('__UNIVERSAL_DATA_FOR_REHYDRATION__', 'SIGI_STATE')
+
+# ページをストリーミングで読むときのチャンクサイズ
+CHUNK_SIZE = 64 * 1024
+
+# OGタグの本文に付く定型文（本文ではない）
+UNWANTED_PHRASES = [
+    'Watch more videos',
+    'Download the app',
+    'TikTok video from',
+]
+
+
+def extract_tiktok_info(url, provided_username='', provided_caption='', fetch_remote=True):
+    """TikTok URLから投稿情報を取得
+
+    fetch_remote=False の場合は通信せず（短縮URLも展開しない）、URLから分かる情報だけで組み立てる
+    """
     
     info = SocialMediaInfo()
     info.platform = 'tiktok'
@@ -20,12 +40,14 @@ def extract_tiktok_info(url, provided_username='', provided_caption=''):
     
     try:
         # 短縮URLの場合は展開
-        if 'vt.tiktok.com' in url or 'vm.tiktok.com' in url:
+        if fetch_remote and ('vt.tiktok.com' in url or 'vm.tiktok.com' in url):
             print(f"Expanding short URL: {url}")
-            expanded_url = _expand_short_url(url)
+            expanded_url = _cached_expand_short_url(url)
             if expanded_url:
                 url = expanded_url
                 print(f"✓ Expanded to: {url}")
+            elif not upstreams.available('tiktok'):
+                info.upstream_skipped = True
         
         # URLを正規化
         info.url = clean_url(url)
@@ -46,12 +68,24 @@ def extract_tiktok_info(url, provided_username='', provided_caption=''):
             info.post_code = video_match.group(1)
             print(f"✓ Extracted video ID: {info.post_code}")
         
+        # 投稿者・本文をoEmbed（失敗時はHTML）から取得（ワーカー間で共有キャッシュ）
+        metadata = {}
+        if fetch_remote and (not provided_caption or not (provided_username or username)):
+            metadata = _cached_metadata(info.url)
+            info.upstream_skipped = info.upstream_skipped or bool(metadata.get('skipped'))
+        
+        if not info.post_code and metadata.get('video_id'):
+            info.post_code = metadata['video_id']
+        
         # 提供されたユーザー名を優先
         if provided_username:
             info.username = provided_username.lstrip('@')
             print(f"✓ Using provided username: {info.username}")
         elif username:
             info.username = username
+        elif metadata.get('username'):
+            info.username = metadata['username']
+            print(f"✓ Extracted username from metadata: {info.username}")
         else:
             info.username = 'TikTok'
             print(f"⚠ Using fallback username: TikTok")
@@ -61,12 +95,13 @@ def extract_tiktok_info(url, provided_username='', provided_caption=''):
             info.description = provided_caption
             print(f"✓ Using provided caption: {provided_caption[:100]}")
         else:
-            # OGタグから取得を試みる
-            description = _fetch_og_description(info.url)
+            description = metadata.get('description', '')
+            info.image_url = metadata.get('image_url', '')
             if description:
                 info.description = description
             else:
                 info.description = f'{info.username}さんのTikTok動画をチェック！'
+                info.description_fallback = True
         
         # ハッシュタグを生成
         if info.username == 'TikTok':
@@ -89,23 +124,94 @@ def extract_tiktok_info(url, provided_username='', provided_caption=''):
         info.url = clean_url(url)
         info.username = provided_username.lstrip('@') if provided_username else 'TikTok'
         info.description = provided_caption or 'TikTok動画をチェック！'
+        info.description_fallback = not provided_caption
         info.hashtag = '#TikTok'
         
         return info
 
 
+def _cached_expand_short_url(short_url):
+    """キャッシュ経由で短縮URLを展開"""
+    with tracing.span('expand_short_url', platform='tiktok') as span:
+        cache = get_cache()
+        cache_key = f'expand:tiktok:{short_url}'
+        cached = cache.get(cache_key)
+        span.set('cached', bool(cached))
+        if cached:
+            return cached
+        if not upstreams.available('tiktok'):
+            metrics.increment('upstream_skipped', upstream='tiktok')
+            return None
+        
+        expanded_url = _expand_short_url(short_url)
+        span.set('expanded', bool(expanded_url))
+        if expanded_url:
+            cache.set(cache_key, expanded_url)
+        return expanded_url
+
+
+def _cached_metadata(url):
+    """キャッシュ経由で投稿者・本文を取得（取得失敗も短時間キャッシュする）"""
+    cache = get_cache()
+    cache_key = f'meta:tiktok:{url}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"✓ Using cached metadata: {url}")
+        return cached
+    
+    if not upstreams.available('tiktok'):
+        # 落ちている間は待たずにフォールバック（キャッシュもしない）
+        print("⚠ TikTok is down, skipping metadata fetch")
+        metrics.increment('upstream_skipped', upstream='tiktok')
+        return {'skipped': True}
+    
+    metadata = _fetch_oembed(url)
+    if not metadata.get('description'):
+        # oEmbedで本文が取れない場合だけ重いHTMLページを取得し、足りない項目を埋める
+        for key, value in _fetch_page_metadata(url).items():
+            if not metadata.get(key):
+                metadata[key] = value
+        metadata.setdefault('description', '')
+    cache.set(cache_key, metadata, None if metadata['description'] else NEGATIVE_CACHE_TTL)
+    return metadata
+
+
+def _fetch_oembed(url):
+    """TikTok oEmbed APIから投稿者と本文を取得（数百バイトのJSON）"""
+    try:
+        response = http_client.get('https://www.tiktok.com/oembed', params={'url': url}, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            metadata = {
+                'username': data.get('author_unique_id', ''),
+                'description': (data.get('title') or '').strip(),
+                'image_url': data.get('thumbnail_url', ''),
+            }
+            if metadata['description']:
+                print(f"✓ Extracted description from oEmbed: {metadata['description'][:100]}")
+            return metadata
+    except Exception as e:
+        print(f"TikTok oEmbed failed: {e}")
+    
+    return {}
+
+
 def _expand_short_url(short_url):
     """TikTok短縮URLを展開"""
     try:
-        response = requests.head(short_url, allow_redirects=True, timeout=10)
+        response = http_client.head(short_url, allow_redirects=True, timeout=10)
         return response.url
     except Exception as e:
         print(f"Failed to expand short URL: {e}")
         return None
 
 
-def _fetch_og_description(url):
-    """OGタグから説明文を取得（ベストエフォート）"""
+def _fetch_page_metadata(url):
+    """HTMLページから投稿者・本文を取得（ベストエフォート）
+
+    ページに埋め込まれた投稿データのJSONだけをストリーミングで探して読み（見つかったら残りは読まない）、
+    取れなかった項目はそれまでに読んだ部分のOGタグで補う
+    """
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -113,31 +219,69 @@ def _fetch_og_description(url):
             'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
         }
         
-        response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
+        with memory.track('scrape'):
+            response = http_client.get(url, headers=headers, timeout=15, allow_redirects=True, stream=True)
+            try:
+                if response.status_code != 200:
+                    return {}
+                element_id, state, html = find_script_json(response.iter_content(CHUNK_SIZE), EMBEDDED_STATE_IDS)
+            finally:
+                response.close()
         
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # OGタグから取得
-            og_description = soup.find('meta', property='og:description')
-            if og_description and 'content' in og_description.attrs:
-                desc_text = og_description['content']
-                
-                # TikTokの説明文をクリーニング
-                # 不要な文字列を削除
-                unwanted_phrases = [
-                    'Watch more videos',
-                    'Download the app',
-                    'TikTok video from',
-                ]
-                for phrase in unwanted_phrases:
-                    if phrase in desc_text:
-                        desc_text = desc_text.split(phrase)[0].strip()
-                
-                if desc_text:
-                    print(f"✓ Extracted description from OG tag: {desc_text[:100]}")
-                    return desc_text
+        metadata = metadata_from_state(state) if state is not None else {}
+        if metadata.get('description') and metadata.get('username'):
+            print(f"✓ Extracted description from {element_id}: {metadata['description'][:100]}")
+            return metadata
+        
+        # 埋め込みJSONがない・足りない場合はOGタグから（大きなページはプロセスプールで解析）
+        with memory.track('parse'):
+            meta = parse_meta(bytes(html))
+        og = metadata_from_meta(meta)
+        for key, value in og.items():
+            if not metadata.get(key):
+                metadata[key] = value
+        if metadata.get('description'):
+            print(f"✓ Extracted description from OG tag: {metadata['description'][:100]}")
+        return metadata
     except Exception as e:
         print(f"HTML fetch failed: {e}")
     
-    return ''
+    return {}
+
+
+def metadata_from_state(state):
+    """埋め込みJSONから投稿者・本文・サムネイル・動画ID・統計を取り出す
+
+    __UNIVERSAL_DATA_FOR_REHYDRATION__（__DEFAULT_SCOPE__ → webapp.video-detail）と
+    旧形式の SIGI_STATE（ItemModule）の両方に対応する
+    """
+    if not isinstance(state, dict):
+        return {}
+    scope = state.get('__DEFAULT_SCOPE__') or {}
+    item = ((scope.get('webapp.video-detail') or {}).get('itemInfo') or {}).get('itemStruct')
+    if item is None:
+        items = state.get('ItemModule') or {}
+        item = next(iter(items.values()), None) if isinstance(items, dict) else None
+    if not isinstance(item, dict):
+        return {}
+    
+    author = item.get('author')
+    video = item.get('video') or {}
+    stats = item.get('stats') or {}
+    return {
+        'username': (author.get('uniqueId', '') if isinstance(author, dict) else author or '').lstrip('@'),
+        'description': (item.get('desc') or '').strip(),
+        'image_url': video.get('cover') or video.get('originCover') or '',
+        'video_id': str(item.get('id') or ''),
+        'stats': {key: stats[key] for key in ('playCount', 'diggCount', 'commentCount', 'shareCount') if key in stats},
+    }
+
+
+def metadata_from_meta(meta):
+    """parse_meta の結果（OGタグ）から本文とサムネイルを取り出す"""
+    desc_text = meta.get('og:description') or ''
+    # TikTokの説明文から不要な文字列を削除
+    for phrase in UNWANTED_PHRASES:
+        if phrase in desc_text:
+            desc_text = desc_text.split(phrase)[0].strip()
+    return {'description': desc_text.strip(), 'image_url': meta.get('og:image', '')}
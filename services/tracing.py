@@ -0,0 +1,303 @@
+"""
+トレース（スパン）
+webhook の各ステージ（ペイロード解析、プラットフォーム判定、短縮URL展開、上流取得、HTML解析、
+テンプレート、通知）をスパンとして記録し、どのリクエスト・どの上流呼び出しが遅かったかを追えるようにする
+
+スパンはバックグラウンドスレッドでまとめて書き出す（リクエスト処理は待たせない）。
+- TRACE_EXPORT=jsonl : TRACE_JSONL_PATH に1行1スパンで追記
+- TRACE_EXPORT=otlp  : TRACE_OTLP_ENDPOINT（OTLP/HTTP JSON 互換のコレクター）へPOST
+W3C の traceparent ヘッダーを受け取った場合は、そのトレースの子として記録する
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+
+import requests
+
+from . import metrics
+
+
+TRACE_EXPORT = os.environ.get('TRACE_EXPORT', '')           # '' / jsonl / otlp
+TRACE_JSONL_PATH = os.environ.get('TRACE_JSONL_PATH', 'traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.environ.get('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'social-share-webhook')
+
+# まとめ書きの件数と間隔、キューの上限（超えた分は捨てる）
+BATCH_SIZE = 256
+EXPORT_INTERVAL = 2.0
+MAX_QUEUE = 4096
+
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+class SpanContext:
+    """トレースIDとスパンID（親の指定や traceparent の受け渡しに使う）"""
+
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+
+class Span:
+    """記録中のスパン"""
+
+    def __init__(self, name, parent, kind, attributes):
+        self.name = name
+        self.kind = kind
+        self.context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, key, value):
+        """属性を追加（None は無視）"""
+        if value is not None:
+            self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            'trace_id': self.context.trace_id,
+            'span_id': self.context.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    """トレース無効時のスパン（何もしない）"""
+
+    context = None
+
+    def set(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+# ===== エクスポーター =====
+
+class JsonlExporter:
+    """ローカルのJSONLファイルに1行1スパンで追記"""
+
+    def __init__(self, path=TRACE_JSONL_PATH):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False) + '\n')
+
+
+class OtlpExporter:
+    """OTLP/HTTP（JSONエンコード）互換のコレクターへ送信
+
+    http_client を通すとスパンの送信自体がスパンになるため、requests を直接使う。
+    """
+
+    KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+    def __init__(self, endpoint=TRACE_OTLP_ENDPOINT, service_name=TRACE_SERVICE_NAME, timeout=5):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({'service.name': self.service_name})},
+                'scopeSpans': [{
+                    'scope': {'name': 'services.tracing'},
+                    'spans': [self._encode(span) for span in spans],
+                }],
+            }],
+        }
+        response = requests.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+    def _encode(self, span):
+        encoded = {
+            'traceId': span['trace_id'],
+            'spanId': span['span_id'],
+            'name': span['name'],
+            'kind': self.KINDS.get(span['kind'], 1),
+            'startTimeUnixNano': str(span['start_ns']),
+            'endTimeUnixNano': str(span['end_ns']),
+            'attributes': _otlp_attributes(span['attributes']),
+            'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1},
+        }
+        if span['parent_id']:
+            encoded['parentSpanId'] = span['parent_id']
+        return encoded
+
+
+def _otlp_attributes(attributes):
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        encoded.append({'key': key, 'value': typed})
+    return encoded
+
+
+class BatchProcessor:
+    """終了したスパンをキューに積み、バックグラウンドでまとめて書き出す"""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._queue = queue.Queue(MAX_QUEUE)
+        self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+        self._thread.start()
+
+    def submit(self, span):
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            metrics.increment('trace_spans_dropped')
+
+    def flush(self, timeout=5.0):
+        """キューに残っている分を書き出し終えるまで待つ"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < BATCH_SIZE and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            spans = [item for item in batch if not isinstance(item, threading.Event)]
+            if spans:
+                try:
+                    self.exporter.export(spans)
+                    metrics.increment('trace_spans_exported', len(spans))
+                except Exception as e:
+                    print(f"Trace export failed: {e}")
+                    metrics.increment('trace_export_errors')
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+
+def create_exporter(kind=None):
+    """種類を指定してエクスポーターを生成"""
+    kind = (kind if kind is not None else TRACE_EXPORT).lower()
+    if kind == 'jsonl':
+        return JsonlExporter(TRACE_JSONL_PATH)
+    if kind == 'otlp':
+        return OtlpExporter(TRACE_OTLP_ENDPOINT)
+    if not kind:
+        return None
+    raise ValueError(f"Unknown trace exporter: {kind}")
+
+
+_processor = None
+
+
+def set_exporter(exporter):
+    """エクスポーターを差し替え（None でトレース無効、テストではローカルの代替に差し替える）"""
+    global _processor
+    if _processor is not None:
+        _processor.flush()
+    _processor = BatchProcessor(exporter) if exporter is not None else None
+
+
+def flush():
+    if _processor is not None:
+        _processor.flush()
+
+
+# ===== スパン =====
+
+def enabled():
+    return _processor is not None
+
+
+def parse_traceparent(value):
+    """traceparent ヘッダーから SpanContext を作る（不正な値は None）"""
+    match = _TRACEPARENT_RE.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2))
+
+
+def annotate(**attributes):
+    """現在のスパンに属性を追加（スパンがなければ何もしない）"""
+    span = _current.get()
+    if span is not None:
+        for key, value in attributes.items():
+            span.set(key, value)
+
+
+def current_context():
+    """現在のスパンの SpanContext（別スレッドで親として渡す用）"""
+    span = _current.get()
+    return span.context if span is not None else None
+
+
+@contextlib.contextmanager
+def span(name, parent=None, kind='internal', **attributes):
+    """スパンを記録するコンテキストマネージャ（parent 省略時は現在のスパンの子）"""
+    if _processor is None:
+        yield _NOOP
+        return
+
+    parent = parent or current_context()
+    current = Span(name, parent, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        processor = _processor
+        if processor is not None:
+            processor.submit(current)
+
+
+set_exporter(create_exporter())
+atexit.register(flush)
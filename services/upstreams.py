@@ -0,0 +1,192 @@
+"""
+上流のヘルスチェック
+バックグラウンドのスレッドが一定間隔で各上流（Instagram、Graph API の oEmbed、TikTok、YouTube、Pushover）に
+軽いリクエストを送り、状態とレイテンシをメモリに保持する
+
+/health はこの結果を返すだけなので通信しない。
+各サービスは available() を見て、落ちている上流への取得を省いてすぐフォールバックする
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+
+from . import http_client, metrics
+
+
+# 確認の間隔（秒、0で無効）と1回の確認のタイムアウト（秒）
+HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', '60'))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', '5'))
+
+# 連続してこの回数失敗したら down とみなす
+HEALTH_FAILURE_THRESHOLD = int(os.environ.get('HEALTH_FAILURE_THRESHOLD', '2'))
+
+# これより遅い応答は degraded
+HEALTH_SLOW_SECONDS = float(os.environ.get('HEALTH_SLOW_SECONDS', '2'))
+
+# 429 の Retry-After に従って確認を休む最大秒数
+HEALTH_MAX_RETRY_AFTER = 3600
+
+# 確認先（名前, メソッド, URL）。到達性だけを見るので、5xx 以外のステータスは正常とみなす
+# 429 はレート制限なので down にはせず throttled とし、Retry-After まで確認を休む
+PROBES = (
+    ('instagram', 'HEAD', 'https://www.instagram.com/'),
+    ('instagram_oembed', 'GET', 'https://graph.facebook.com/v12.0/instagram_oembed'),
+    ('tiktok', 'HEAD', 'https://www.tiktok.com/'),
+    ('youtube', 'HEAD', 'https://www.youtube.com/'),
+    ('pushover', 'HEAD', 'https://api.pushover.net/'),
+)
+
+USER_AGENT = 'social-share-webhook-health/1.0'
+
+
+class UpstreamStatus:
+    """上流1つ分の状態（確認のたびに新しいオブジェクトに置き換える）"""
+
+    __slots__ = ('name', 'state', 'latency_ms', 'http_status', 'checked_at', 'failures', 'error', 'retry_at')
+
+    def __init__(self, name, state='unknown', latency_ms=None, http_status=None, checked_at=None,
+                 failures=0, error=None, retry_at=None):
+        self.name = name
+        self.state = state              # unknown / up / degraded / throttled / down
+        self.latency_ms = latency_ms
+        self.http_status = http_status
+        self.checked_at = checked_at    # UNIXタイムスタンプ
+        self.failures = failures        # 連続失敗回数
+        self.error = error
+        self.retry_at = retry_at        # throttled のとき、次に確認してよい時刻（UNIXタイムスタンプ）
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'latency_ms': self.latency_ms,
+            'http_status': self.http_status,
+            'checked_at': self.checked_at,
+            'consecutive_failures': self.failures,
+            'error': self.error,
+            'retry_at': self.retry_at,
+        }
+
+
+class HealthProber:
+    """上流を定期的に確認し、最新の状態を保持する"""
+
+    def __init__(self, probes=PROBES, interval=HEALTH_PROBE_INTERVAL, timeout=HEALTH_PROBE_TIMEOUT,
+                 failure_threshold=HEALTH_FAILURE_THRESHOLD, slow_seconds=HEALTH_SLOW_SECONDS):
+        self.probes = probes
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.slow_seconds = slow_seconds
+        self._statuses = {name: UpstreamStatus(name) for name, _, _ in probes}
+        self._snapshot = self._build_snapshot()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """バックグラウンドの確認を開始（interval が0なら何もしない）"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        if http_client.get_transport() is not None:
+            # 記録・再生モードでは実際の上流に問い合わせない
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+                self._thread.start()
+                print(f"✓ Upstream health prober started (every {self.interval:g}s)")
+
+    def _run(self):
+        # 複数ワーカーが同時に確認しないよう、開始をずらす
+        time.sleep(random.uniform(0, min(self.interval, 5)))
+        while True:
+            self.probe_all()
+            # 落ちている上流があれば早めに確認し直す
+            down = any(status.state == 'down' for status in self._statuses.values())
+            time.sleep(max(5.0, self.interval / 4) if down else self.interval)
+
+    def probe_all(self):
+        """すべての上流を1回ずつ確認"""
+        now = time.time()
+        for name, method, url in self.probes:
+            previous = self._statuses[name]
+            if previous.retry_at and now < previous.retry_at:
+                continue    # レート制限中は Retry-After まで問い合わせない
+            self._statuses[name] = self._probe(previous, method, url)
+        self._snapshot = self._build_snapshot()
+
+    def _probe(self, previous, method, url):
+        started = time.perf_counter()
+        try:
+            response = requests.request(method, url, timeout=self.timeout, allow_redirects=False,
+                                        headers={'User-Agent': USER_AGENT})
+            response.close()
+        except requests.RequestException as e:
+            elapsed = time.perf_counter() - started
+            return self._failure(previous, elapsed, None, type(e).__name__)
+
+        elapsed = time.perf_counter() - started
+        metrics.observe('upstream_probe_seconds', elapsed, upstream=previous.name)
+        if response.status_code == 429:
+            return self._throttled(previous, elapsed, response)
+        if response.status_code >= 500:
+            return self._failure(previous, elapsed, response.status_code, f'HTTP {response.status_code}')
+
+        state = 'degraded' if elapsed > self.slow_seconds else 'up'
+        return UpstreamStatus(previous.name, state, round(elapsed * 1000, 1), response.status_code, time.time())
+
+    def _throttled(self, previous, elapsed, response):
+        """レート制限（到達はできているので down にはしない）"""
+        retry_after = http_client.parse_retry_after(response.headers.get('Retry-After'))
+        retry_at = time.time() + min(retry_after, HEALTH_MAX_RETRY_AFTER) if retry_after else None
+        if previous.state != 'throttled':
+            print(f"⚠ Upstream {previous.name} is rate limiting health checks (Retry-After: {retry_after})")
+        metrics.increment('upstream_probe_throttled', upstream=previous.name)
+        return UpstreamStatus(previous.name, 'throttled', round(elapsed * 1000, 1), 429, time.time(),
+                              error='HTTP 429', retry_at=retry_at)
+
+    def _failure(self, previous, elapsed, http_status, error):
+        failures = previous.failures + 1
+        state = 'down' if failures >= self.failure_threshold else 'degraded'
+        if state == 'down' and previous.state != 'down':
+            print(f"⚠ Upstream {previous.name} is down: {error}")
+        metrics.increment('upstream_probe_failures', upstream=previous.name)
+        return UpstreamStatus(previous.name, state, round(elapsed * 1000, 1), http_status, time.time(),
+                              failures, error)
+
+    def _build_snapshot(self):
+        upstreams = {name: status.to_dict() for name, status in self._statuses.items()}
+        states = {status['state'] for status in upstreams.values()}
+        if states & {'down', 'degraded', 'throttled'}:
+            overall = 'down' if 'down' in states else 'degraded'
+        else:
+            overall = 'up' if 'up' in states else 'unknown'
+        return {'status': overall, 'upstreams': upstreams}
+
+    def snapshot(self):
+        """最新の確認結果（通信しない）"""
+        return self._snapshot
+
+    def available(self, name):
+        """上流が使えそうか（未確認・未登録なら True。down のときだけ False）"""
+        status = self._statuses.get(name)
+        return status is None or status.state != 'down'
+
+
+prober = HealthProber()
+
+
+def start():
+    """HEALTH_PROBE_INTERVAL > 0 ならバックグラウンドの確認を開始"""
+    prober.start()
+
+
+def available(name):
+    return prober.available(name)
+
+
+def snapshot():
+    return prober.snapshot()
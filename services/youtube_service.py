@@ -0,0 +1,187 @@
+"""
+YouTube情報抽出サービス
+"""
+
+import re
+from urllib.parse import urlsplit, parse_qs
+from . import SocialMediaInfo, http_client, memory, metrics, upstreams
+from .cache import get_cache
+from .common import create_hashtag
+from .parsing import parse_meta
+
+
+# 取得に失敗した結果をキャッシュする秒数
+NEGATIVE_CACHE_TTL = 300
+
+
+def extract_youtube_info(url, provided_username='', provided_caption='', fetch_remote=True):
+    """YouTube URLから投稿情報を取得（watch / shorts / youtu.be）
+
+    fetch_remote=False の場合は通信せず、URLから分かる情報だけで組み立てる
+    """
+
+    info = SocialMediaInfo()
+    info.platform = 'youtube'
+    info.is_video = True
+    info.emoji = '▶️'
+
+    try:
+        # 動画IDを抽出してURLを正規化（watch の v パラメータは残す）
+        video_id, is_short = _parse_video_id(url)
+        if not video_id:
+            raise ValueError(f"Could not find YouTube video ID: {url}")
+
+        info.post_code = video_id
+        info.type = 'ショート' if is_short else '動画'
+        if is_short:
+            info.url = f'https://www.youtube.com/shorts/{video_id}'
+        else:
+            info.url = f'https://www.youtube.com/watch?v={video_id}'
+
+        print(f"Processing YouTube URL: {info.url}")
+
+        # 投稿者・タイトルをoEmbed（失敗時はHTML）から取得（ワーカー間で共有キャッシュ）
+        metadata = {}
+        if fetch_remote and (not provided_username or not provided_caption):
+            metadata = _cached_metadata(info.url)
+            info.upstream_skipped = bool(metadata.get('skipped'))
+
+        # 提供されたユーザー名を優先
+        if provided_username:
+            info.username = provided_username.lstrip('@')
+            print(f"✓ Using provided username: {info.username}")
+        elif metadata.get('username'):
+            info.username = metadata['username']
+            print(f"✓ Extracted username from metadata: {info.username}")
+        else:
+            info.username = 'YouTube'
+            print(f"⚠ Using fallback username: YouTube")
+
+        # 提供された投稿本文を優先
+        if provided_caption:
+            info.description = provided_caption
+            print(f"✓ Using provided caption: {provided_caption[:100]}")
+        elif metadata.get('description'):
+            info.description = metadata['description']
+        else:
+            info.description = f'{info.username}さんのYouTube{info.type}をチェック！'
+            info.description_fallback = True
+
+        info.image_url = metadata.get('image_url', '')
+
+        info.hashtag = create_hashtag(info.username, info.platform)
+
+        print(f"✓ Final username: {info.username}")
+        print(f"✓ Final description: {info.description[:100]}")
+
+        return info
+
+    except Exception as e:
+        print(f"Error extracting YouTube info: {e}")
+        import traceback
+        traceback.print_exc()
+
+        # フォールバック
+        info.url = info.url or url.split('#')[0]
+        info.type = info.type or '動画'
+        info.username = provided_username.lstrip('@') if provided_username else 'YouTube'
+        info.description = provided_caption or 'YouTube動画をチェック！'
+        info.description_fallback = not provided_caption
+        info.hashtag = '#YouTube'
+
+        return info
+
+
+def _parse_video_id(url):
+    """URLから (動画ID, ショートかどうか) を取得"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+
+    if host.endswith('youtu.be'):
+        video_id = parts.path.strip('/').split('/')[0]
+        return video_id, False
+
+    shorts_match = re.match(r'/(shorts|live|embed)/([A-Za-z0-9_-]+)', parts.path)
+    if shorts_match:
+        return shorts_match.group(2), shorts_match.group(1) == 'shorts'
+
+    video_ids = parse_qs(parts.query).get('v')
+    if video_ids:
+        return video_ids[0], False
+
+    return '', False
+
+
+def _cached_metadata(url):
+    """キャッシュ経由で投稿者・タイトルを取得（取得失敗も短時間キャッシュする）"""
+    cache = get_cache()
+    cache_key = f'meta:youtube:{url}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"✓ Using cached metadata: {url}")
+        return cached
+
+    if not upstreams.available('youtube'):
+        # 落ちている間は待たずにフォールバック（キャッシュもしない）
+        print("⚠ YouTube is down, skipping metadata fetch")
+        metrics.increment('upstream_skipped', upstream='youtube')
+        return {'skipped': True}
+
+    metadata = _fetch_oembed(url)
+    if not metadata.get('description'):
+        # oEmbedで取れない場合だけ重いHTMLページを取得
+        metadata = _fetch_og_metadata(url)
+    cache.set(cache_key, metadata, None if metadata.get('description') else NEGATIVE_CACHE_TTL)
+    return metadata
+
+
+def _fetch_oembed(url):
+    """YouTube oEmbed APIから投稿者とタイトルを取得"""
+    try:
+        response = http_client.get(
+            'https://www.youtube.com/oembed',
+            params={'url': url, 'format': 'json'},
+            timeout=10
+        )
+        if response.status_code == 200:
+            data = response.json()
+            # author_url が https://www.youtube.com/@handle ならハンドルを使う
+            author_url = data.get('author_url', '')
+            handle_match = re.search(r'/@([^/?]+)', author_url)
+            metadata = {
+                'username': handle_match.group(1) if handle_match else data.get('author_name', ''),
+                'description': (data.get('title') or '').strip(),
+                'image_url': data.get('thumbnail_url', ''),
+            }
+            if metadata['description']:
+                print(f"✓ Extracted title from oEmbed: {metadata['description'][:100]}")
+            return metadata
+    except Exception as e:
+        print(f"YouTube oEmbed failed: {e}")
+
+    return {}
+
+
+def _fetch_og_metadata(url):
+    """OGタグからタイトルを取得（ベストエフォート）"""
+    try:
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+        }
+
+        with memory.track('scrape'):
+            response = http_client.get(url, headers=headers, timeout=15, allow_redirects=True)
+
+        if response.status_code == 200:
+            with memory.track('parse'):
+                meta = parse_meta(response.content)
+
+            title = meta.get('og:title') or meta.get('title', '')
+            if title:
+                print(f"✓ Extracted title from OG tag: {title[:100]}")
+                return {'username': '', 'description': title, 'image_url': meta.get('og:image', '')}
+    except Exception as e:
+        print(f"HTML fetch failed: {e}")
+
+    return {}
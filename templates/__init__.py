@@ -2,7 +2,15 @@
 投稿テンプレート生成モジュール
 """
 
-from services.common import shorten_text
+import html
+from functools import lru_cache
+
+from services.common import platform_name, shorten_text
+from .engine import compile_template
+
+
+# Pushoverのメッセージ本文の上限（文字数）
+PUSHOVER_MESSAGE_LIMIT = 1024
 
 
 def create_tweet_text(info):
@@ -15,7 +23,7 @@ def create_tweet_text(info):
     display_name = _get_display_name(info)
     
     # テンプレート適用
-    if description and description not in ['Instagram投稿をチェック！', 'TikTok動画をチェック！']:
+    if description and not info.description_fallback:
         tweet_text = f"{info.emoji} {display_name}の{info.type}\n\n{description}\n\n{info.url}\n\n{info.hashtag}"
     else:
         tweet_text = f"{info.emoji} {display_name}の{info.type}\n\n{info.url}\n\n{info.hashtag}"
@@ -23,7 +31,7 @@ def create_tweet_text(info):
     return tweet_text
 
 
-def create_pushover_message(info):
+def create_pushover_message(info, max_description=200, call_to_action=True):
     """SNS投稿情報からPushover通知メッセージを生成"""
     
     # プラットフォーム別の表示名
@@ -36,7 +44,7 @@ def create_pushover_message(info):
     
     # 本文がある場合は追加（最大200文字）
     if info.description:
-        desc = shorten_text(info.description, 200)
+        desc = shorten_text(info.description, max_description)
         message_parts.append(f"\n📝 {desc}")
     
     # URLを追加
@@ -45,15 +53,69 @@ def create_pushover_message(info):
     # ハッシュタグを追加
     message_parts.append(f"\n\n{info.hashtag}")
     
-    message_parts.append("\n\n👇 タップしてXに投稿")
+    if call_to_action:
+        message_parts.append("\n\n👇 タップしてXに投稿")
     
     return ''.join(message_parts)
 
 
 def create_pushover_title(info):
     """Pushover通知のタイトルを生成"""
-    platform_name = info.platform.title()
-    return f'{info.emoji} {platform_name} {info.type}を共有'
+    return f'{info.emoji} {platform_name(info.platform)} {info.type}を共有'
+
+
+def create_pushover_digest(entries, limit=PUSHOVER_MESSAGE_LIMIT):
+    """複数の共有をまとめたPushover通知（HTML本文）を生成
+
+    entries: [(SocialMediaInfo, X投稿リンク)]
+    戻り値: ([(タイトル, 本文, まとめた entries の添字)], 1件でも上限を超える entries の添字)
+    本文が上限を超える場合だけ複数の通知に分割する
+    """
+    groups = []
+    oversized = []
+    current = []
+    length = 0
+    for index, (info, link) in enumerate(entries):
+        text = html.escape(create_pushover_message(info, max_description=60, call_to_action=False))
+        block = f'{text}\n<a href="{html.escape(link)}">👉 Xに投稿する</a>'
+        if len(block) > limit:
+            oversized.append(index)
+            continue
+        separator = 2 if current else 0
+        if current and length + separator + len(block) > limit:
+            groups.append(current)
+            current, length, separator = [], 0, 0
+        current.append((index, block))
+        length += separator + len(block)
+    if current:
+        groups.append(current)
+
+    digests = []
+    for number, group in enumerate(groups, 1):
+        indexes = [index for index, _ in group]
+        title = create_pushover_digest_title([entries[i][0] for i in indexes])
+        if len(groups) > 1:
+            title = f'{title} {number}/{len(groups)}'
+        message = '\n\n'.join(block for _, block in group)
+        digests.append((title, message, indexes))
+    return digests, oversized
+
+
+def create_pushover_digest_title(infos):
+    """まとめ通知のタイトルを生成"""
+    if len({(info.platform, info.type) for info in infos}) == 1:
+        return f'{create_pushover_title(infos[0])}（{len(infos)}件）'
+    return f'📦 {len(infos)}件の共有'
+
+
+def render_custom(template, info):
+    """テナント設定の書式文字列（{display_name} {description} など）で文面を生成"""
+    return _compiled(template)(info)
+
+
+@lru_cache(maxsize=256)
+def _compiled(template):
+    return compile_template(template, 'tenant template')
 
 
 def _get_display_name(info):
@@ -0,0 +1,236 @@
+"""
+テンプレートエンジン
+設定ファイル（TEMPLATES_PATH、JSON）のテンプレートを起動時に一度だけPython関数へコンパイルし、
+プラットフォーム・投稿の種類・テナントごとに使い分ける。ファイルが更新されたら自動で読み直す
+
+書式:
+  {field}      フィールドを埋め込む（{description} と {caption} は100文字で省略）
+  {field|N}    N文字で省略
+  [[ ... ]]    中のフィールドがすべて空でないときだけ出力（例: [[\\n\\n{caption}]]）
+  {{ / }}      波かっこそのもの
+
+設定ファイルの例:
+{
+  "default": {"tweet": "{emoji} {display_name}の{type}[[\\n\\n{caption}]]\\n\\n{url}\\n\\n{hashtag}"},
+  "platforms": {
+    "tiktok": {"types": {"動画": {"pushover_title": "🎵 TikTok動画"}}}
+  },
+  "tenants": {
+    "alice": {"default": {"tweet": "{url} {hashtag}"}}
+  }
+}
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+from services.common import platform_name, shorten_text
+
+
+TEMPLATES_PATH = os.environ.get('TEMPLATES_PATH', '')
+
+# ファイルの更新を確認する間隔（秒）
+TEMPLATES_RELOAD_SECONDS = float(os.environ.get('TEMPLATES_RELOAD_SECONDS', '2'))
+
+TEMPLATE_NAMES = ('tweet', 'pushover_title', 'pushover_message')
+
+# フィールド名 → SocialMediaInfo（i）から値を取り出す式
+FIELDS = {
+    'emoji': 'i.emoji',
+    'display_name': 'i.username',
+    'username': 'i.username',
+    'platform': '_platform_name(i.platform)',
+    'type': 'i.type',
+    'description': "(i.description or '')",
+    'caption': '_caption(i)',
+    'url': 'i.url',
+    'hashtag': 'i.hashtag',
+    'post_code': 'i.post_code',
+}
+
+# 長さの指定がないときの省略文字数
+DEFAULT_LENGTHS = {'description': 100, 'caption': 100}
+
+_TOKEN_RE = re.compile(r'(\[\[|\]\]|\{\{|\}\}|\{[^{}]*\})')
+_FIELD_RE = re.compile(r'^\{([a-z_]+)(?:\|(\d+))?\}$')
+
+
+def _caption(info):
+    """本文（取得できずフォールバック文言になっている場合は空）"""
+    if info.description_fallback:
+        return ''
+    return info.description or ''
+
+
+def compile_template(template, name='template'):
+    """テンプレート文字列を render(info) 関数にコンパイル（不正な書式は ValueError）
+
+    参照するフィールドだけを SocialMediaInfo から一度ずつ取り出し、f-string で組み立てる
+    Python関数を生成するので、描画時に書式の解析や辞書の組み立ては行わない。
+    """
+    used = {}           # フィールド名 → ローカル変数名（参照順）
+    sections = []       # [[ ]] ごとの代入文
+    items = []          # トップレベルの断片
+    section = None      # [[ ]] の中: (断片, フィールド名)
+    for part in _TOKEN_RE.split(template):
+        if not part:
+            continue
+        if part == '[[':
+            if section is not None:
+                raise ValueError(f"Nested [[ in {name}")
+            section = ([], [])
+            continue
+        if part == ']]':
+            if section is None:
+                raise ValueError(f"Unmatched ]] in {name}")
+            pieces, fields = section
+            local = f's{len(sections)}'
+            condition = ' and '.join(used[field] for field in fields) or 'True'
+            sections.append(f"{local} = {_concat(pieces)} if {condition} else ''")
+            items.append(f"f'{{{local}}}'")
+            section = None
+            continue
+
+        if part in ('{{', '}}'):
+            piece = repr(part[0])
+            field = None
+        elif part.startswith('{'):
+            match = _FIELD_RE.match(part)
+            if not match or match.group(1) not in FIELDS:
+                raise ValueError(f"Unknown field {part} in {name}")
+            field = match.group(1)
+            local = used.setdefault(field, f'v_{field}')
+            length = int(match.group(2)) if match.group(2) else DEFAULT_LENGTHS.get(field)
+            piece = f"f'{{_shorten({local}, {length})}}'" if length else f"f'{{{local}}}'"
+        else:
+            if '{' in part or '}' in part:
+                raise ValueError(f"Unmatched brace in {name}")
+            piece = repr(part)
+            field = None
+
+        if section is None:
+            items.append(piece)
+        else:
+            section[0].append(piece)
+            if field:
+                section[1].append(field)
+
+    if section is not None:
+        raise ValueError(f"Unclosed [[ in {name}")
+
+    lines = [f'{local} = {FIELDS[field]}' for field, local in used.items()]
+    lines += sections
+    lines.append(f'return {_concat(items)}')
+    source = 'def render(i):\n' + ''.join(f'    {line}\n' for line in lines)
+    namespace = {'_shorten': shorten_text, '_caption': _caption, '_platform_name': platform_name}
+    exec(compile(source, f'<template {name}>', 'exec'), namespace)
+    return namespace['render']
+
+
+def _concat(pieces):
+    """文字列リテラルと f-string を隣接させて1つの f-string にまとめる"""
+    return f"({' '.join(pieces)})" if pieces else "''"
+
+
+class TemplateSet:
+    """設定ファイルから読み込んだテンプレート一式（テナント・プラットフォーム・種類ごと）"""
+
+    def __init__(self, path=TEMPLATES_PATH, reload_seconds=TEMPLATES_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._compiled = {}
+        self._resolved = {}     # (テナント, プラットフォーム, 種類, 名前) → 検索結果
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        """ファイルを読み込んでコンパイル（不正ならValueError、既存のテンプレートはそのまま）"""
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding='utf-8') as f:
+            config = json.load(f)
+        self._compiled = compile_config(config)
+        self._resolved = {}
+        self._mtime = mtime
+        print(f"✓ Loaded {len(self._compiled)} templates from {self.path}")
+
+    def _maybe_reload(self):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            if os.stat(self.path).st_mtime != self._mtime:
+                self._load()
+        except (OSError, ValueError) as e:
+            # 編集途中などで読めない場合は前回のテンプレートを使い続ける（同じ版では再試行しない）
+            print(f"⚠ Template reload failed, keeping previous templates: {e}")
+            try:
+                self._mtime = os.stat(self.path).st_mtime
+            except OSError:
+                pass
+        finally:
+            self._lock.release()
+
+    def render(self, name, info, tenant=None):
+        """最も具体的なテンプレートで描画（該当するテンプレートがなければ None）
+
+        優先順: テナント+プラットフォーム+種類 > テナント+プラットフォーム > テナント >
+                プラットフォーム+種類 > プラットフォーム > default
+        """
+        if not self.path:
+            return None
+        if time.monotonic() - self._checked_at >= self.reload_seconds:
+            self._maybe_reload()
+
+        key = (tenant, info.platform, info.type, name)
+        try:
+            render = self._resolved[key]
+        except KeyError:
+            render = self._resolved[key] = self._resolve(*key)
+        return render(info) if render is not None else None
+
+    def _resolve(self, tenant, platform, kind, name):
+        compiled = self._compiled
+        for scope in ((tenant, platform, kind), (tenant, platform, None), (tenant, None, None),
+                      (None, platform, kind), (None, platform, None), (None, None, None)):
+            render = compiled.get((*scope, name))
+            if render is not None:
+                return render
+        return None
+
+
+def compile_config(config):
+    """設定全体をコンパイルして {(テナント, プラットフォーム, 種類, 名前): render} を返す"""
+    compiled = {}
+    _compile_scope(compiled, None, config, 'config')
+    for tenant, scope in config.get('tenants', {}).items():
+        _compile_scope(compiled, tenant, scope, f'tenants.{tenant}')
+    return compiled
+
+
+def _compile_scope(compiled, tenant, scope, where):
+    from services.providers import supported_platforms
+
+    _compile_group(compiled, (tenant, None, None), scope.get('default', {}), f'{where}.default')
+    for platform, platform_scope in scope.get('platforms', {}).items():
+        if platform not in supported_platforms():
+            raise ValueError(f"Unknown platform in {where}: {platform}")
+        _compile_group(compiled, (tenant, platform, None), platform_scope, f'{where}.{platform}')
+        for kind, templates in platform_scope.get('types', {}).items():
+            _compile_group(compiled, (tenant, platform, kind), templates, f'{where}.{platform}.{kind}')
+
+
+def _compile_group(compiled, key, templates, where):
+    for name, template in templates.items():
+        if name == 'types':
+            continue
+        if name not in TEMPLATE_NAMES:
+            raise ValueError(f"Unknown template name in {where}: {name}")
+        if not isinstance(template, str):
+            raise ValueError(f"Template {where}.{name} must be a string")
+        compiled[(*key, name)] = compile_template(template, f'{where}.{name}')
@@ -0,0 +1,14 @@
+"""
+テスト共通設定
+リポジトリ直下を import パスに追加し、テスト中に外部へ通信しないよう環境変数を固定する
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('CACHE_BACKEND', 'memory')
+os.environ.setdefault('HEALTH_PROBE_INTERVAL', '0')
+os.environ.setdefault('HISTORY_ENABLED', '0')
+os.environ.setdefault('TRACE_EXPORT', '')
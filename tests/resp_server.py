@@ -0,0 +1,85 @@
+"""
+テスト用のRedisプロトコル（RESP）互換サーバー
+RedisCache が使うコマンド（MGET/SET/DEL/AUTH/SELECT）だけをメモリ上で処理する
+
+値が fail_values に含まれる SET には -OOM を返す（パイプライン途中のエラー応答の再現用）
+"""
+
+import socketserver
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            self.wfile.write(self.server.execute(command))
+            self.wfile.flush()
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode('utf-8'))
+        return args
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.password = password
+        self.data = {}
+        self.fail_values = set()
+        self.commands = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args):
+        name = args[0].upper()
+        with self._lock:
+            self.commands.append(name)
+            if name == 'AUTH':
+                return b'+OK\r\n' if args[1] == self.password else b'-ERR invalid password\r\n'
+            if name == 'SELECT':
+                return b'+OK\r\n'
+            if name == 'SET':
+                if args[2] in self.fail_values:
+                    return b'-OOM command not allowed when used memory > maxmemory\r\n'
+                self.data[args[1]] = args[2]
+                return b'+OK\r\n'
+            if name == 'MGET':
+                out = [b'*%d\r\n' % (len(args) - 1)]
+                for key in args[1:]:
+                    value = self.data.get(key)
+                    if value is None:
+                        out.append(b'$-1\r\n')
+                    else:
+                        encoded = value.encode('utf-8')
+                        out.append(b'$%d\r\n%s\r\n' % (len(encoded), encoded))
+                return b''.join(out)
+            if name == 'DEL':
+                return b':%d\r\n' % int(self.data.pop(args[1], None) is not None)
+            return b'-ERR unknown command\r\n'
@@ -0,0 +1,30 @@
+"""アドミッション制御のテスト"""
+
+from services import admission
+
+
+def test_client_id_uses_hop_added_by_trusted_proxy():
+    # クライアントが先頭に偽の値を付けても、プロキシが付けた右端の値を使う
+    assert admission.client_id('1.1.1.1, 203.0.113.7', '10.0.0.1', trusted_proxies=1) == '203.0.113.7'
+    assert admission.client_id('203.0.113.7', '10.0.0.1', trusted_proxies=1) == '203.0.113.7'
+    assert admission.client_id('9.9.9.9, 203.0.113.7, 10.1.1.1', '10.0.0.1', trusted_proxies=2) == '203.0.113.7'
+    assert admission.client_id('203.0.113.7', '10.0.0.1', trusted_proxies=2) == '203.0.113.7'
+
+
+def test_client_id_without_trusted_proxy():
+    assert admission.client_id('1.1.1.1', '10.0.0.1', trusted_proxies=0) == '10.0.0.1'
+    assert admission.client_id('', '10.0.0.1', trusted_proxies=1) == '10.0.0.1'
+    assert admission.client_id('', None, trusted_proxies=1) == 'unknown'
+
+
+def test_rotating_forwarded_for_does_not_bypass_rate_limit():
+    limiter = admission.ClientRateLimiter(rate_per_minute=1, burst=3)
+    accepted = 0
+    for i in range(10):
+        key = admission.client_id(f'198.51.100.{i}, 203.0.113.7', '10.0.0.1', trusted_proxies=1)
+        try:
+            limiter.check(key)
+            accepted += 1
+        except admission.AdmissionRejected as e:
+            assert e.status == 429
+    assert accepted == 3
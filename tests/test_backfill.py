@@ -0,0 +1,70 @@
+"""一括変換（backfill.py）のテスト"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+import backfill
+
+
+@pytest.fixture(autouse=True)
+def fake_convert(monkeypatch):
+    monkeypatch.setattr(backfill, 'convert', lambda url: {'url': url, 'status': 'ok'})
+
+
+def _lines(count):
+    return [f'https://www.instagram.com/p/{i:04d}/\n' for i in range(count)]
+
+
+def _interrupted(lines, after):
+    for i, line in enumerate(lines):
+        if i == after:
+            raise KeyboardInterrupt
+        yield line
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_resume_after_interrupt(tmp_path):
+    output = tmp_path / 'drafts.jsonl'
+    checkpoint = tmp_path / 'drafts.jsonl.checkpoint'
+    lines = _lines(50) + ['\n', '# comment\n'] + _lines(60)[50:]
+
+    with pytest.raises(KeyboardInterrupt):
+        backfill.Backfill(str(output), str(checkpoint), 4).run(_interrupted(lines, 30))
+    first = _read(output)
+    assert 0 < len(first) <= 30
+
+    # 前回チェックポイント後に書かれた途中の行は捨てられる
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write('{"partial": ')
+
+    resumed = backfill.Backfill(str(output), str(checkpoint), 4)
+    resumed.run(iter(lines))
+    records = _read(output)
+    assert sorted(record['line'] for record in records) == [i for i in range(len(lines)) if i not in (50, 51)]
+    assert resumed.counts['skipped'] == len(first) + sum(1 for i in (50, 51) if i < 30)
+    assert resumed.counts['ok'] == 60 - len(first)
+
+
+def test_rerun_after_completion_does_nothing(tmp_path):
+    output = tmp_path / 'drafts.jsonl'
+    checkpoint = tmp_path / 'drafts.jsonl.checkpoint'
+    backfill.Backfill(str(output), str(checkpoint), 2).run(iter(_lines(10)))
+    again = backfill.Backfill(str(output), str(checkpoint), 2)
+    again.run(iter(_lines(10)))
+    assert again.counts == {'ok': 0, 'error': 0, 'skipped': 10}
+    assert len(_read(output)) == 10
+
+
+def test_import_has_no_app_side_effects():
+    code = ('import sys, threading, backfill; '
+            "print('app' in sys.modules, 'flask' in sys.modules, threading.active_count())")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=backfill.os.path.dirname(backfill.__file__), check=True)
+    assert result.stdout.split() == ['False', 'False', '1']
@@ -0,0 +1,65 @@
+"""キャッシュバックエンドのテスト（Redisはローカルの RESP 互換サーバーを相手にする）"""
+
+import pytest
+
+from services.cache import MemoryCache, RedisCache, SQLiteCache
+from tests.resp_server import RespServer
+
+
+@pytest.fixture
+def server():
+    server = RespServer().start()
+    yield server
+    server.stop()
+
+
+def test_redis_round_trip(server):
+    cache = RedisCache(server.url)
+    cache.set_many({'a': {'x': 1}, 'b': 'テキスト'})
+    assert cache.get_many(['a', 'b', 'missing']) == {'a': {'x': 1}, 'b': 'テキスト'}
+    cache.delete('a')
+    assert cache.get('a') is None
+
+
+def test_redis_error_reply_does_not_desync_connection(server):
+    cache = RedisCache(server.url)
+    cache.set('a', 'ok')
+    server.fail_values.add('"boom"')
+
+    # 2件目だけ -OOM になるパイプライン
+    cache.set_many({'b': 'fine', 'c': 'boom'})
+
+    # 次のコマンドが前のパイプラインの残りの応答を読まない
+    assert cache.get_many(['a']) == {'a': 'ok'}
+    assert cache.get('b') == 'fine'
+
+
+def test_redis_auth_and_failed_auth(server):
+    server.password = 'secret'
+    assert RedisCache(server.url.replace('redis://', 'redis://:secret@')).get('a') is None
+    cache = RedisCache(server.url.replace('redis://', 'redis://:wrong@'))
+    assert cache.get('a') is None
+    assert getattr(cache._local, 'sock', None) is None
+
+
+def test_redis_unreachable_is_a_miss():
+    server = RespServer()
+    url = server.url
+    server.server_close()
+    cache = RedisCache(url, timeout=0.5)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+@pytest.mark.parametrize('make', [MemoryCache, lambda: SQLiteCache(':memory:')])
+def test_corrupt_value_is_a_miss(make):
+    cache = make()
+    cache._set_raw_many({'bad': '{not json', 'good': '1'}, 60)
+    assert cache.get_many(['bad', 'good']) == {'good': 1}
+
+
+def test_corrupt_redis_value_is_a_miss(server):
+    cache = RedisCache(server.url)
+    server.data['bad'] = '+OK'
+    cache.set('good', [1])
+    assert cache.get_many(['bad', 'good']) == {'good': [1]}
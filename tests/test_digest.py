@@ -0,0 +1,84 @@
+"""まとめ通知のテスト"""
+
+import pytest
+
+from services import digest, history, notifiers
+from services.cache import MemoryCache, SQLiteCache, set_cache
+from services.notifiers import Notification, Notifier
+
+
+class RecordingNotifier(Notifier):
+    name = 'pushover'
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, notification):
+        self.sent.append(notification)
+        return True
+
+
+def _notification(url):
+    info = type('Info', (), {'url': url})()
+    return Notification(info, f'https://twitter.com/intent/tweet?text={url}', 'title', 'message')
+
+
+def _build(entries):
+    return [('digest', '\n'.join(link for _, link in entries), None)], []
+
+
+@pytest.fixture
+def sink():
+    inner = RecordingNotifier()
+    wrapped = digest.DigestNotifier(inner, _build, window=60, max_items=10, link_base='https://example.com')
+    yield inner, wrapped
+    wrapped._take('test')
+
+
+def test_burst_is_reported_as_queued(sink):
+    inner, wrapped = sink
+    first = notifiers.dispatch([wrapped], _notification('https://a'))
+    second = notifiers.dispatch([wrapped], _notification('https://b'))
+
+    assert first['pushover']['status'] == 'sent'
+    assert second['pushover']['status'] == 'queued'
+    assert second['pushover']['success'] is False
+    assert notifiers.delivery_status(first) is True
+    assert notifiers.delivery_status(second) == 'queued'
+    assert len(inner.sent) == 1
+
+
+def test_links_are_stored_in_history_db(sink, tmp_path, monkeypatch):
+    monkeypatch.setattr(history, 'HISTORY_ENABLED', True)
+    monkeypatch.setattr(history, 'HISTORY_DB_PATH', str(tmp_path / 'history.sqlite3'))
+    monkeypatch.setattr(history, '_links_conn', None)
+    monkeypatch.setattr(history, '_reader', history.threading.local())
+    _, wrapped = sink
+
+    link = wrapped._link('https://twitter.com/intent/tweet?text=x')
+    key = link.rsplit('/', 1)[1]
+    assert link == f'https://example.com/x/{key}'
+    # 別のワーカー（プロセス内のキャッシュを共有しない）でも引ける
+    set_cache(MemoryCache())
+    assert digest.resolve_link(key) == 'https://twitter.com/intent/tweet?text=x'
+    assert digest.resolve_link('missing') is None
+
+
+def test_memory_cache_only_keeps_full_url(sink, monkeypatch):
+    monkeypatch.setattr(history, 'HISTORY_ENABLED', False)
+    set_cache(MemoryCache())
+    _, wrapped = sink
+    assert wrapped._link('https://twitter.com/intent/tweet?text=x') == 'https://twitter.com/intent/tweet?text=x'
+
+
+def test_shared_cache_keeps_short_link(sink, tmp_path, monkeypatch):
+    monkeypatch.setattr(history, 'HISTORY_ENABLED', False)
+    set_cache(SQLiteCache(str(tmp_path / 'cache.sqlite3')))
+    _, wrapped = sink
+    try:
+        link = wrapped._link('https://twitter.com/intent/tweet?text=x')
+        assert link.startswith('https://example.com/x/')
+        assert digest.resolve_link(link.rsplit('/', 1)[1]) == 'https://twitter.com/intent/tweet?text=x'
+    finally:
+        set_cache(MemoryCache())
@@ -0,0 +1,78 @@
+"""共有履歴ストアのテスト"""
+
+import time
+
+from services import history, stats
+
+
+def _entry(**fields):
+    entry = {
+        'url': 'https://www.instagram.com/p/ABC/',
+        'platform': 'instagram',
+        'username': 'taro',
+        'post_code': 'ABC',
+        'type': '投稿',
+        'description': '',
+        'hashtag': '#taro',
+        'tweet_text': '',
+        'notification_sent': True,
+        'timings': {},
+    }
+    entry.update(fields)
+    return entry
+
+
+def test_fallback_descriptions_are_cleared_once(tmp_path):
+    path = str(tmp_path / 'history.sqlite3')
+    conn = history.connect(path)
+    # フラグ導入前に記録された行を再現（クリーンアップ前の状態に戻す）
+    conn.execute('PRAGMA user_version = 0')
+    history.HistoryWriter(path)._write(conn, [
+        _entry(description='taroさんの投稿をチェック！'),
+        _entry(platform='tiktok', type='動画', description='taroさんのTikTok動画をチェック！'),
+        _entry(description='新メニューをチェック！'),
+        _entry(username='hanako', description='taroさんの投稿をチェック！'),
+    ])
+    conn.close()
+
+    conn = history.connect(path)
+    descriptions = [row[0] for row in conn.execute('SELECT description FROM shares ORDER BY id')]
+    assert descriptions == ['', '', '新メニューをチェック！', 'taroさんの投稿をチェック！']
+
+    # 全文検索の索引と統計も直っている
+    rows, _ = history.search(conn, 'チェック')
+    assert sorted(row['description'] for row in rows) == ['taroさんの投稿をチェック！', '新メニューをチェック！']
+    summary = stats.query(conn, since=time.time() - 3600)
+    assert summary['totals']['shares'] == 4
+    assert summary['totals']['scrape_success_rate'] == 0.5
+
+    # 2回目以降は何もしない
+    conn.execute("UPDATE shares SET description = 'taroさんの投稿をチェック！' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    conn = history.connect(path)
+    assert conn.execute('SELECT description FROM shares WHERE id = 1').fetchone()[0] == 'taroさんの投稿をチェック！'
+    conn.close()
+
+
+def test_writer_retries_connect_and_keeps_queue_time(tmp_path, monkeypatch):
+    path = str(tmp_path / 'history.sqlite3')
+    monkeypatch.setattr(history, 'CONNECT_RETRY_SECONDS', 0.01)
+    attempts = []
+    connect = history.connect
+
+    def flaky_connect(db_path=None):
+        attempts.append(time.time())
+        if len(attempts) < 3:
+            raise history.sqlite3.OperationalError('unable to open database file')
+        return connect(db_path)
+
+    monkeypatch.setattr(history, 'connect', flaky_connect)
+    writer = history.HistoryWriter(path)
+    queued_at = time.time()
+    writer.record(_entry())
+    writer.flush()
+
+    assert len(attempts) == 3
+    created_at, = connect(path).execute('SELECT created_at FROM shares').fetchone()
+    assert queued_at <= created_at < attempts[-1]
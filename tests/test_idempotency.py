@@ -0,0 +1,87 @@
+"""再送の重複排除のテスト"""
+
+import threading
+import time
+
+import pytest
+
+from services import idempotency
+from services.admission import AdmissionRejected
+from services.idempotency import IdempotencyStore
+
+
+URL = 'https://www.instagram.com/p/ABC123/'
+
+
+def test_derived_keys_depend_on_fields():
+    now = 1_000_000
+    base = idempotency.derived_keys(URL, {'caption': 'first caption', 'username': ''}, now=now)
+    assert base == idempotency.derived_keys(URL + '?igsh=x', {'username': '', 'caption': ' first caption '}, now=now)
+    assert base != idempotency.derived_keys(URL, {'caption': 'second caption', 'username': ''}, now=now)
+    assert base != idempotency.derived_keys(URL, {'caption': 'first caption', 'username': 'taro'}, now=now)
+    assert base[0] != idempotency.derived_keys(URL, {'caption': 'first caption', 'username': ''},
+                                               now=now + idempotency.IDEMPOTENCY_BUCKET_SECONDS)[0]
+
+
+def test_previous_bucket_is_an_alias():
+    now = 1_000_000
+    first = idempotency.derived_keys(URL, now=now)
+    later = idempotency.derived_keys(URL, now=now + idempotency.IDEMPOTENCY_BUCKET_SECONDS)
+    assert later[1] == first[0]
+
+
+def test_replay_after_complete():
+    store = IdempotencyStore()
+    assert store.claim('k') is None
+    store.complete('k', 200, b'{"ok": true}')
+    assert store.claim('k') == (200, b'{"ok": true}')
+    assert store.claim('other', aliases=['k']) == (200, b'{"ok": true}')
+
+
+def test_expired_response_is_not_replayed():
+    store = IdempotencyStore(ttl=0)
+    assert store.claim('k') is None
+    store.complete('k', 200, b'{}')
+    assert store.claim('k') is None
+
+
+def test_waits_for_inflight_request():
+    store = IdempotencyStore()
+    assert store.claim('k') is None
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(store.claim('k')))
+    waiter.start()
+    time.sleep(0.05)
+    assert not results  # 先行リクエストの完了を待っている
+
+    store.complete('k', 201, b'done')
+    waiter.join(5)
+    assert results == [(201, b'done')]
+
+
+def test_waiter_takes_over_after_release():
+    store = IdempotencyStore()
+    assert store.claim('k') is None
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(store.claim('k')))
+    waiter.start()
+    time.sleep(0.05)
+
+    store.release('k')
+    waiter.join(5)
+    # 先行が失敗したので待っていた側が処理権を取る
+    assert results == [None]
+    assert 'k' in store._inflight
+
+
+def test_wait_timeout_is_a_conflict():
+    store = IdempotencyStore()
+    assert store.claim('k') is None
+    with pytest.raises(AdmissionRejected) as excinfo:
+        store.claim('k', timeout=0.05)
+    assert excinfo.value.status == 409
+    assert excinfo.value.retry_after == idempotency.INFLIGHT_RETRY_AFTER_SECONDS
+
+    # 先行リクエストは処理権を持ったままで、完了すれば次は再送として返る
+    store.complete('k', 200, b'{}')
+    assert store.claim('k') == (200, b'{}')
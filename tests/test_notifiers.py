@@ -0,0 +1,134 @@
+"""通知の並行送信のテスト"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from services import http_client, metrics, notifiers
+from services.notifiers import Notification, Notifier, WebhookNotifier
+
+
+class SlowNotifier(Notifier):
+    """一定時間かかってから成功する通知先"""
+
+    def __init__(self, name, seconds, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.seconds = seconds
+        self.sent = threading.Event()
+        self.count = 0
+
+    def send(self, notification):
+        time.sleep(self.seconds)
+        self.count += 1
+        self.sent.set()
+        return True
+
+
+@pytest.fixture
+def transport():
+    calls = []
+
+    def unavailable(method, url, **kwargs):
+        calls.append(time.monotonic())
+        time.sleep(0.05)
+        response = requests.Response()
+        response.status_code = 503
+        response.headers['Retry-After'] = '0'
+        return response
+
+    http_client.set_transport(unavailable)
+    yield calls
+    http_client.set_transport(None)
+
+
+def _notification():
+    return Notification(None, 'https://twitter.com/intent/tweet', 'title', 'message')
+
+
+def test_retries_stop_at_sink_timeout(transport):
+    http_client.set_host_policy('sink.example', http_client.RetryPolicy(max_attempts=10, base_delay=0.1))
+    sink = WebhookNotifier('https://sink.example/hook', timeout=0.3)
+
+    started = time.monotonic()
+    results = notifiers.dispatch([sink], _notification())
+    elapsed = time.monotonic() - started
+
+    assert results['webhook']['success'] is False
+    assert results['webhook'].get('error') != 'timeout'
+    assert elapsed < 0.3 + notifiers.NOTIFY_TIMEOUT_GRACE_SECONDS
+    # デッドラインを過ぎてからは再送していない
+    assert transport[-1] - started < 0.3
+
+
+def _dispatch_concurrently(sinks, count):
+    """同じ通知を count 件同時に送り、それぞれの結果を返す"""
+    results = [None] * count
+
+    def run(index):
+        results[index] = notifiers.dispatch(sinks, _notification())
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)    # 送信順を固定する
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_timeout_counts_from_send_start():
+    sink = SlowNotifier('slow', 0.2, timeout=0.3, max_concurrent=1)
+
+    first, second = _dispatch_concurrently([sink], 2)
+
+    # 2件目は送信スレッドの空き待ちを含めると 0.3 秒を超えるが、送信自体は時間内に成功している
+    assert first['slow']['status'] == 'sent'
+    assert second['slow']['status'] == 'sent'
+    assert sink.count == 2
+
+
+def test_send_not_started_in_time_is_cancelled(monkeypatch):
+    monkeypatch.setattr(notifiers, 'NOTIFY_TIMEOUT_GRACE_SECONDS', 0)
+    sink = SlowNotifier('slow', 0.5, timeout=0.1, max_concurrent=1)
+
+    first, second = _dispatch_concurrently([sink], 2)
+
+    # 1件目は送信中にタイムアウト、2件目は始められずに取り消される
+    assert first['slow']['status'] == 'timeout'
+    assert second['slow'] == {'status': 'timeout', 'success': False,
+                              'latency_ms': second['slow']['latency_ms'], 'error': 'timeout'}
+    sink.sent.wait(1)
+    time.sleep(0.05)
+    assert sink.count == 1
+
+
+def test_late_result_is_reported(monkeypatch):
+    monkeypatch.setattr(notifiers, 'NOTIFY_TIMEOUT_GRACE_SECONDS', 0)
+    metrics.reset()
+    sink = SlowNotifier('slow', 0.2, timeout=0.05)
+
+    results = notifiers.dispatch([sink], _notification())
+    assert results['slow']['status'] == 'timeout'
+    sink.sent.wait(1)
+    time.sleep(0.05)
+
+    counters = {(c['name'], c['labels'].get('status')): c['value'] for c in metrics.snapshot()['counters']}
+    assert counters[('notifications_late', 'sent')] == 1
+
+
+def test_slow_sink_does_not_block_other_sinks():
+    slow = SlowNotifier('slow', 0.3, timeout=1, max_concurrent=1)
+    fast = SlowNotifier('fast', 0.0, timeout=1)
+    # slow の送信スレッドを埋めておく
+    busy = threading.Thread(target=notifiers.dispatch, args=([slow], _notification()))
+    busy.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    results = notifiers.dispatch([fast], _notification())
+    assert results['fast']['status'] == 'sent'
+    assert time.monotonic() - started < 0.1
+    busy.join(5)
@@ -0,0 +1,62 @@
+"""リクエストプロファイラのテスト"""
+
+import threading
+
+import pytest
+
+from services import profiling
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+
+
+def test_profile_is_saved():
+    with profiling.profile_request('/webhook') as capture_id:
+        sum(range(1000))
+    assert capture_id
+    names = sorted(capture['id'] for capture in profiling.list_captures())
+    assert names == [capture_id]
+
+
+def test_concurrent_request_is_not_profiled():
+    entered = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def first():
+        with profiling.profile_request('first') as capture_id:
+            results.append(capture_id)
+            entered.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    assert entered.wait(5)
+    samplers = sum(t.name == 'profile-sampler' for t in threading.enumerate())
+
+    # 2件目はプロファイルせずに処理だけ行う（例外にならない・サンプラーも増えない）
+    with profiling.profile_request('second') as capture_id:
+        assert sum(t.name == 'profile-sampler' for t in threading.enumerate()) == samplers
+    assert capture_id is None
+
+    release.set()
+    thread.join()
+    assert results[0] is not None
+    assert not any(t.name == 'profile-sampler' for t in threading.enumerate())
+
+
+def test_enable_failure_skips_profiling(monkeypatch):
+    class Busy:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(profiling.cProfile, 'Profile', Busy)
+    with profiling.profile_request('busy') as capture_id:
+        pass
+    assert capture_id is None
+    assert not any(t.name == 'profile-sampler' for t in threading.enumerate())
+    # ロックは解放されている
+    assert profiling._active.acquire(blocking=False)
+    profiling._active.release()
@@ -0,0 +1,74 @@
+"""履歴・検索・統計の読み取り権限のテスト"""
+
+import pytest
+
+from services import admission, tenants
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, 'DEBUG_TOKEN', 'secret')
+    monkeypatch.setattr(app, 'TENANTS', tenants.TenantRegistry(
+        app.TENANTS.default,
+        [
+            tenants.Tenant('alice', {}, admission.ConcurrencyLimiter(), api_key='alice-key', path='alice-7f3a'),
+            tenants.Tenant('bob', {}, admission.ConcurrencyLimiter(), path='bob-7f3a'),
+        ],
+    ))
+    monkeypatch.setattr(app, 'search_history', lambda **kwargs: ([], None))
+    monkeypatch.setattr(app, 'search_shares', lambda q, **kwargs: ([], None))
+    monkeypatch.setattr(app, 'share_stats', lambda **kwargs: {'since': 0, 'until': 0})
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/history', '/search?q=ramen', '/stats'])
+def test_anonymous_read_is_rejected(client, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'X-Debug-Token': 'wrong'}).status_code == 401
+
+
+@pytest.mark.parametrize('path', ['/history', '/search?q=ramen', '/stats'])
+@pytest.mark.parametrize('headers', [
+    {'X-API-Key': 'alice-key'},
+    {'Authorization': 'Bearer alice-key'},
+    {'X-Debug-Token': 'secret'},
+])
+def test_credentialed_read(client, path, headers):
+    assert client.get(path, headers=headers).status_code == 200
+
+
+@pytest.mark.parametrize('path', ['history', 'search?q=ramen', 'stats'])
+def test_tenant_path_read(client, path):
+    assert client.get(f'/t/bob-7f3a/{path}').status_code == 200
+    assert client.get(f'/t/unknown/{path}').status_code == 404
+
+
+@pytest.mark.parametrize('path', ['history', 'search?q=ramen', 'stats'])
+@pytest.mark.parametrize('headers, status', [
+    ({}, 401),
+    ({'X-API-Key': 'wrong'}, 401),
+    ({'X-API-Key': 'alice-key'}, 200),
+])
+def test_tenant_path_with_api_key(client, path, headers, status):
+    assert client.get(f'/t/alice-7f3a/{path}', headers=headers).status_code == status
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-API-Key': 'wrong'}])
+def test_default_tenant_does_not_accept_any_api_key(client, headers):
+    assert client.get('/history', headers=headers).status_code == 401
+
+
+def test_credential_check_uses_the_request(client):
+    import app
+
+    alice = app.TENANTS.tenants['alice']
+    bob = app.TENANTS.tenants['bob']
+    with app.app.test_request_context('/t/alice-7f3a/history'):
+        assert not app._has_credential(alice, 'alice-7f3a')
+    with app.app.test_request_context('/history', headers={'X-API-Key': 'alice-key'}):
+        assert app._has_credential(alice)
+    with app.app.test_request_context('/t/bob-7f3a/history'):
+        assert app._has_credential(bob, 'bob-7f3a')
+        assert not app._has_credential(bob)
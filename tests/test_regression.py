@@ -0,0 +1,16 @@
+"""抽出結果の回帰チェック（同梱の合成コーパスを再生し、フィールドだけを比較する）"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def test_committed_corpus_passes_check():
+    # 処理時間の比較はマシンに依存するので手動の check に任せる
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'regression', 'run_regression.py'), 'check', '--no-timing'],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,61 @@
+"""テンプレートエンジンのテスト"""
+
+import pytest
+
+from services import SocialMediaInfo
+from services.common import create_hashtag
+from templates import create_pushover_title, create_tweet_text
+from templates.engine import compile_template
+
+
+DEFAULT_TWEET = '{emoji} {display_name}の{type}[[\n\n{caption}]]\n\n{url}\n\n{hashtag}'
+
+
+def _info(description, fallback=False):
+    info = SocialMediaInfo()
+    info.platform = 'instagram'
+    info.username = 'taro'
+    info.type = '投稿'
+    info.emoji = '📷'
+    info.url = 'https://www.instagram.com/p/ABC/'
+    info.hashtag = '#taro'
+    info.description = description
+    info.description_fallback = fallback
+    return info
+
+
+def test_caption_section_is_dropped_for_fallback_text():
+    render = compile_template('{url}[[\n{caption}]]')
+    assert render(_info('taroさんの投稿をチェック！', fallback=True)) == 'https://www.instagram.com/p/ABC/'
+    assert render(_info('新メニューをチェック！')) == 'https://www.instagram.com/p/ABC/\n新メニューをチェック！'
+
+
+def test_description_keeps_fallback_text():
+    render = compile_template('{description}')
+    assert render(_info('taroさんの投稿をチェック！', fallback=True)) == 'taroさんの投稿をチェック！'
+
+
+@pytest.mark.parametrize('info', [
+    _info('taroさんの投稿をチェック！', fallback=True),
+    _info('新メニューをチェック！'),
+    _info('ラーメン' * 40),
+    _info(''),
+])
+def test_default_template_matches_builtin(info):
+    assert compile_template(DEFAULT_TWEET)(info) == create_tweet_text(info)
+
+
+@pytest.mark.parametrize('template', ['{unknown}', '[[{url}', '{url}]]', '{url|x}'])
+def test_invalid_template(template):
+    with pytest.raises(ValueError):
+        compile_template(template)
+
+
+@pytest.mark.parametrize('platform, name', [('instagram', 'Instagram'), ('tiktok', 'TikTok'), ('youtube', 'YouTube')])
+def test_platform_display_name(platform, name):
+    info = _info('')
+    info.platform = platform
+    assert create_hashtag('', platform) == f'#{name}'
+    assert create_hashtag(name, platform) == f'#{name}'
+    assert create_pushover_title(info) == f'📷 {name} 投稿を共有'
+    assert compile_template('{platform}')(info) == name
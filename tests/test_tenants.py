@@ -0,0 +1,41 @@
+"""テナントの解決のテスト"""
+
+import pytest
+
+from services import admission, tenants
+from services.tenants import Tenant, TenantError, TenantRegistry
+
+
+@pytest.fixture
+def registry():
+    default = Tenant(tenants.DEFAULT_TENANT_ID, {}, admission.ConcurrencyLimiter())
+    return TenantRegistry(default, [
+        Tenant('alice', {}, admission.ConcurrencyLimiter(), api_key='alice-key', path='alice-7f3a'),
+        Tenant('bob', {}, admission.ConcurrencyLimiter(), path='bob-7f3a'),
+    ])
+
+
+def test_api_key(registry):
+    assert registry.resolve('alice-key').id == 'alice'
+    assert registry.resolve('').id == tenants.DEFAULT_TENANT_ID
+    with pytest.raises(TenantError) as excinfo:
+        registry.resolve('wrong')
+    assert excinfo.value.status == 401
+
+
+def test_path_with_api_key(registry):
+    assert registry.resolve('alice-key', 'alice-7f3a').id == 'alice'
+
+
+@pytest.mark.parametrize('api_key', ['', 'wrong', 'alice-key-'])
+def test_path_without_matching_key_is_rejected(registry, api_key):
+    with pytest.raises(TenantError) as excinfo:
+        registry.resolve(api_key, 'alice-7f3a')
+    assert excinfo.value.status == 401
+
+
+def test_path_only_tenant(registry):
+    assert registry.resolve('', 'bob-7f3a').id == 'bob'
+    with pytest.raises(TenantError) as excinfo:
+        registry.resolve('', 'unknown')
+    assert excinfo.value.status == 404
@@ -0,0 +1,73 @@
+"""サムネイル取得のテスト"""
+
+import io
+import time
+
+import pytest
+import requests
+
+from services import http_client, thumbnails
+
+
+class DripResponse(requests.Response):
+    """少しずつ届く応答"""
+
+    def __init__(self, chunks, delay):
+        super().__init__()
+        self.status_code = 200
+        self.headers['Content-Type'] = 'image/jpeg'
+        self._chunks = chunks
+        self._delay = delay
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield chunk
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, 'THUMBNAIL_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(thumbnails, 'Image', None)
+    yield tmp_path
+    http_client.set_transport(None)
+
+
+def test_download_stops_at_deadline(cache_dir, monkeypatch):
+    monkeypatch.setattr(thumbnails, 'THUMBNAIL_TIMEOUT_SECONDS', 0.1)
+    http_client.set_transport(lambda method, url, **kwargs: DripResponse([b'x'] * 100, 0.01))
+
+    started = time.monotonic()
+    assert thumbnails.get_thumbnail('https://www.instagram.com/p/A/', 'https://cdn.example/a.jpg') is None
+    assert time.monotonic() - started < 0.5
+
+
+def test_request_deadline_is_respected(cache_dir):
+    http_client.set_transport(lambda method, url, **kwargs: DripResponse([b'x'] * 100, 0.01))
+    token = http_client.set_deadline(0.05)
+    try:
+        started = time.monotonic()
+        assert thumbnails.get_thumbnail('https://www.instagram.com/p/A/', 'https://cdn.example/a.jpg') is None
+        assert time.monotonic() - started < 0.3
+        # 外側のデッドラインは元に戻っている（延ばされていない）
+        assert http_client.remaining_time() <= 0.05
+    finally:
+        http_client.reset_deadline(token)
+
+
+def test_small_download_is_attached(cache_dir):
+    http_client.set_transport(lambda method, url, **kwargs: DripResponse([b'jpeg'], 0))
+    attachment = thumbnails.get_thumbnail('https://www.instagram.com/p/A/', 'https://cdn.example/a.jpg')
+    assert attachment.content == b'jpeg'
+
+
+def test_oversized_dimensions_are_not_decoded(monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    monkeypatch.setattr(thumbnails, 'Image', Image)
+    monkeypatch.setattr(thumbnails, 'THUMBNAIL_MAX_PIXELS', 100 * 100)
+    out = io.BytesIO()
+    Image.new('RGB', (200, 200)).save(out, format='PNG')
+    assert thumbnails._encode(out.getvalue()) is None
@@ -0,0 +1,171 @@
+"""トレース（スパン）のテスト（エクスポーターはメモリ上の代替に差し替える）"""
+
+import threading
+
+import pytest
+import requests
+
+from services import http_client, metrics, tracing
+
+
+class MemoryExporter:
+    """書き出されたスパンをリストに貯めるだけのエクスポーター"""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def named(self, name):
+        return [span for span in self.spans if span['name'] == name]
+
+
+@pytest.fixture
+def exporter():
+    exporter = MemoryExporter()
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+
+def test_disabled_span_is_noop():
+    tracing.set_exporter(None)
+    with tracing.span('noop') as span:
+        span.set('key', 'value')
+        assert span.context is None
+    assert tracing.current_context() is None
+
+
+def test_nested_spans_share_trace(exporter):
+    with tracing.span('outer', kind='server', path='/webhook') as outer:
+        with tracing.span('inner') as inner:
+            tracing.annotate(attempts=2, ignored=None)
+        outer.set('http.status_code', 200)
+    tracing.flush()
+
+    outer_span, = exporter.named('outer')
+    inner_span, = exporter.named('inner')
+    assert inner_span['trace_id'] == outer_span['trace_id'] == outer.context.trace_id
+    assert inner_span['parent_id'] == outer_span['span_id']
+    assert outer_span['parent_id'] is None
+    assert inner_span['attributes'] == {'attempts': 2}
+    assert outer_span['attributes'] == {'path': '/webhook', 'http.status_code': 200}
+    assert outer_span['kind'] == 'server'
+    assert inner_span['end_ns'] >= inner_span['start_ns']
+    assert inner.context.span_id == inner_span['span_id']
+
+
+def test_error_is_recorded_and_reraised(exporter):
+    with pytest.raises(KeyError):
+        with tracing.span('failing'):
+            raise KeyError('missing')
+    tracing.flush()
+
+    span, = exporter.named('failing')
+    assert span['error'] == "KeyError: 'missing'"
+
+
+def test_traceparent_parent(exporter):
+    parent = tracing.parse_traceparent('00-' + 'a' * 32 + '-' + 'b' * 16 + '-01')
+    with tracing.span('child', parent=parent) as child:
+        assert child.context.traceparent().startswith('00-' + 'a' * 32 + '-')
+    tracing.flush()
+
+    span, = exporter.named('child')
+    assert span['trace_id'] == 'a' * 32
+    assert span['parent_id'] == 'b' * 16
+
+
+@pytest.mark.parametrize('value', [
+    '',
+    'garbage',
+    '00-' + '0' * 32 + '-' + 'b' * 16 + '-01',
+    '00-' + 'a' * 32 + '-' + '0' * 16 + '-01',
+])
+def test_invalid_traceparent_is_ignored(value):
+    assert tracing.parse_traceparent(value) is None
+
+
+def test_parent_across_threads(exporter):
+    with tracing.span('request'):
+        parent = tracing.current_context()
+        # 別スレッドでは現在のスパンは引き継がれないので明示的に渡す
+        results = []
+
+        def run():
+            results.append(tracing.current_context())
+            with tracing.span('background', parent=parent):
+                pass
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        worker.join(5)
+    tracing.flush()
+
+    assert results == [None]
+    request_span, = exporter.named('request')
+    background, = exporter.named('background')
+    assert background['parent_id'] == request_span['span_id']
+    assert background['trace_id'] == request_span['trace_id']
+
+
+def test_http_client_span(exporter):
+    def transport(method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'hello'
+        return response
+
+    http_client.set_transport(transport)
+    try:
+        with tracing.span('extract'):
+            http_client.request('GET', 'https://www.example.com/path?q=1')
+    finally:
+        http_client.set_transport(None)
+    tracing.flush()
+
+    extract, = exporter.named('extract')
+    http, = exporter.named('http GET')
+    assert http['kind'] == 'client'
+    assert http['parent_id'] == extract['span_id']
+    assert http['attributes'] == {
+        'host': 'www.example.com', 'path': '/path', 'attempts': 1, 'status': 200, 'bytes': 5,
+    }
+
+
+def test_export_failure_is_counted(exporter):
+    class BrokenExporter:
+        def export(self, spans):
+            raise OSError('disk full')
+
+    metrics.reset()
+    tracing.set_exporter(BrokenExporter())
+    with tracing.span('lost'):
+        pass
+    tracing.flush()  # 失敗しても例外は呼び出し側に伝わらない
+
+    counters = {counter['name']: counter['value'] for counter in metrics.snapshot()['counters']}
+    assert counters['trace_export_errors'] == 1
+    assert 'trace_spans_exported' not in counters
+
+
+def test_webhook_spans(exporter):
+    import app
+
+    response = app.app.test_client().post(
+        '/webhook',
+        json={'text': 'no url here'},
+        headers={'traceparent': '00-' + 'c' * 32 + '-' + 'd' * 16 + '-01'},
+    )
+    tracing.flush()
+
+    webhook, = exporter.named('webhook')
+    assert webhook['trace_id'] == 'c' * 32
+    assert webhook['parent_id'] == 'd' * 16
+    assert webhook['attributes']['http.status_code'] == response.status_code
+    assert response.headers['traceparent'] == f"00-{'c' * 32}-{webhook['span_id']}-01"
+    children = [span for span in exporter.spans if span['parent_id'] == webhook['span_id']]
+    assert 'unwrap_payload' in {span['name'] for span in children}
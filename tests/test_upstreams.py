@@ -0,0 +1,65 @@
+"""上流のヘルスチェックのテスト"""
+
+import io
+
+import pytest
+import requests
+
+from services import upstreams
+from services.upstreams import HealthProber
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """確認先ごとに返すステータスとヘッダー（呼ばれた回数も記録）"""
+    replies = {'status': 200, 'headers': {}, 'calls': 0}
+
+    def fake_request(method, url, **kwargs):
+        replies['calls'] += 1
+        response = requests.Response()
+        response.status_code = replies['status']
+        response.headers.update(replies['headers'])
+        response.raw = io.BytesIO(b'')
+        return response
+
+    monkeypatch.setattr(upstreams.requests, 'request', fake_request)
+    return replies
+
+
+def _prober():
+    return HealthProber(probes=(('instagram', 'HEAD', 'https://www.instagram.com/'),), failure_threshold=2)
+
+
+def test_rate_limit_is_not_down(responses):
+    prober = _prober()
+    responses.update(status=429, headers={'Retry-After': '120'})
+    prober.probe_all()
+    prober.probe_all()
+
+    status = prober.snapshot()['upstreams']['instagram']
+    assert status['state'] == 'throttled'
+    assert status['consecutive_failures'] == 0
+    assert status['retry_at'] is not None
+    assert prober.available('instagram')
+    assert prober.snapshot()['status'] == 'degraded'
+    # Retry-After までは問い合わせない
+    assert responses['calls'] == 1
+
+
+def test_probe_resumes_after_retry_after(responses):
+    prober = _prober()
+    responses.update(status=429, headers={'Retry-After': '0'})
+    prober.probe_all()
+    responses.update(status=200, headers={})
+    prober.probe_all()
+    assert prober.snapshot()['upstreams']['instagram']['state'] == 'up'
+
+
+def test_server_errors_mark_down(responses):
+    prober = _prober()
+    responses.update(status=503)
+    prober.probe_all()
+    assert prober.snapshot()['upstreams']['instagram']['state'] == 'degraded'
+    prober.probe_all()
+    assert prober.snapshot()['upstreams']['instagram']['state'] == 'down'
+    assert not prober.available('instagram')